@@ -7,6 +7,7 @@ from typing import Callable, Dict, Any, Awaitable
 
 from core import config
 from core.database import Database
+from core.db_pool import close_all_pools
 from core.rate_limiter import AdminRateLimitMiddleware
 from handlers import (
     profile,
@@ -23,6 +24,8 @@ from handlers import (
     admin_settings,
 )
 from core.crypto_pay import test_crypto_connection, close_crypto_session
+from core.http_client import get_http_session, close_http_session
+from core.browser_pool import close_browser_pool
 from core.backup import backup_manager
 
 # Настройка логирования
@@ -60,6 +63,9 @@ async def main():
     if not crypto_ok:
         logger.warning("⚠️ Crypto Pay API недоступен. Выплаты могут не работать!")
     
+    # Общая HTTP-сессия парсеров (соединения переиспользуются между запросами)
+    get_http_session()
+    
     # Регистрация middleware
     # Rate limiting для защиты от спама (админы освобождены от лимитов)
     rate_limiter = AdminRateLimitMiddleware(admin_ids=config.ADMIN_IDS)
@@ -85,12 +91,28 @@ async def main():
     # Запуск автоматического бэкапа в фоне
     backup_task = asyncio.create_task(backup_manager.start_auto_backup())
     
+    # Фоновое обновление реплики для admin-аналитики
+    replica_task = asyncio.create_task(db.replica.run_periodic()) if db.replica else None
+    
+    # Фоновый перенос старых видео в архив
+    archive_task = asyncio.create_task(db.archive.run_periodic()) if db.archive else None
+    
+    # Фоновое обслуживание БД: чекпойнты WAL, ANALYZE, incremental_vacuum
+    maintenance_task = asyncio.create_task(db.maintenance.run_periodic()) if db.maintenance else None
+    
     # Запуск бота
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
-        backup_task.cancel()  # Останавливаем бэкап при выключении
+        # Останавливаем фоновые задачи и ждём их завершения до закрытия пулов
+        tasks = [t for t in (backup_task, replica_task, archive_task, maintenance_task) if t]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
         await close_crypto_session()
+        await close_http_session()
+        await close_browser_pool()
+        await close_all_pools()
         await bot.session.close()
 
 
@@ -0,0 +1,225 @@
+"""
+Архив завершённых видео в отдельном файле SQLite
+
+Одобренные и отклонённые видео старше ARCHIVE_AFTER_DAYS переносятся из videos
+в файл архива небольшими пачками через общего писателя, поэтому рабочий набор
+основной БД остаётся небольшим (освобождённые страницы занимают новые видео), а
+перенос не задерживает записи бота дольше одной пачки.
+
+Архив подключается (ATTACH) к каждому соединению пула как схема archive, а
+временное представление all_videos объединяет videos и archive.videos. Через
+all_videos идут история видео, проверки дубликатов и аналитика за произвольный
+период; записи и выборки только недавних видео работают с videos. Дневные
+сводки и счётчики пользователей при переносе не меняются: триггеры удаления
+videos пропускают строки, пока выставлен archive_state.moving.
+
+Архивные видео больше не обновляются — изменение ставки выплат и обновление
+статистики на них не действуют.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Индексы archive.videos под чтения через all_videos
+ARCHIVE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_videos_user_created ON videos(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_videos_created ON videos(created_at)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_videos_url ON videos(video_url)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_videos_video_id ON videos(video_id)",
+    "CREATE INDEX IF NOT EXISTS archive.idx_archive_videos_tiktok_id ON videos(tiktok_video_id)",
+)
+
+# Видео, которые больше не меняются и подлежат переносу
+_FINALIZED = "status IN ('approved', 'rejected') AND created_at < datetime('now', ?)"
+
+
+async def _video_columns(conn: aiosqlite.Connection, schema: str = "main") -> List[Tuple[str, str]]:
+    """Колонки таблицы videos схемы schema: [(имя, тип)]"""
+    async with conn.execute(f"PRAGMA {schema}.table_info(videos)") as cursor:
+        return [(row[1], row[2]) for row in await cursor.fetchall()]
+
+
+async def _ensure_schema(conn: aiosqlite.Connection, columns: List[Tuple[str, str]]):
+    """Создать archive.videos с колонками videos и догнать колонки, добавленные позже"""
+    column_defs = ", ".join(
+        f'"{name}" {type_}' + (" PRIMARY KEY" if name == "id" else "") for name, type_ in columns
+    )
+    await conn.execute(f"CREATE TABLE IF NOT EXISTS archive.videos ({column_defs})")
+    existing = {name for name, _ in await _video_columns(conn, "archive")}
+    for name, type_ in columns:
+        if name not in existing:
+            await conn.execute(f'ALTER TABLE archive.videos ADD COLUMN "{name}" {type_}')
+    for statement in ARCHIVE_INDEXES:
+        await conn.execute(statement)
+    await conn.execute("PRAGMA archive.journal_mode=WAL")
+
+
+async def attach_archive(conn: aiosqlite.Connection, archive_path: Optional[str], *, readonly: bool = False):
+    """
+    Подключить архив к соединению и создать временное представление all_videos
+
+    Без archive_path all_videos совпадает с videos. При readonly архив
+    подключается только на чтение (соединение должно быть открыто с uri=True)
+    и только если файл уже есть.
+    """
+    columns = await _video_columns(conn)
+    if not columns:
+        # Схема ещё не создана — представлению не из чего строиться
+        return
+    names = ", ".join(f'"{name}"' for name, _ in columns)
+    view = f"SELECT {names} FROM main.videos"
+
+    if archive_path and (not readonly or os.path.exists(archive_path)):
+        if readonly:
+            await conn.execute("ATTACH DATABASE ? AS archive", (f"file:{archive_path}?mode=ro",))
+        else:
+            await conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            await _ensure_schema(conn, columns)
+        # Строка может быть в обеих схемах: после сбоя между COMMIT двух файлов
+        # или в реплике, снятой до переноса. Источник истины — videos
+        view += f""" UNION ALL
+            SELECT {names} FROM archive.videos a
+            WHERE NOT EXISTS (SELECT 1 FROM main.videos m WHERE m.id = a.id)"""
+
+    await conn.execute(f"CREATE TEMP VIEW IF NOT EXISTS all_videos AS {view}")
+
+
+class VideoArchiver:
+    """
+    Фоновый перенос завершённых видео из videos в архив
+
+    Args:
+        pool: Пул основной БД с подключённым архивом (записи идут через его писателя)
+        after_days: Возраст видео для переноса (в днях)
+        batch_size: Видео в одной пачке
+        interval: Интервал проходов (в секундах)
+        pause: Пауза между пачками одного прохода (в секундах)
+    """
+
+    def __init__(
+        self,
+        pool,
+        after_days: int = 90,
+        batch_size: int = 500,
+        interval: float = 3600.0,
+        pause: float = 0.5,
+    ):
+        self.pool = pool
+        self.after_days = after_days
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+        self.pause = pause
+
+        self._copy_sql: Optional[str] = None
+
+        self.runs = 0
+        self.archived = 0
+        self.last_duration = 0.0
+
+    async def _copy(self, db: aiosqlite.Connection, ids: str, age: str):
+        """Скопировать (или обновить) видео из ids в архив"""
+        if self._copy_sql is None:
+            names = ", ".join(f'"{name}"' for name, _ in await _video_columns(db))
+            self._copy_sql = f"""INSERT OR REPLACE INTO archive.videos ({names})
+                                 SELECT {names} FROM main.videos
+                                 WHERE id IN (SELECT value FROM json_each(?)) AND {_FINALIZED}"""
+        await db.execute(self._copy_sql, (ids, age))
+
+    async def archive_batch(self) -> int:
+        """
+        Перенести одну пачку видео; возвращает количество перенесённых
+
+        Сначала пачка копируется в архив и фиксируется, затем в отдельной
+        транзакции копия обновляется и строки удаляются из videos. В WAL-режиме
+        COMMIT двух файлов не атомарен вместе — при сбое строка останется в
+        обеих схемах (all_videos покажет её один раз), но не потеряется.
+        """
+        age = f"-{self.after_days} days"
+        async with self.pool.transaction() as db:
+            async with db.execute(
+                f"SELECT id FROM main.videos WHERE {_FINALIZED} ORDER BY created_at LIMIT ?",
+                (age, self.batch_size)
+            ) as cursor:
+                ids = [row[0] for row in await cursor.fetchall()]
+            if not ids:
+                return 0
+            ids = json.dumps(ids)
+            await self._copy(db, ids, age)
+
+        async with self.pool.transaction() as db:
+            await db.execute("UPDATE archive_state SET moving = 1 WHERE id = 1")
+            await self._copy(db, ids, age)
+            cursor = await db.execute(
+                f"DELETE FROM main.videos WHERE id IN (SELECT value FROM json_each(?)) AND {_FINALIZED}",
+                (ids, age)
+            )
+            moved = cursor.rowcount
+            await db.execute(
+                """UPDATE archive_state
+                   SET moving = 0, archived_videos = archived_videos + ?, last_archived_at = CURRENT_TIMESTAMP
+                   WHERE id = 1""",
+                (moved,)
+            )
+        return moved
+
+    async def run_once(self) -> int:
+        """Перенести все подходящие видео пачками; возвращает количество перенесённых"""
+        started = time.monotonic()
+        total = 0
+        while True:
+            moved = await self.archive_batch()
+            total += moved
+            if moved < self.batch_size:
+                break
+            # Между пачками писатель свободен для записей бота
+            await asyncio.sleep(self.pause)
+
+        self.runs += 1
+        self.archived += total
+        self.last_duration = time.monotonic() - started
+        if total:
+            logger.info(f"📦 В архив перенесено видео: {total} ({self.last_duration:.1f} сек)")
+        return total
+
+    async def run_periodic(self):
+        """Фоновая архивация каждые interval секунд"""
+        logger.info(f"✓ Архив видео: старше {self.after_days} дн. (проход каждые {self.interval:.0f} сек)")
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Ошибка архивации видео: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "after_days": self.after_days,
+            "runs": self.runs,
+            "archived": self.archived,
+            "last_run_seconds": round(self.last_duration, 3),
+        }
+
+
+# Общие архиваторы по абсолютному пути к основному файлу БД
+_archivers: Dict[str, VideoArchiver] = {}
+
+
+def get_archiver(pool, **kwargs) -> VideoArchiver:
+    """
+    Получить общий архиватор для пула БД (создаётся при первом обращении)
+
+    Параметры kwargs передаются в VideoArchiver и учитываются только при создании.
+    """
+    key = os.path.abspath(pool.db_path)
+    archiver = _archivers.get(key)
+    if archiver is None or archiver.pool is not pool:
+        archiver = VideoArchiver(pool, **kwargs)
+        _archivers[key] = archiver
+    return archiver
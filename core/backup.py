@@ -1,104 +1,205 @@
+"""
+Автоматический бэкап базы данных
+
+Снимок делается через sqlite3 online backup API в отдельном потоке: копия
+идёт пачками страниц с паузами между шагами и не блокирует цикл событий.
+Все шаги читают одну транзакцию чтения, открытую до начала копирования, —
+в WAL-режиме записи бота продолжаются, а снимок остаётся согласованным
+(включает зафиксированное в -wal и не перезапускается из-за новых записей).
+
+Снимки складываются в BackupStore (core.backup_store): в хранилище и в git
+попадают только изменившиеся чанки, старые снимки удаляются по политике
+хранения. Загрузка на GitHub выполняется асинхронными подпроцессами git;
+восстановление — scripts/restore_backup.py.
+"""
 import asyncio
+import logging
 import os
+import shutil
+import sqlite3
 import subprocess
 from datetime import datetime
-import logging
+from typing import Optional
+
+from core import config
+from core.backup_store import CHUNK_SIZE, BackupStore
 
 logger = logging.getLogger(__name__)
 
+
 class DatabaseBackup:
     """Автоматический бэкап базы данных на GitHub каждые 24 часа"""
-    
-    def __init__(self, db_path: str = "bot_database.db", backup_interval: int = 86400):
+
+    def __init__(
+        self,
+        db_path: str = "bot_database.db",
+        backup_interval: int = 86400,
+        archive_path: Optional[str] = None,
+        backup_dir: str = "backups",
+        chunk_size: int = CHUNK_SIZE,
+        keep_daily: int = 7,
+        keep_weekly: int = 4,
+        keep_monthly: int = 12,
+        pages_per_step: int = 1024,
+        step_pause: float = 0.01,
+        timeout: float = 30.0,
+    ):
         """
         Args:
             db_path: Путь к файлу базы данных
             backup_interval: Интервал бэкапа в секундах (по умолчанию 24 часа)
+            archive_path: Файл архива видео (копируется вместе с основной БД)
+            backup_dir: Каталог хранилища бэкапов
+            chunk_size: Размер чанка хранилища в байтах
+            keep_daily / keep_weekly / keep_monthly: Сколько последних ежедневных,
+                еженедельных и ежемесячных снимков хранить
+            pages_per_step: Страниц БД за один шаг копирования
+            step_pause: Пауза между шагами копирования (в секундах)
+            timeout: Таймаут ожидания блокировки БД (в секундах)
         """
         self.db_path = db_path
         self.backup_interval = backup_interval
-        self.backup_dir = "backups"
-        
+        self.backup_dir = backup_dir
+        self.archive_path = archive_path
+        self.store = BackupStore(backup_dir, chunk_size)
+        self.retention = (keep_daily, keep_weekly, keep_monthly)
+        self.pages_per_step = max(1, pages_per_step)
+        self.step_pause = step_pause
+        self.timeout = timeout
+
+        self.last_duration = 0.0
+
     def create_backup_directory(self):
         """Создает директорию для бэкапов если её нет"""
         if not os.path.exists(self.backup_dir):
             os.makedirs(self.backup_dir)
             logger.info(f"✓ Создана директория для бэкапов: {self.backup_dir}")
-    
-    def backup_database(self):
+
+    def _snapshot(self, source_path: str, backup_path: str):
+        """Снять согласованную копию source_path (выполняется в отдельном потоке)"""
+        tmp_path = f"{backup_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True, timeout=self.timeout)
+        try:
+            # Транзакция чтения на всё копирование: шаги видят один снимок, и
+            # backup не начинается заново после каждой записи бота
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            target = sqlite3.connect(tmp_path)
+            try:
+                source.backup(target, pages=self.pages_per_step, sleep=self.step_pause)
+                # Файл бэкапа самодостаточен — без -wal рядом
+                target.execute("PRAGMA journal_mode=DELETE")
+                check = target.execute("PRAGMA quick_check").fetchone()[0]
+                if check != "ok":
+                    raise sqlite3.DatabaseError(f"копия не прошла quick_check: {check}")
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+        os.replace(tmp_path, backup_path)
+
+    async def backup_database(self) -> bool:
         """Создает бэкап базы данных и загружает на GitHub"""
+        tmp_dir = os.path.join(self.backup_dir, ".tmp")
         try:
             # Проверяем существование БД
             if not os.path.exists(self.db_path):
                 logger.warning(f"⚠️ База данных не найдена: {self.db_path}")
                 return False
-            
+
             # Создаем директорию для бэкапов
             self.create_backup_directory()
-            
-            # Имя файла с датой и временем
+            os.makedirs(tmp_dir, exist_ok=True)
+
+            # Имя снимка с датой и временем
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_filename = f"backup_{timestamp}.db"
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            
-            # Копируем базу данных
-            import shutil
-            shutil.copy2(self.db_path, backup_path)
-            logger.info(f"✓ Создан локальный бэкап: {backup_path}")
-            
+            files = {"main": os.path.join(tmp_dir, os.path.basename(self.db_path))}
+
+            started = asyncio.get_running_loop().time()
+            await asyncio.to_thread(self._snapshot, self.db_path, files["main"])
+            # Архив — после основной БД: видео, перенесённые между снимками, уже
+            # есть в архиве (перенос сначала копирует, затем удаляет из videos)
+            if self.archive_path and os.path.exists(self.archive_path):
+                files["archive"] = os.path.join(tmp_dir, os.path.basename(self.archive_path))
+                await asyncio.to_thread(self._snapshot, self.archive_path, files["archive"])
+
+            result = await asyncio.to_thread(self.store.add, timestamp, files)
+            pruned = await asyncio.to_thread(self.store.prune, *self.retention)
+            self.last_duration = asyncio.get_running_loop().time() - started
+            logger.info(
+                f"✓ Создан снимок {timestamp}: {result['size'] / 2**20:.1f} МБ, "
+                f"новых чанков {result['new_chunks']} из {result['chunks']} "
+                f"({result['stored_bytes'] / 2**20:.1f} МБ сжато), "
+                f"удалено старых снимков {len(pruned['snapshots'])} ({self.last_duration:.1f} сек)"
+            )
+
             # Загружаем на GitHub
-            self.upload_to_github(backup_path, timestamp)
-            
+            await self.upload_to_github(timestamp)
+
             return True
-            
+
         except Exception as e:
             logger.error(f"✗ Ошибка при создании бэкапа: {e}")
             return False
-    
-    def upload_to_github(self, backup_path: str, timestamp: str):
-        """Загружает бэкап на GitHub"""
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    async def _git(*args: str) -> str:
+        """Выполнить git-команду, не блокируя цикл событий"""
+        process = await asyncio.create_subprocess_exec(
+            "git", *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, ["git", *args], output=stdout.decode(errors="replace"),
+                stderr=stderr.decode(errors="replace")
+            )
+        return stdout.decode(errors="replace")
+
+    async def upload_to_github(self, timestamp: str):
+        """Загружает изменения хранилища (новые чанки и снимки, удалённые старые) на GitHub"""
         try:
-            # Добавляем файл в git
-            subprocess.run(["git", "add", backup_path], check=True, capture_output=True)
-            
+            # Добавляем изменения хранилища в git
+            await self._git("add", "--all", "--", os.path.join(self.backup_dir, "snapshots"),
+                            os.path.join(self.backup_dir, "chunks"))
+
             # Создаем коммит
             commit_message = f"backup: Database backup {timestamp}"
-            subprocess.run(
-                ["git", "commit", "-m", commit_message],
-                check=True,
-                capture_output=True
-            )
-            
+            await self._git("commit", "-m", commit_message)
+
             # Пушим на GitHub
-            result = subprocess.run(
-                ["git", "push"],
-                check=True,
-                capture_output=True,
-                text=True
-            )
-            
-            logger.info(f"✓ Бэкап загружен на GitHub: {backup_path}")
+            await self._git("push")
+
+            logger.info(f"✓ Бэкап загружен на GitHub: снимок {timestamp}")
             logger.info(f"📤 Commit: {commit_message}")
-            
+
         except subprocess.CalledProcessError as e:
             logger.error(f"✗ Ошибка при загрузке на GitHub: {e}")
-            if e.output:
-                logger.error(f"Output: {e.output}")
-    
+            if e.stderr or e.output:
+                logger.error(f"Output: {e.stderr or e.output}")
+
     async def start_auto_backup(self):
         """Запускает автоматический бэкап каждые 24 часа"""
         logger.info(f"🔄 Автобэкап запущен (интервал: {self.backup_interval / 3600:.1f} часов)")
-        
+
         while True:
             try:
                 # Делаем первый бэкап сразу
                 logger.info("📦 Начинаю создание бэкапа...")
-                self.backup_database()
-                
+                await self.backup_database()
+
                 # Ждем следующего цикла
                 logger.info(f"⏰ Следующий бэкап через {self.backup_interval / 3600:.1f} часов")
                 await asyncio.sleep(self.backup_interval)
-                
+
             except Exception as e:
                 logger.error(f"✗ Ошибка в цикле автобэкапа: {e}")
                 # Ждем 1 час перед повтором при ошибке
@@ -106,4 +207,13 @@ class DatabaseBackup:
 
 
 # Глобальный экземпляр для использования в bot.py
-backup_manager = DatabaseBackup()
+backup_manager = DatabaseBackup(
+    config.DATABASE_PATH,
+    backup_interval=config.BACKUP_INTERVAL,
+    archive_path=config.ARCHIVE_DATABASE_PATH or None,
+    backup_dir=config.BACKUP_DIR,
+    chunk_size=config.BACKUP_CHUNK_SIZE,
+    keep_daily=config.BACKUP_KEEP_DAILY,
+    keep_weekly=config.BACKUP_KEEP_WEEKLY,
+    keep_monthly=config.BACKUP_KEEP_MONTHLY,
+)
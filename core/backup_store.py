@@ -0,0 +1,238 @@
+"""
+Хранилище бэкапов с дедупликацией по содержимому
+
+Файл снимка режется на чанки фиксированного размера, кратного странице
+SQLite: изменённая страница меняет только свой чанк. Чанк хранится один раз
+под своим SHA-256 (chunks/ab/abcd….zst) и сжат zstd, если установлен пакет
+zstandard, иначе zlib — кодек виден по расширению, поэтому хранилище может
+содержать оба. Снимок — манифест snapshots/<имя>.json со списками чанков
+файлов; манифест пишется последним, так что незавершённый снимок не виден.
+
+Новый снимок добавляет только чанки, которых ещё нет, — объём бэкапа и
+загрузки растёт с объёмом изменений за день, а не с размером БД. Старые
+снимки удаляются по схеме «дед-отец-сын» (prune), после чего чанки, на
+которые не ссылается ни один манифест, удаляются (gc).
+"""
+import hashlib
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+try:
+    import zstandard
+except ImportError:  # zstd необязателен — без него чанки сжимаются zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Кратен любому размеру страницы SQLite (до 64 КБ)
+CHUNK_SIZE = 128 * 1024
+
+_CODECS = ("zst", "z")
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return zlib.compress(data, 6)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zst":
+        if zstandard is None:
+            raise RuntimeError("чанк сжат zstd — установите пакет zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class BackupStore:
+    """
+    Хранилище снимков файлов БД из сжатых чанков
+
+    Args:
+        root: Каталог хранилища
+        chunk_size: Размер чанка в байтах (кратен размеру страницы БД)
+    """
+
+    def __init__(self, root: str, chunk_size: int = CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.codec = "zst" if zstandard is not None else "z"
+
+    # === ЧАНКИ ===
+
+    def _chunk_path(self, digest: str, codec: str) -> str:
+        return os.path.join(self.root, "chunks", digest[:2], f"{digest}.{codec}")
+
+    def _find_chunk(self, digest: str) -> Optional[str]:
+        for codec in _CODECS:
+            path = self._chunk_path(digest, codec)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _read_chunk(self, digest: str) -> bytes:
+        path = self._find_chunk(digest)
+        if path is None:
+            raise FileNotFoundError(f"нет чанка {digest}")
+        with open(path, "rb") as f:
+            data = _decompress(f.read(), path.rsplit(".", 1)[1])
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"чанк {digest} повреждён")
+        return data
+
+    # === СНИМКИ ===
+
+    def _manifest_path(self, name: str) -> str:
+        return os.path.join(self.root, "snapshots", f"{name}.json")
+
+    def add(self, name: str, files: Dict[str, str], created_at: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Сохранить снимок name из файлов {роль: путь}
+
+        Возвращает статистику и written — пути новых файлов хранилища
+        (чанки и манифест).
+        """
+        created_at = created_at or datetime.now()
+        manifest = {"name": name, "created_at": created_at.isoformat(timespec="seconds"), "files": {}}
+        written: List[str] = []
+        stats = {"size": 0, "chunks": 0, "new_chunks": 0, "stored_bytes": 0}
+
+        for role, path in files.items():
+            file_hash = hashlib.sha256()
+            chunks = []
+            size = 0
+            with open(path, "rb") as f:
+                while True:
+                    data = f.read(self.chunk_size)
+                    if not data:
+                        break
+                    file_hash.update(data)
+                    size += len(data)
+                    digest = hashlib.sha256(data).hexdigest()
+                    chunks.append(digest)
+                    if self._find_chunk(digest) is None:
+                        chunk_path = self._chunk_path(digest, self.codec)
+                        compressed = _compress(data, self.codec)
+                        _write_atomic(chunk_path, compressed)
+                        written.append(chunk_path)
+                        stats["new_chunks"] += 1
+                        stats["stored_bytes"] += len(compressed)
+            manifest["files"][role] = {
+                "name": os.path.basename(path),
+                "size": size,
+                "sha256": file_hash.hexdigest(),
+                "chunks": chunks,
+            }
+            stats["size"] += size
+            stats["chunks"] += len(chunks)
+
+        manifest_path = self._manifest_path(name)
+        _write_atomic(manifest_path, json.dumps(manifest, indent=1).encode())
+        written.append(manifest_path)
+        return {"name": name, **stats, "written": written}
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Манифесты всех снимков, от старых к новым"""
+        directory = os.path.join(self.root, "snapshots")
+        if not os.path.isdir(directory):
+            return []
+        manifests = []
+        for filename in os.listdir(directory):
+            if filename.endswith(".json"):
+                with open(os.path.join(directory, filename), encoding="utf-8") as f:
+                    manifests.append(json.load(f))
+        return sorted(manifests, key=lambda m: (m["created_at"], m["name"]))
+
+    def restore(self, name: str, target_dir: str, roles: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        Собрать файлы снимка name в target_dir; возвращает пути собранных файлов
+
+        Каждый чанк и файл целиком сверяются с SHA-256 из манифеста; файл
+        появляется под своим именем только после успешной проверки.
+        """
+        with open(self._manifest_path(name), encoding="utf-8") as f:
+            manifest = json.load(f)
+        os.makedirs(target_dir, exist_ok=True)
+
+        restored = []
+        for role, entry in manifest["files"].items():
+            if roles is not None and role not in roles:
+                continue
+            path = os.path.join(target_dir, entry["name"])
+            tmp_path = f"{path}.restore"
+            file_hash = hashlib.sha256()
+            with open(tmp_path, "wb") as f:
+                for digest in entry["chunks"]:
+                    data = self._read_chunk(digest)
+                    file_hash.update(data)
+                    f.write(data)
+            if file_hash.hexdigest() != entry["sha256"]:
+                os.remove(tmp_path)
+                raise ValueError(f"файл {entry['name']} снимка {name} не совпадает с манифестом")
+            os.replace(tmp_path, path)
+            restored.append(path)
+        return restored
+
+    # === ХРАНЕНИЕ ===
+
+    def retained(self, daily: int, weekly: int, monthly: int) -> Set[str]:
+        """
+        Снимки, которые остаются по схеме «дед-отец-сын»
+
+        Последний снимок каждого из daily последних дней, weekly последних
+        недель и monthly последних месяцев; самый свежий снимок — всегда.
+        """
+        manifests = list(reversed(self.snapshots()))
+        keep: Set[str] = set()
+        if manifests:
+            keep.add(manifests[0]["name"])
+        for count, period in ((daily, "%Y-%m-%d"), (weekly, "%G-%V"), (monthly, "%Y-%m")):
+            seen = set()
+            for manifest in manifests:
+                key = datetime.fromisoformat(manifest["created_at"]).strftime(period)
+                if key in seen:
+                    continue
+                if len(seen) >= count:
+                    break
+                seen.add(key)
+                keep.add(manifest["name"])
+        return keep
+
+    def prune(self, daily: int, weekly: int, monthly: int) -> Dict[str, Any]:
+        """Удалить снимки вне политики хранения и освободившиеся чанки"""
+        keep = self.retained(daily, weekly, monthly)
+        removed = [m["name"] for m in self.snapshots() if m["name"] not in keep]
+        for name in removed:
+            os.remove(self._manifest_path(name))
+        return {"snapshots": removed, "chunks": self.gc() if removed else 0}
+
+    def gc(self) -> int:
+        """Удалить чанки, на которые не ссылается ни один снимок; возвращает их количество"""
+        referenced = {
+            digest
+            for manifest in self.snapshots()
+            for entry in manifest["files"].values()
+            for digest in entry["chunks"]
+        }
+        directory = os.path.join(self.root, "chunks")
+        removed = 0
+        if not os.path.isdir(directory):
+            return 0
+        for prefix in os.listdir(directory):
+            for filename in os.listdir(os.path.join(directory, prefix)):
+                if filename.split(".", 1)[0] not in referenced:
+                    os.remove(os.path.join(directory, prefix, filename))
+                    removed += 1
+        return removed
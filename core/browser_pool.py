@@ -0,0 +1,276 @@
+"""
+Пул браузеров Playwright для резервного парсинга TikTok
+
+Chromium запускается лениво при первом запросе и живёт между запросами:
+холодный старт (1–3 секунды и сотни МБ памяти) платится один раз, а не на
+каждый парсинг. Запросы получают страницу в одном из ограниченного набора
+прогретых контекстов (cookies и кэш TikTok сохраняются между запросами);
+пока контекст занят, другой запрос его не получает, поэтому одновременно
+открыто не больше size страниц, а параллельные парсинги ждут очереди, а не
+запускают свои браузеры.
+
+Контекст пересоздаётся после context_max_pages страниц, браузер — после
+browser_max_pages страниц или при падении процесса Chromium.
+
+Использование:
+    async with get_browser_pool().page() as page:
+        await page.goto(url)
+"""
+import asyncio
+import logging
+import math
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_ARGS = [
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-blink-features=AutomationControlled',
+    '--disable-dev-shm-usage',
+    '--disable-web-security',
+]
+
+CONTEXT_OPTIONS: Dict[str, Any] = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'locale': 'ru-RU',
+    'timezone_id': 'Europe/Moscow',
+    'extra_http_headers': {
+        'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    },
+}
+
+# Ресурсы, не нужные для разбора страницы
+BLOCKED_RESOURCES = {'image', 'media', 'font'}
+
+
+async def _block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class _Browser:
+    """Запущенный Chromium и счётчики для его пересоздания"""
+
+    def __init__(self, browser):
+        self.browser = browser
+        self.contexts = 0
+        self.pages = 0
+        self.retiring = False
+
+    @property
+    def usable(self) -> bool:
+        return not self.retiring and self.browser.is_connected()
+
+
+class _Context:
+    """Контекст браузера, выдаваемый одному запросу за раз"""
+
+    def __init__(self, context, owner: _Browser):
+        self.context = context
+        self.owner = owner
+        self.pages = 0
+
+
+class BrowserPool:
+    """
+    Пул браузеров и прогретых контекстов Playwright
+
+    Args:
+        size: Контекстов в пуле (= одновременно открытых страниц)
+        browsers: Сколько процессов Chromium делят контексты
+        context_max_pages: Страниц в контексте до его пересоздания
+        browser_max_pages: Страниц в браузере до его перезапуска
+        block_resources: Не загружать картинки, видео и шрифты
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        browsers: int = 1,
+        context_max_pages: int = 50,
+        browser_max_pages: int = 500,
+        block_resources: bool = True,
+    ):
+        self.size = max(1, size)
+        self.browsers = max(1, min(browsers, self.size))
+        self.context_max_pages = context_max_pages
+        self.browser_max_pages = browser_max_pages
+        self.block_resources = block_resources
+
+        self._slots = asyncio.Semaphore(self.size)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browsers: List[_Browser] = []
+        # Свободные контексты; последним вернувшийся выдаётся первым
+        self._idle: List[_Context] = []
+
+        self.launches = 0
+        self.pages_served = 0
+        self.recycled_contexts = 0
+
+    # === БРАУЗЕРЫ И КОНТЕКСТЫ ===
+
+    async def _launch(self) -> _Browser:
+        if self._playwright is None:
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+        logger.info("🌐 Запускаем браузер Chromium для пула")
+        browser = _Browser(await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS))
+        browser.browser.on("disconnected", lambda _: logger.warning("⚠️ Браузер пула отключился"))
+        self._browsers.append(browser)
+        self.launches += 1
+        return browser
+
+    async def _new_context(self) -> _Context:
+        per_browser = math.ceil(self.size / self.browsers)
+        owner = min(
+            (b for b in self._browsers if b.usable and b.contexts < per_browser),
+            key=lambda b: b.contexts,
+            default=None,
+        )
+        if owner is None:
+            owner = await self._launch()
+        context = await owner.browser.new_context(**CONTEXT_OPTIONS)
+        if self.block_resources:
+            await context.route("**/*", _block_resources)
+        owner.contexts += 1
+        return _Context(context, owner)
+
+    async def _discard(self, ctx: _Context):
+        """Закрыть контекст и браузер, если он больше не нужен"""
+        owner = ctx.owner
+        owner.contexts -= 1
+        self.recycled_contexts += 1
+        try:
+            await ctx.context.close()
+        except Exception as e:
+            logger.debug(f"Контекст уже закрыт: {e}")
+        await self._prune()
+
+    async def _prune(self):
+        """Закрыть браузеры, которые больше не используются и не держат контекстов"""
+        for owner in [b for b in self._browsers if b.contexts == 0 and not b.usable]:
+            self._browsers.remove(owner)
+            try:
+                await owner.browser.close()
+            except Exception as e:
+                logger.debug(f"Браузер уже закрыт: {e}")
+            logger.info(f"♻️ Браузер пула перезапускается после {owner.pages} страниц")
+
+    async def _checkout(self) -> _Context:
+        async with self._lock:
+            while self._idle:
+                ctx = self._idle.pop()
+                if ctx.owner.usable:
+                    return ctx
+                await self._discard(ctx)
+            # Упавший без контекстов браузер не попадёт в _discard
+            await self._prune()
+            return await self._new_context()
+
+    async def _checkin(self, ctx: _Context, healthy: bool):
+        async with self._lock:
+            owner = ctx.owner
+            if owner.pages >= self.browser_max_pages:
+                owner.retiring = True
+            if healthy and owner.usable and ctx.pages < self.context_max_pages:
+                self._idle.append(ctx)
+                return
+            await self._discard(ctx)
+            # Свободные контексты уходящего браузера тоже закрываем, чтобы он завершился
+            if not owner.usable:
+                for idle in [c for c in self._idle if c.owner is owner]:
+                    self._idle.remove(idle)
+                    await self._discard(idle)
+
+    # === API ===
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator[Any]:
+        """Новая страница в свободном контексте; закрывается при выходе"""
+        async with self._slots:
+            ctx = await self._checkout()
+            page = None
+            healthy = True
+            try:
+                page = await ctx.context.new_page()
+                yield page
+            finally:
+                ctx.pages += 1
+                ctx.owner.pages += 1
+                self.pages_served += 1
+                if page is not None:
+                    try:
+                        await page.close()
+                    except Exception:
+                        healthy = False
+                healthy = healthy and page is not None and ctx.owner.browser.is_connected()
+                await self._checkin(ctx, healthy)
+
+    async def close(self):
+        """Закрыть все контексты, браузеры и Playwright"""
+        async with self._lock:
+            for ctx in self._idle:
+                try:
+                    await ctx.context.close()
+                except Exception:
+                    pass
+            self._idle.clear()
+            for owner in self._browsers:
+                try:
+                    await owner.browser.close()
+                except Exception:
+                    pass
+            self._browsers.clear()
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "browsers": sum(1 for b in self._browsers if b.browser.is_connected()),
+            "contexts": sum(b.contexts for b in self._browsers),
+            "idle_contexts": len(self._idle),
+            "launches": self.launches,
+            "pages_served": self.pages_served,
+            "recycled_contexts": self.recycled_contexts,
+        }
+
+
+_pool: Optional[BrowserPool] = None
+
+
+def get_browser_pool() -> BrowserPool:
+    """Получить общий пул браузеров (Chromium запускается при первой странице)"""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool(
+            size=config.BROWSER_POOL_SIZE,
+            browsers=config.BROWSER_POOL_BROWSERS,
+            context_max_pages=config.BROWSER_CONTEXT_MAX_PAGES,
+            browser_max_pages=config.BROWSER_MAX_PAGES,
+            block_resources=config.BROWSER_BLOCK_RESOURCES,
+        )
+    return _pool
+
+
+async def close_browser_pool():
+    """Закрыть общий пул браузеров"""
+    global _pool
+    if _pool is None:
+        return
+    try:
+        await _pool.close()
+        logger.info("Пул браузеров закрыт")
+    except Exception as e:
+        logger.error(f"Ошибка закрытия пула браузеров: {e}")
+    finally:
+        _pool = None
@@ -0,0 +1,113 @@
+"""
+Ограниченный in-process кэш (LRU + TTL) для часто читаемых данных БД
+
+Используется Database для get_user, get_user_tier, get_user_tiktok,
+get_user_youtube и get_user_youtube_rate. Записи сбрасываются методами записи
+после COMMIT; счётчик поколений не даёт чтению, начатому до записи, положить в
+кэш устаревшее значение.
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+# Маркер отсутствия значения (None — допустимое значение в кэше)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    LRU-кэш с временем жизни записей
+
+    Args:
+        maxsize: Максимальное количество записей
+        ttl: Время жизни записи (в секундах)
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 60.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        """Значение по ключу или MISSING"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return MISSING
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None, ttl: Optional[float] = None):
+        """
+        Сохранить значение
+
+        Если передан generation и с тех пор были сбросы, значение могло устареть —
+        оно не сохраняется. ttl задаёт время жизни этой записи вместо общего.
+        """
+        if generation is not None and generation != self.generation:
+            return
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Hashable):
+        """Сбросить записи по ключам"""
+        self.generation += 1
+        for key in keys:
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Сбросить весь кэш"""
+        self.generation += 1
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий и состояние кэша"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+# Общие кэши по абсолютному пути к файлу БД
+_caches: Dict[str, TTLCache] = {}
+
+
+def get_cache(db_path: str, **kwargs) -> TTLCache:
+    """
+    Получить общий кэш для файла БД (создаётся при первом обращении)
+
+    Параметры kwargs передаются в TTLCache и учитываются только при создании.
+    """
+    key = os.path.abspath(db_path)
+    cache = _caches.get(key)
+    if cache is None:
+        cache = TTLCache(**kwargs)
+        _caches[key] = cache
+    return cache
@@ -22,6 +22,59 @@ TIKTOK_RATE_PER_1000_VIEWS = 65  # 65 рублей за 1000 просмотро
 
 # Database
 DATABASE_PATH = "bot_database.db"
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))  # Соединений в общем пуле
+DATABASE_STATEMENT_CACHE = int(os.getenv("DATABASE_STATEMENT_CACHE", "256"))  # Кэш выражений на соединение
+DATABASE_WRITE_BATCH = int(os.getenv("DATABASE_WRITE_BATCH", "64"))  # Записей в одной групповой транзакции
+DB_METRICS_ENABLED = os.getenv("DB_METRICS_ENABLED", "false").lower() == "true"  # Замер задержек SQL-запросов
+DB_METRICS_WINDOW = int(os.getenv("DB_METRICS_WINDOW", "1000"))  # Скользящее окно задержек на метод
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))  # Порог медленного запроса (мс)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))  # Записей в кэше данных пользователей
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))  # Время жизни записи кэша (сек)
+ANALYTICS_REPLICA_PATH = os.getenv("ANALYTICS_REPLICA_PATH", "")  # Снимок БД для admin-аналитики (пусто — выключено)
+ANALYTICS_REPLICA_MAX_STALENESS = float(os.getenv("ANALYTICS_REPLICA_MAX_STALENESS", "300"))  # Допустимый возраст снимка (сек)
+ANALYTICS_REPLICA_REFRESH_INTERVAL = float(os.getenv("ANALYTICS_REPLICA_REFRESH_INTERVAL", "120"))  # Интервал обновления снимка (сек)
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH", "")  # Файл архива старых видео (пусто — выключено)
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))  # Возраст завершённых видео для переноса (дней)
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))  # Видео в одной пачке переноса
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "3600"))  # Интервал проходов архивации (сек)
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() == "true"  # Фоновое обслуживание БД
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", "300"))  # Интервал чекпойнтов WAL (сек)
+MAINTENANCE_WINDOW = os.getenv("MAINTENANCE_WINDOW", "03:00-06:00")  # Окно для ANALYZE и vacuum (пусто — любое время)
+MAINTENANCE_ANALYSIS_LIMIT = int(os.getenv("MAINTENANCE_ANALYSIS_LIMIT", "1000"))  # PRAGMA analysis_limit
+MAINTENANCE_VACUUM_PAGES = int(os.getenv("MAINTENANCE_VACUUM_PAGES", "256"))  # Страниц за шаг incremental_vacuum
+MAINTENANCE_WAL_TRUNCATE_MB = int(os.getenv("MAINTENANCE_WAL_TRUNCATE_MB", "64"))  # Размер -wal для обрезки (МБ)
+
+# Backups
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")  # Хранилище бэкапов (чанки и манифесты снимков)
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "86400"))  # Интервал бэкапа (сек)
+BACKUP_CHUNK_SIZE = int(os.getenv("BACKUP_CHUNK_SIZE", "131072"))  # Размер чанка (байт, кратен странице БД)
+BACKUP_KEEP_DAILY = int(os.getenv("BACKUP_KEEP_DAILY", "7"))  # Хранить последних ежедневных снимков
+BACKUP_KEEP_WEEKLY = int(os.getenv("BACKUP_KEEP_WEEKLY", "4"))  # Хранить последних еженедельных снимков
+BACKUP_KEEP_MONTHLY = int(os.getenv("BACKUP_KEEP_MONTHLY", "12"))  # Хранить последних ежемесячных снимков
+
+# HTTP client (общая сессия парсеров)
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "100"))  # Всего открытых соединений
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "10"))  # Соединений к одному хосту
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))  # Простой соединения до закрытия (сек)
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))  # Время жизни DNS-кэша (сек)
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))  # Таймаут запроса по умолчанию (сек)
+HTTP_STREAM_CHUNK_SIZE = int(os.getenv("HTTP_STREAM_CHUNK_SIZE", "16384"))  # Часть тела при потоковом чтении (байт)
+HTTP_STREAM_DRAIN_BYTES = int(os.getenv("HTTP_STREAM_DRAIN_BYTES", "65536"))  # Остаток тела (байт по сети), который дочитывается ради keep-alive
+
+# Browser pool (Playwright для резервного парсинга TikTok)
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))  # Контекстов (= одновременно открытых страниц)
+BROWSER_POOL_BROWSERS = int(os.getenv("BROWSER_POOL_BROWSERS", "1"))  # Процессов Chromium
+BROWSER_CONTEXT_MAX_PAGES = int(os.getenv("BROWSER_CONTEXT_MAX_PAGES", "50"))  # Страниц до пересоздания контекста
+BROWSER_MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "500"))  # Страниц до перезапуска браузера
+BROWSER_BLOCK_RESOURCES = os.getenv("BROWSER_BLOCK_RESOURCES", "true").lower() == "true"  # Не грузить картинки, видео и шрифты
+
+# Parse cache (результаты парсинга TikTok/YouTube)
+PARSE_CACHE_SIZE = int(os.getenv("PARSE_CACHE_SIZE", "2048"))  # Записей в памяти
+PARSE_CACHE_TTL_BIO = float(os.getenv("PARSE_CACHE_TTL_BIO", "15"))  # Био TikTok и описание YouTube канала (сек)
+PARSE_CACHE_TTL_VIDEO = float(os.getenv("PARSE_CACHE_TTL_VIDEO", "300"))  # Метаданные видео (сек)
+PARSE_CACHE_NEGATIVE_TTL = float(os.getenv("PARSE_CACHE_NEGATIVE_TTL", "120"))  # Видео не найдено / удалено (сек)
+PARSE_CACHE_PATH = os.getenv("PARSE_CACHE_PATH", "")  # SQLite-файл дискового кэша (пусто — только память)
 
 # TikTok Parser
 TIKTOK_PARSER_TEST_MODE = os.getenv("TIKTOK_PARSER_TEST_MODE", "false").lower() == "true"
+TIKTOK_STREAM_FETCH = os.getenv("TIKTOK_STREAM_FETCH", "true").lower() == "true"  # Обрывать загрузку страницы после блока JSON
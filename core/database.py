@@ -1,272 +1,199 @@
 import aiosqlite
+import json
 import logging
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+import sys
+from contextlib import asynccontextmanager
+from datetime import datetime, time, timedelta
+from itertools import islice
+from typing import Optional, List, Dict, Any, Iterable
+
+from core import config
+from core.archive import get_archiver
+from core.cache import MISSING, get_cache
+from core.db_metrics import query_metrics
+from core.db_pool import get_pool
+from core.leaderboard import Leaderboard, get_leaderboard
+from core.maintenance import get_maintenance, parse_window
+from core.migrations import fill_daily_stats, fill_user_daily_stats, migrate
+from core.replica import get_replica
 
 logger = logging.getLogger(__name__)
 
 
-class Database:
-    def __init__(self, db_path: str):
-        self.db_path = db_path
+def _rollup_span(start_date: datetime, end_date: datetime):
+    """
+    Целые сутки внутри [start_date, end_date] (первый и последний день)
 
-    async def init_db(self):
-        """Инициализация базы данных"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            # Включаем WAL режим для лучшей конкурентности
-            await db.execute("PRAGMA journal_mode=WAL")
-            await db.execute("PRAGMA busy_timeout=30000")  # 30 секунд
-            await db.commit()
-
-            # Таблица пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    full_name TEXT,
-                    balance REAL DEFAULT 0,
-                    total_videos INTEGER DEFAULT 0,
-                    total_views INTEGER DEFAULT 0,
-                    total_withdrawn REAL DEFAULT 0,
-                    referrer_id INTEGER,
-                    referral_earnings REAL DEFAULT 0,
-                    tier TEXT DEFAULT 'bronze',
-                    last_key_issued_at TIMESTAMP,
-                    blocked_until TIMESTAMP,
-                    free_key_claimed_at TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (referrer_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица каналов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    channel_id TEXT NOT NULL,
-                    channel_name TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    UNIQUE(user_id, channel_id)
-                )
-            """)
-
-            # Таблица роликов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS videos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    channel_id INTEGER,
-                    youtube_channel_id INTEGER,
-                    platform TEXT DEFAULT 'tiktok',
-                    video_url TEXT NOT NULL UNIQUE,
-                    video_id TEXT UNIQUE,
-                    tiktok_video_id TEXT,
-                    video_title TEXT,
-                    video_author TEXT,
-                    video_published_at TIMESTAMP,
-                    views INTEGER DEFAULT 0,
-                    likes INTEGER DEFAULT 0,
-                    comments INTEGER DEFAULT 0,
-                    shares INTEGER DEFAULT 0,
-                    favorites INTEGER DEFAULT 0,
-                    earnings REAL DEFAULT 0,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    FOREIGN KEY (channel_id) REFERENCES channels(id),
-                    FOREIGN KEY (youtube_channel_id) REFERENCES youtube_channels(id)
-                )
-            """)
+    Эти дни читаются из daily_stats, неполные дни по краям — из videos.
+    Если целых суток нет, возвращает None.
+    """
+    start_date = start_date.replace(microsecond=0)
+    first = start_date.date() if start_date.time() == time.min else start_date.date() + timedelta(days=1)
+    last = end_date.date() if end_date.time() >= time(23, 59, 59) else end_date.date() - timedelta(days=1)
+    if first > last:
+        return None
+    return first, last
 
-            # Миграция: добавляем tiktok_video_id если его нет
-            try:
-                await db.execute("ALTER TABLE videos ADD COLUMN tiktok_video_id TEXT")
-                await db.commit()
-                logger.info("✅ Добавлена колонка tiktok_video_id")
-            except Exception:
-                pass
-
-            # Таблица заявок на вывод
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS withdrawal_requests (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    amount REAL NOT NULL,
-                    payment_method TEXT NOT NULL,
-                    payment_details TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    processed_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица способов выплат
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS payment_methods (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    method_type TEXT NOT NULL,
-                    details TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица рефералов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS referrals (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    referrer_id INTEGER NOT NULL,
-                    referred_id INTEGER NOT NULL,
-                    earnings REAL DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (referrer_id) REFERENCES users(user_id),
-                    FOREIGN KEY (referred_id) REFERENCES users(user_id),
-                    UNIQUE(referrer_id, referred_id)
-                )
-            """)
-
-            # Таблица TikTok аккаунтов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS tiktok_accounts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL UNIQUE,
-                    username TEXT NOT NULL UNIQUE COLLATE NOCASE,
-                    url TEXT NOT NULL,
-                    verification_code TEXT,
-                    is_verified INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    verified_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица YouTube каналов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS youtube_channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL UNIQUE,
-                    channel_id TEXT NOT NULL UNIQUE COLLATE NOCASE,
-                    channel_handle TEXT,
-                    channel_name TEXT,
-                    url TEXT NOT NULL,
-                    verification_code TEXT,
-                    is_verified INTEGER DEFAULT 0,
-                    rate_per_1000_views REAL DEFAULT 50.0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    verified_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица выплат через Crypto Pay
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS crypto_payouts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    video_id INTEGER NOT NULL,
-                    amount_rub REAL NOT NULL,
-                    amount_usdt REAL NOT NULL,
-                    spend_id TEXT NOT NULL UNIQUE,
-                    transfer_id TEXT,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    paid_at TIMESTAMP,
-                    admin_id INTEGER,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    FOREIGN KEY (video_id) REFERENCES videos(id)
-                )
-            """)
-
-            # Таблица ключей для медиапартнёров
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS media_keys (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    key_value TEXT NOT NULL UNIQUE,
-                    status TEXT DEFAULT 'available',
-                    is_free_promo INTEGER DEFAULT 0,
-                    assigned_to INTEGER,
-                    uploaded_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    assigned_at TIMESTAMP,
-                    FOREIGN KEY (assigned_to) REFERENCES users(user_id),
-                    FOREIGN KEY (uploaded_by) REFERENCES users(user_id)
-                )
-            """)
-
-            # Индексы для оптимизации запросов
-            logger.info("Creating database indexes...")
 
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_tier ON users(tier)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_referrer_id ON users(referrer_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_blocked_until ON users(blocked_until)")
-
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_user_id ON videos(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_status ON videos(status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_platform ON videos(platform)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(created_at)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_user_status ON videos(user_id, status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_platform_status ON videos(platform, status)")
-
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_yt_channels_user_id ON youtube_channels(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_yt_channels_channel_id ON youtube_channels(channel_id)")
-
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_user ON crypto_payouts(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_video ON crypto_payouts(video_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_status ON crypto_payouts(status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_created_at ON crypto_payouts(created_at)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_user_status ON crypto_payouts(user_id, status)")
+class Database:
+    # Виды кэшируемых данных пользователя (см. _cached)
+    _CACHED_KINDS = ('user', 'tier', 'tiktok', 'youtube', 'youtube_rate')
 
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_user_id ON tiktok_accounts(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_username ON tiktok_accounts(username)")
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # Пул общий для всех экземпляров с тем же файлом БД
+        self._pool = get_pool(
+            db_path,
+            size=config.DATABASE_POOL_SIZE,
+            statement_cache=config.DATABASE_STATEMENT_CACHE,
+            write_batch=config.DATABASE_WRITE_BATCH,
+            archive_path=config.ARCHIVE_DATABASE_PATH or None,
+        )
+        # Кэш get_user / get_user_tier / get_user_tiktok / get_user_youtube / get_user_youtube_rate
+        self._cache = get_cache(db_path, maxsize=config.USER_CACHE_SIZE, ttl=config.USER_CACHE_TTL)
+        # Top-K рейтинги пользователей для get_top_users / get_top_users_by_platform
+        self._leaderboard = get_leaderboard(db_path)
+        # Снимок БД для тяжёлой admin-аналитики (если задан ANALYTICS_REPLICA_PATH)
+        self.replica = None
+        if config.ANALYTICS_REPLICA_PATH:
+            self.replica = get_replica(
+                db_path,
+                config.ANALYTICS_REPLICA_PATH,
+                max_staleness=config.ANALYTICS_REPLICA_MAX_STALENESS,
+                refresh_interval=config.ANALYTICS_REPLICA_REFRESH_INTERVAL,
+                archive_path=config.ARCHIVE_DATABASE_PATH or None,
+            )
+        # Перенос старых видео в архив (если задан ARCHIVE_DATABASE_PATH); чтения
+        # истории и аналитики идут через представление all_videos (см. core.archive)
+        self.archive = None
+        if config.ARCHIVE_DATABASE_PATH:
+            self.archive = get_archiver(
+                self._pool,
+                after_days=config.ARCHIVE_AFTER_DAYS,
+                batch_size=config.ARCHIVE_BATCH_SIZE,
+                interval=config.ARCHIVE_INTERVAL,
+            )
+        # Чекпойнты WAL, ANALYZE и incremental_vacuum в фоне (см. core.maintenance)
+        self.maintenance = None
+        if config.MAINTENANCE_ENABLED:
+            self.maintenance = get_maintenance(
+                self._pool,
+                interval=config.MAINTENANCE_INTERVAL,
+                window=parse_window(config.MAINTENANCE_WINDOW),
+                analysis_limit=config.MAINTENANCE_ANALYSIS_LIMIT,
+                vacuum_pages=config.MAINTENANCE_VACUUM_PAGES,
+                wal_truncate_bytes=config.MAINTENANCE_WAL_TRUNCATE_MB * 2**20,
+            )
 
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_referrals_referrer_id ON referrals(referrer_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_referrals_referred_id ON referrals(referred_id)")
+    def _connect(self, method: Optional[str] = None):
+        """
+        Читающее соединение из общего пула (async with self._connect() as db)
 
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_media_keys_status ON media_keys(status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_media_keys_assigned_to ON media_keys(assigned_to)")
+        method — имя публичного метода для метрик запросов; по умолчанию
+        вызывающий метод. Приватные помощники передают его явно.
+        """
+        if query_metrics.enabled:
+            return query_metrics.instrument(self._pool.connection(), method or sys._getframe(1).f_code.co_name)
+        return self._pool.connection()
 
-            # Оптимизация настроек БД
-            await db.execute("PRAGMA cache_size=-10000")  # 10MB кэш
-            await db.execute("PRAGMA synchronous=NORMAL")
-            await db.execute("PRAGMA temp_store=MEMORY")
+    def _analytics(self, method: Optional[str] = None):
+        """
+        Соединение для тяжёлых admin-чтений (async with self._analytics() as db)
 
-            # Добавляем колонку для даты выдачи ключа (если ещё нет)
-            try:
-                await db.execute("ALTER TABLE users ADD COLUMN last_key_issued_at TIMESTAMP")
-                await db.commit()
-                logger.info("✅ Добавлена колонка last_key_issued_at")
-            except Exception:
-                pass
+        Читает из реплики, если она включена и не старше допустимого; иначе из пула.
+        Пользовательские пути всегда используют _connect().
+        """
+        source = self._pool.connection() if self.replica is None else self._replica_or_primary()
+        if query_metrics.enabled:
+            source = query_metrics.instrument(source, method or sys._getframe(1).f_code.co_name)
+        return source
+
+    @asynccontextmanager
+    async def _replica_or_primary(self):
+        source = self.replica.connection() if await self.replica.ready() else self._pool.connection()
+        async with source as db:
+            yield db
+
+    def _write(self, users: Iterable[int] = (), method: Optional[str] = None):
+        """
+        Запись через единственного писателя с групповым коммитом (async with self._write() as db)
 
-            try:
-                await db.execute("ALTER TABLE users ADD COLUMN blocked_until TIMESTAMP")
-                await db.commit()
-                logger.info("✅ Добавлена колонка blocked_until")
-            except Exception:
-                pass
+        users — пользователи, чьи записи в кэше сбрасываются после COMMIT.
+        """
+        source = self._pool.transaction()
+        if query_metrics.enabled:
+            source = query_metrics.instrument(source, method or sys._getframe(1).f_code.co_name)
+        if users:
+            source = self._invalidating(source, users)
+        return source
+
+    @asynccontextmanager
+    async def _invalidating(self, source, users: Iterable[int]):
+        try:
+            async with source as db:
+                yield db
+        finally:
+            self._forget_users(*users)
+
+    def _forget_users(self, *user_ids: int):
+        """Сбросить кэшированные данные пользователей"""
+        self._cache.invalidate(*(
+            (kind, user_id) for user_id in user_ids for kind in self._CACHED_KINDS
+        ))
+
+    async def _cached(self, kind: str, user_id: int, fetch):
+        """Прочитать значение из кэша или загрузить через fetch(user_id)"""
+        key = (kind, user_id)
+        value = self._cache.get(key)
+        if value is MISSING:
+            generation = self._cache.generation
+            value = await fetch(user_id)
+            self._cache.set(key, value, generation)
+        # Вызывающий код может менять словарь — отдаём копию
+        return dict(value) if isinstance(value, dict) else value
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша пользовательских данных и рейтингов"""
+        return {**self._cache.stats(), "leaderboard": self._leaderboard.stats()}
+
+    def get_query_metrics(self) -> Dict[str, Any]:
+        """Задержки запросов по методам, медленные запросы и состояние пула"""
+        metrics = {**query_metrics.snapshot(), "pool": self._pool.stats()}
+        if self.replica is not None:
+            metrics["replica"] = self.replica.stats()
+        if self.archive is not None:
+            metrics["archive"] = self.archive.stats()
+        if self.maintenance is not None:
+            metrics["maintenance"] = self.maintenance.stats()
+        return metrics
 
-            try:
-                await db.execute("ALTER TABLE users ADD COLUMN free_key_claimed_at TIMESTAMP")
-                await db.commit()
-                logger.info("✅ Добавлена колонка free_key_claimed_at")
-            except Exception:
-                pass
+    async def init_db(self):
+        """Инициализация базы данных: применить недостающие миграции схемы"""
+        version = await migrate(self.db_path)
+        logger.info(f"Database schema is up to date (version {version})")
+        await self.sync_payout_rates()
 
-            try:
-                await db.execute("ALTER TABLE media_keys ADD COLUMN is_free_promo INTEGER DEFAULT 0")
-                await db.commit()
-                logger.info("✅ Добавлена колонка is_free_promo в media_keys")
-            except Exception:
-                pass
+    async def sync_payout_rates(self):
+        """
+        Записать ставки из config в payout_rates
 
-            await db.commit()
-            logger.info("Database initialized successfully with optimized indexes")
+        При изменении ставки триггер пересчитывает videos.effective_earnings для
+        видео платформы без начислений.
+        """
+        async with self._write() as db:
+            async with db.execute(
+                """INSERT INTO payout_rates (platform, rate_per_1000) VALUES ('tiktok', ?)
+                   ON CONFLICT(platform) DO UPDATE SET rate_per_1000 = excluded.rate_per_1000
+                   WHERE rate_per_1000 != excluded.rate_per_1000
+                   RETURNING platform, rate_per_1000""",
+                (config.TIKTOK_RATE_PER_1000_VIEWS,)
+            ) as cursor:
+                changed = await cursor.fetchall()
+        for platform, rate in changed:
+            logger.info(f"Payout rate for {platform} set to {rate} per 1000 views")
+        if changed:
+            # Пересчёт effective_earnings меняет approved_earnings многих пользователей
+            self._cache.clear()
 
     # === MEDIA KEY METHODS ===
     async def add_media_keys(
@@ -279,26 +206,104 @@ class Database:
         """Добавить список ключей"""
         if not keys:
             return 0
-        inserted = 0
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            for raw_key in keys:
-                key_value = raw_key.strip()
-                if not key_value:
-                    continue
-                try:
-                    await db.execute(
-                        "INSERT INTO media_keys (key_value, uploaded_by, is_free_promo) VALUES (?, ?, ?)",
-                        (key_value, uploaded_by, 1 if is_free_promo else 0)
+        result = await self.import_media_keys(keys, uploaded_by, is_free_promo=is_free_promo)
+        return result['inserted']
+
+    async def import_media_keys(
+        self,
+        lines: Iterable[str],
+        uploaded_by: Optional[int] = None,
+        *,
+        is_free_promo: bool = False,
+        chunk_size: int = 5000,
+    ) -> Dict[str, int]:
+        """
+        Потоковый импорт ключей (по строке на ключ)
+
+        Строки читаются из lines частями по chunk_size и вставляются одним
+        executemany с INSERT OR IGNORE. Возвращает total (непустых строк),
+        inserted и duplicates (повторы в файле и уже загруженные ключи).
+        """
+        promo = 1 if is_free_promo else 0
+        total = inserted = 0
+        stripped = (line.strip() for line in lines)
+        keys = (key for key in stripped if key)
+
+        while True:
+            chunk = list(islice(keys, chunk_size))
+            if not chunk:
+                break
+            total += len(chunk)
+            async with self._write() as db:
+                changes_before = db.total_changes
+                await db.executemany(
+                    "INSERT OR IGNORE INTO media_keys (key_value, uploaded_by, is_free_promo) VALUES (?, ?, ?)",
+                    ((key, uploaded_by, promo) for key in chunk)
+                )
+                inserted += db.total_changes - changes_before
+
+        return {'total': total, 'inserted': inserted, 'duplicates': total - inserted}
+
+    async def allocate_media_keys(
+        self,
+        user_ids: List[int],
+        *,
+        free_only: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """
+        Атомарно выдать по одному свободному ключу каждому пользователю
+
+        Ключи выбираются в порядке загрузки и закрепляются одним UPDATE ... RETURNING
+        в той же транзакции, что и отметка last_key_issued_at, поэтому один ключ не
+        может достаться двоим. Если ключей меньше, чем пользователей, ключи получают
+        первые по списку. Возвращает [{user_id, key_id, key_value}] в порядке user_ids.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+        issued_at = datetime.utcnow().isoformat()
+        async with self._write() as db:
+            async with db.execute(
+                """
+                WITH picked AS (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY created_at, id) - 1 AS position
+                    FROM (
+                        SELECT id, created_at
+                        FROM media_keys
+                        WHERE status = 'available' AND is_free_promo = ?
+                        ORDER BY created_at, id
+                        LIMIT ?
                     )
-                    inserted += 1
-                except aiosqlite.IntegrityError:
-                    continue
-            await db.commit()
-        return inserted
+                ),
+                targets AS (
+                    SELECT picked.id AS key_id, CAST(users.value AS INTEGER) AS user_id
+                    FROM picked
+                    JOIN json_each(?) AS users ON users.key = picked.position
+                )
+                UPDATE media_keys
+                SET status = 'assigned',
+                    assigned_to = (SELECT user_id FROM targets WHERE key_id = media_keys.id),
+                    assigned_at = CURRENT_TIMESTAMP
+                WHERE id IN (SELECT key_id FROM targets)
+                RETURNING id, key_value, assigned_to
+                """,
+                (1 if free_only else 0, len(user_ids), json.dumps(user_ids)),
+            ) as cursor:
+                rows = await cursor.fetchall()
+
+            allocated = {row[2]: {'user_id': row[2], 'key_id': row[0], 'key_value': row[1]} for row in rows}
+            if allocated:
+                await db.executemany(
+                    "UPDATE users SET last_key_issued_at = ? WHERE user_id = ?",
+                    ((issued_at, user_id) for user_id in allocated)
+                )
+
+        self._forget_users(*allocated)
+        return [allocated[user_id] for user_id in user_ids if user_id in allocated]
 
     async def count_available_media_keys(self, *, free_only: bool = False) -> int:
         """Количество доступных ключей"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             async with db.execute(
                 """
                 SELECT COUNT(*)
@@ -312,7 +317,7 @@ class Database:
 
     async def get_next_available_media_key(self, *, free_only: bool = False) -> Optional[Dict[str, Any]]:
         """Получить ближайший свободный ключ"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """
@@ -329,14 +334,13 @@ class Database:
 
     async def mark_media_key_assigned(self, key_id: int, user_id: int):
         """Отметить ключ как выданный"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             await db.execute(
                 """UPDATE media_keys
                         SET status = 'assigned', assigned_to = ?, assigned_at = CURRENT_TIMESTAMP
                         WHERE id = ?""",
                 (user_id, key_id)
             )
-            await db.commit()
 
     async def mark_media_key_status(
         self,
@@ -346,7 +350,7 @@ class Database:
         clear_assignment: bool = False,
     ):
         """Обновить статус ключа"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             if clear_assignment:
                 await db.execute(
                     """
@@ -361,54 +365,48 @@ class Database:
                     "UPDATE media_keys SET status = ? WHERE id = ?",
                     (status, key_id),
                 )
-            await db.commit()
 
     async def update_user_last_key_issued(self, user_id: int, issued_at: Optional[datetime] = None):
         """Сохранить время последней выдачи ключа"""
         issued_ts = (issued_at or datetime.utcnow()).isoformat()
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 "UPDATE users SET last_key_issued_at = ? WHERE user_id = ?",
                 (issued_ts, user_id)
             )
-            await db.commit()
 
     async def update_free_key_claim(self, user_id: int, *, claimed_at: Optional[datetime] = None):
         ts = (claimed_at or datetime.utcnow()).isoformat()
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 "UPDATE users SET free_key_claimed_at = ? WHERE user_id = ?",
                 (ts, user_id)
             )
-            await db.commit()
 
     async def clear_free_key_claim(self, user_id: int):
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 "UPDATE users SET free_key_claimed_at = NULL WHERE user_id = ?",
                 (user_id,)
             )
-            await db.commit()
 
     async def set_user_block(self, user_id: int, days: int):
         until = (datetime.utcnow() + timedelta(days=days)).isoformat()
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 "UPDATE users SET blocked_until = ?, tier = 'banned' WHERE user_id = ?",
                 (until, user_id)
             )
-            await db.commit()
 
     async def clear_user_block(self, user_id: int):
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 "UPDATE users SET blocked_until = NULL, tier = 'bronze' WHERE user_id = ?",
                 (user_id,)
             )
-            await db.commit()
 
     async def get_user_active_free_key(self, user_id: int) -> Optional[Dict[str, Any]]:
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """
@@ -423,7 +421,7 @@ class Database:
                 return dict(row) if row else None
 
     async def get_users_free_key_progress(self) -> List[Dict[str, Any]]:
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._analytics() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """
@@ -437,19 +435,16 @@ class Database:
                     mk.key_value,
                     mk.status AS key_status,
                     mk.assigned_at,
-                    SUM(CASE WHEN v.platform = 'tiktok'
-                        AND v.status = 'approved'
-                        AND v.created_at BETWEEN u.free_key_claimed_at AND datetime(u.free_key_claimed_at, '+24 hours')
-                        THEN 1 ELSE 0 END) AS tiktok_videos,
-                    SUM(CASE WHEN v.platform = 'youtube'
-                        AND v.status = 'approved'
-                        AND v.created_at BETWEEN u.free_key_claimed_at AND datetime(u.free_key_claimed_at, '+24 hours')
-                        THEN 1 ELSE 0 END) AS youtube_videos
+                    SUM(CASE WHEN v.platform = 'tiktok' THEN 1 ELSE 0 END) AS tiktok_videos,
+                    SUM(CASE WHEN v.platform = 'youtube' THEN 1 ELSE 0 END) AS youtube_videos
                 FROM users u
                 LEFT JOIN media_keys mk
                     ON mk.assigned_to = u.user_id AND mk.is_free_promo = 1
+                -- Окно 24 часов в условии соединения — диапазон по idx_videos_user_created
                 LEFT JOIN videos v
                     ON v.user_id = u.user_id
+                    AND v.status = 'approved'
+                    AND v.created_at BETWEEN u.free_key_claimed_at AND datetime(u.free_key_claimed_at, '+24 hours')
                 WHERE u.free_key_claimed_at IS NOT NULL
                 GROUP BY u.user_id, mk.id
                 """
@@ -458,7 +453,7 @@ class Database:
                 return [dict(row) for row in rows]
 
     async def get_user_free_key_progress(self, user_id: int) -> Optional[Dict[str, Any]]:
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
 
             async with db.execute(
@@ -515,7 +510,7 @@ class Database:
             return result
 
     async def has_user_claimed_free_key(self, user_id: int) -> bool:
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             async with db.execute(
                 """
                 SELECT COUNT(*)
@@ -536,69 +531,73 @@ class Database:
         blocked_until: Optional[datetime] = None,
         clear_claim: bool = False,
     ):
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            async with db.execute("BEGIN"):
-                if key_id:
-                    if status == 'available':
-                        await db.execute(
-                            """
-                            UPDATE media_keys
-                            SET status = 'available', assigned_to = NULL, assigned_at = NULL
-                            WHERE id = ?
-                            """,
-                            (key_id,),
-                        )
-                    else:
-                        await db.execute(
-                            "UPDATE media_keys SET status = ? WHERE id = ?",
-                            (status, key_id),
-                        )
-
-                updates = []
-                params: List[Any] = []
-                if blocked_until is not None:
-                    updates.append("blocked_until = ?")
-                    params.append(
-                        blocked_until.isoformat() if isinstance(blocked_until, datetime) else blocked_until
-                    )
-                if clear_claim:
-                    updates.append("free_key_claimed_at = NULL")
+        # Ключ и пользователь обновляются атомарно в одной операции записи
+        async with self._write(users=(user_id,)) as db:
+            if key_id:
                 if status == 'available':
-                    updates.append("tier = 'bronze'")
-                params.append(user_id)
-
-                if updates:
                     await db.execute(
-                        f"UPDATE users SET {', '.join(updates)} WHERE user_id = ?",
-                        params,
+                        """
+                        UPDATE media_keys
+                        SET status = 'available', assigned_to = NULL, assigned_at = NULL
+                        WHERE id = ?
+                        """,
+                        (key_id,),
                     )
+                else:
+                    await db.execute(
+                        "UPDATE media_keys SET status = ? WHERE id = ?",
+                        (status, key_id),
+                    )
+
+            updates = []
+            params: List[Any] = []
+            if blocked_until is not None:
+                updates.append("blocked_until = ?")
+                params.append(
+                    blocked_until.isoformat() if isinstance(blocked_until, datetime) else blocked_until
+                )
+            if clear_claim:
+                updates.append("free_key_claimed_at = NULL")
+            if status == 'available':
+                updates.append("tier = 'bronze'")
+            params.append(user_id)
 
-            await db.commit()
+            if updates:
+                await db.execute(
+                    f"UPDATE users SET {', '.join(updates)} WHERE user_id = ?",
+                    params,
+                )
 
     async def get_users_for_key_distribution(self, min_videos: int, days: int) -> List[Dict[str, Any]]:
         """Получить пользователей, выполнивших условие по видео за период"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
+            # Сначала агрегат по видео за период (диапазон покрывающего
+            # idx_videos_payout), затем пользователи по первичному ключу.
+            # +user_id: иначе планировщик обходит все видео по idx_videos_user_status
+            # ради порядка GROUP BY
             query = """
-                SELECT u.*, COUNT(v.id) AS videos_count
-                FROM users u
-                JOIN videos v ON v.user_id = u.user_id
-                WHERE v.status = 'approved'
-                  AND v.created_at >= datetime('now', ?)
-                  AND (u.last_key_issued_at IS NULL OR u.last_key_issued_at <= datetime('now', ?))
+                SELECT u.*, v.videos_count
+                FROM (
+                    SELECT user_id, COUNT(*) AS videos_count
+                    FROM videos
+                    WHERE status = 'approved' AND created_at >= datetime('now', ?)
+                    GROUP BY +user_id
+                    HAVING COUNT(*) >= ?
+                ) v
+                JOIN users u ON u.user_id = v.user_id
+                WHERE (u.last_key_issued_at IS NULL OR u.last_key_issued_at <= datetime('now', ?))
                   AND (u.blocked_until IS NULL OR u.blocked_until < datetime('now'))
-                GROUP BY u.user_id
-                HAVING videos_count >= ?
-                ORDER BY videos_count DESC, u.created_at ASC
+                ORDER BY v.videos_count DESC, u.created_at ASC
             """
             arg = f"-{days} days"
-            async with db.execute(query, (arg, arg, min_videos)) as cursor:
+            async with db.execute(query, (arg, min_videos, arg)) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
     async def get_recently_assigned_media_keys(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Последние выданные ключи"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """
@@ -613,260 +612,17 @@ class Database:
             ) as cursor:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
-            # Таблица пользователей
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    full_name TEXT,
-                    balance REAL DEFAULT 0,
-                    total_videos INTEGER DEFAULT 0,
-                    total_views INTEGER DEFAULT 0,
-                    total_withdrawn REAL DEFAULT 0,
-                    referrer_id INTEGER,
-                    referral_earnings REAL DEFAULT 0,
-                    tier TEXT DEFAULT 'bronze',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (referrer_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица каналов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    channel_id TEXT NOT NULL,
-                    channel_name TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    UNIQUE(user_id, channel_id)
-                )
-            """)
-
-            # Таблица роликов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS videos (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    channel_id INTEGER,
-                    youtube_channel_id INTEGER,
-                    platform TEXT DEFAULT 'tiktok',
-                    video_url TEXT NOT NULL UNIQUE,
-                    video_id TEXT UNIQUE,
-                    tiktok_video_id TEXT,
-                    video_title TEXT,
-                    video_author TEXT,
-                    video_published_at TIMESTAMP,
-                    views INTEGER DEFAULT 0,
-                    likes INTEGER DEFAULT 0,
-                    comments INTEGER DEFAULT 0,
-                    shares INTEGER DEFAULT 0,
-                    favorites INTEGER DEFAULT 0,
-                    earnings REAL DEFAULT 0,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    FOREIGN KEY (channel_id) REFERENCES channels(id),
-                    FOREIGN KEY (youtube_channel_id) REFERENCES youtube_channels(id)
-                )
-            """)
-            
-            # Миграция: добавляем tiktok_video_id если его нет
-            try:
-                await db.execute("ALTER TABLE videos ADD COLUMN tiktok_video_id TEXT")
-                await db.commit()
-                logger.info("✅ Добавлена колонка tiktok_video_id")
-            except Exception as e:
-                # Колонка уже существует
-                pass
-
-            # Таблица заявок на вывод
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS withdrawal_requests (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    amount REAL NOT NULL,
-                    payment_method TEXT NOT NULL,
-                    payment_details TEXT NOT NULL,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    processed_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица способов выплат
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS payment_methods (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    method_type TEXT NOT NULL,
-                    details TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Таблица рефералов
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS referrals (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    referrer_id INTEGER NOT NULL,
-                    referred_id INTEGER NOT NULL,
-                    earnings REAL DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (referrer_id) REFERENCES users(user_id),
-                    FOREIGN KEY (referred_id) REFERENCES users(user_id),
-                    UNIQUE(referrer_id, referred_id)
-                )
-            """)
-
-            # Таблица TikTok аккаунтов (один аккаунт = один пользователь навсегда)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS tiktok_accounts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL UNIQUE,
-                    username TEXT NOT NULL UNIQUE COLLATE NOCASE,
-                    url TEXT NOT NULL,
-                    verification_code TEXT,
-                    is_verified INTEGER DEFAULT 0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    verified_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Индексы для быстрого поиска
-            await db.execute(
-                "CREATE INDEX IF NOT EXISTS idx_tiktok_username ON tiktok_accounts(username)"
-            )
-            await db.execute(
-                "CREATE INDEX IF NOT EXISTS idx_tiktok_user ON tiktok_accounts(user_id)"
-            )
-
-            # Таблица YouTube каналов (один канал = один пользователь навсегда)
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS youtube_channels (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL UNIQUE,
-                    channel_id TEXT NOT NULL UNIQUE COLLATE NOCASE,
-                    channel_handle TEXT,
-                    channel_name TEXT,
-                    url TEXT NOT NULL,
-                    verification_code TEXT,
-                    is_verified INTEGER DEFAULT 0,
-                    rate_per_1000_views REAL DEFAULT 50.0,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    verified_at TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id)
-                )
-            """)
-
-            # Индексы для YouTube
-            await db.execute(
-                "CREATE INDEX IF NOT EXISTS idx_youtube_channel_id ON youtube_channels(channel_id)"
-            )
-            await db.execute(
-                "CREATE INDEX IF NOT EXISTS idx_youtube_user ON youtube_channels(user_id)"
-            )
-
-            # Таблица выплат через Crypto Pay
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS crypto_payouts (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    video_id INTEGER NOT NULL,
-                    amount_rub REAL NOT NULL,
-                    amount_usdt REAL NOT NULL,
-                    spend_id TEXT NOT NULL UNIQUE,
-                    transfer_id TEXT,
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    paid_at TIMESTAMP,
-                    admin_id INTEGER,
-                    FOREIGN KEY (user_id) REFERENCES users(user_id),
-                    FOREIGN KEY (video_id) REFERENCES videos(id)
-                )
-            """)
-
-            # Таблица ключей для медиапартнёров
-            await db.execute("""
-                CREATE TABLE IF NOT EXISTS media_keys (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    key_value TEXT NOT NULL UNIQUE,
-                    status TEXT DEFAULT 'available',
-                    assigned_to INTEGER,
-                    uploaded_by INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    assigned_at TIMESTAMP,
-                    FOREIGN KEY (assigned_to) REFERENCES users(user_id),
-                    FOREIGN KEY (uploaded_by) REFERENCES users(user_id)
-                )
-            """)
-
-            # Индексы для оптимизации запросов
-            logger.info("Creating database indexes...")
-            
-            # Индексы для users
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_tier ON users(tier)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_referrer_id ON users(referrer_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)")
-            
-            # Индексы для videos
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_user_id ON videos(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_status ON videos(status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_platform ON videos(platform)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(created_at)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_user_status ON videos(user_id, status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_videos_platform_status ON videos(platform, status)")
-            
-            # Индексы для youtube_channels
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_yt_channels_user_id ON youtube_channels(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_yt_channels_channel_id ON youtube_channels(channel_id)")
-            
-            # Индексы для crypto_payouts
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_user ON crypto_payouts(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_video ON crypto_payouts(video_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_status ON crypto_payouts(status)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_created_at ON crypto_payouts(created_at)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_crypto_payouts_user_status ON crypto_payouts(user_id, status)")
-            
-            # Индексы для tiktok_accounts
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_user_id ON tiktok_accounts(user_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_username ON tiktok_accounts(username)")
-            
-            # Индексы для referrals
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_referrals_referrer_id ON referrals(referrer_id)")
-            await db.execute("CREATE INDEX IF NOT EXISTS idx_referrals_referred_id ON referrals(referred_id)")
-            
-            # Оптимизация настроек БД
-            await db.execute("PRAGMA cache_size=-10000")  # 10MB кэш
-            await db.execute("PRAGMA synchronous=NORMAL")
-            await db.execute("PRAGMA temp_store=MEMORY")
-
-            # Добавляем колонку для даты выдачи ключа (если ещё нет)
-            try:
-                await db.execute("ALTER TABLE users ADD COLUMN last_key_issued_at TIMESTAMP")
-                await db.commit()
-                logger.info("✅ Добавлена колонка last_key_issued_at")
-            except Exception:
-                pass
-
-            await db.commit()
-            logger.info("Database initialized successfully with optimized indexes")
 
     # === USER METHODS ===
     async def add_user(self, user_id: int, username: str, full_name: str, referrer_id: Optional[int] = None):
         """Добавить нового пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        # Триггер referrals меняет счётчики реферера — его запись в кэше тоже сбрасывается
+        async with self._write(users=(user_id,) + ((referrer_id,) if referrer_id else ())) as db:
             try:
                 await db.execute(
                     "INSERT INTO users (user_id, username, full_name, referrer_id) VALUES (?, ?, ?, ?)",
                     (user_id, username, full_name, referrer_id)
                 )
-                await db.commit()
                 
                 # Если есть реферер, добавляем в таблицу рефералов
                 if referrer_id:
@@ -874,7 +630,6 @@ class Database:
                         "INSERT INTO referrals (referrer_id, referred_id) VALUES (?, ?)",
                         (referrer_id, user_id)
                     )
-                    await db.commit()
                 
                 logger.info(f"User {user_id} added successfully")
                 return True
@@ -883,8 +638,12 @@ class Database:
                 return False
 
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Получить данные пользователя (через кэш)"""
+        return await self._cached('user', user_id, self._fetch_user)
+
+    async def _fetch_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить данные пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect('get_user') as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 "SELECT * FROM users WHERE user_id = ?", (user_id,)
@@ -892,7 +651,31 @@ class Database:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
-    async def update_user_balance(self, user_id: int, amount: float, operation: str = 'add'):
+    @staticmethod
+    async def _post_balance(db, user_id: int, amount: float, reason: str,
+                            ref_type: Optional[str] = None, ref_id: Optional[int] = None):
+        """
+        Изменить баланс на amount и записать операцию в balance_ledger
+
+        Выполняется внутри блока записи: снимок users.balance и запись журнала
+        фиксируются одной транзакцией.
+        """
+        async with db.execute(
+            "UPDATE users SET balance = balance + ? WHERE user_id = ? RETURNING balance",
+            (amount, user_id)
+        ) as cursor:
+            row = await cursor.fetchone()
+        if row is None:
+            return
+        await db.execute(
+            """INSERT INTO balance_ledger (user_id, amount, balance_after, reason, ref_type, ref_id)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (user_id, amount, row[0], reason, ref_type, ref_id)
+        )
+
+    async def update_user_balance(self, user_id: int, amount: float, operation: str = 'add', *,
+                                  reason: Optional[str] = None,
+                                  ref_type: Optional[str] = None, ref_id: Optional[int] = None):
         """
         Обновить баланс пользователя
         
@@ -900,65 +683,53 @@ class Database:
             user_id: ID пользователя
             amount: Сумма изменения
             operation: 'add' (добавить), 'subtract' (вычесть), 'set' (установить)
+            reason: Код операции для balance_ledger (по умолчанию — по operation)
+            ref_type: Тип связанного объекта ('video', 'crypto_payout', ...)
+            ref_id: ID связанного объекта
         """
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             if operation == 'add':
-                await db.execute(
-                    "UPDATE users SET balance = balance + ? WHERE user_id = ?",
-                    (amount, user_id)
-                )
+                delta = amount
             elif operation == 'subtract':
-                await db.execute(
-                    "UPDATE users SET balance = balance - ? WHERE user_id = ?",
-                    (amount, user_id)
-                )
+                delta = -amount
             elif operation == 'set':
-                await db.execute(
-                    "UPDATE users SET balance = ? WHERE user_id = ?",
-                    (amount, user_id)
-                )
-            await db.commit()
-
-    async def update_user_stats(self, user_id: int, videos: int = 0, views: int = 0):
-        """Обновить статистику пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            await db.execute(
-                """UPDATE users 
-                   SET total_videos = total_videos + ?, 
-                       total_views = total_views + ? 
-                   WHERE user_id = ?""",
-                (videos, views, user_id)
-            )
-            await db.commit()
+                async with db.execute(
+                    "SELECT balance FROM users WHERE user_id = ?", (user_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+                if row is None:
+                    return
+                delta = amount - (row[0] or 0)
+            else:
+                return
+            await self._post_balance(db, user_id, delta, reason or operation, ref_type, ref_id)
 
     async def update_user_stats_withdrawal(self, user_id: int, amount: float):
         """Обновить статистику выводов пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 """UPDATE users 
                    SET total_withdrawn = total_withdrawn + ? 
                    WHERE user_id = ?""",
                 (amount, user_id)
             )
-            await db.commit()
 
     # === CHANNEL METHODS ===
     async def add_channel(self, user_id: int, channel_id: str, channel_name: str):
         """Добавить канал"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             try:
                 await db.execute(
                     "INSERT INTO channels (user_id, channel_id, channel_name) VALUES (?, ?, ?)",
                     (user_id, channel_id, channel_name)
                 )
-                await db.commit()
                 return True
             except aiosqlite.IntegrityError:
                 return False
 
     async def get_user_channels(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить каналы пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 "SELECT * FROM channels WHERE user_id = ?", (user_id,)
@@ -968,18 +739,16 @@ class Database:
 
     async def update_channel_name(self, channel_id: int, new_name: str):
         """Обновить название канала"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             await db.execute(
                 "UPDATE channels SET channel_name = ? WHERE id = ?",
                 (new_name, channel_id)
             )
-            await db.commit()
 
     async def delete_channel(self, channel_id: int):
         """Удалить канал"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             await db.execute("DELETE FROM channels WHERE id = ?", (channel_id,))
-            await db.commit()
 
     # === VIDEO METHODS ===
     async def add_video(self, user_id: int, channel_id: int, video_url: str, 
@@ -987,7 +756,9 @@ class Database:
                        published_at: Optional[str] = None, views: int = 0, likes: int = 0,
                        comments: int = 0, shares: int = 0, favorites: int = 0):
         """Добавить видео с метаданными"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
+            if await self._video_url_taken(db, video_url):
+                return None
             try:
                 cursor = await db.execute(
                     """INSERT INTO videos 
@@ -997,37 +768,88 @@ class Database:
                     (user_id, channel_id, video_url, video_id, author, published_at, 
                      views, likes, comments, shares, favorites)
                 )
-                await db.commit()
                 return cursor.lastrowid
             except aiosqlite.IntegrityError:
                 # Видео с таким URL или video_id уже существует
                 return None
     
+    @staticmethod
+    async def _video_url_taken(db, video_url: str) -> bool:
+        """Есть ли видео с таким URL (UNIQUE в videos не видит архив)"""
+        async with db.execute(
+            "SELECT 1 FROM all_videos WHERE video_url = ? LIMIT 1", (video_url,)
+        ) as cursor:
+            return await cursor.fetchone() is not None
+
     async def check_video_exists(self, video_url: str = None, video_id: str = None) -> bool:
         """Проверить, существует ли видео (по URL или TikTok ID)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             if video_url:
                 async with db.execute(
-                    "SELECT COUNT(*) FROM videos WHERE video_url = ?", (video_url,)
+                    "SELECT COUNT(*) FROM all_videos WHERE video_url = ?", (video_url,)
                 ) as cursor:
                     row = await cursor.fetchone()
                     return row[0] > 0
             elif video_id:
                 async with db.execute(
-                    "SELECT COUNT(*) FROM videos WHERE tiktok_video_id = ?", (video_id,)
+                    "SELECT COUNT(*) FROM all_videos WHERE tiktok_video_id = ?", (video_id,)
                 ) as cursor:
                     row = await cursor.fetchone()
                     return row[0] > 0
             return False
 
+    async def _keyset_page(self, method: str, query: str, table: str, alias: str, params: tuple,
+                           limit: int, before: Optional[int], after: Optional[int]) -> Dict[str, Any]:
+        """
+        Keyset-пагинация по (created_at, id) от новых к старым
+
+        method — публичный метод (для метрик запросов), query — SELECT с условием
+        WHERE (без ORDER BY/LIMIT), alias — псевдоним table в нём. Позиция
+        задаётся id строки-якоря: before — страница старше якоря, after — новее. Возвращает items и флаги has_newer/has_older.
+        """
+        cursor_id = after if after is not None else before
+        newer = after is not None
+        async with self._connect(method) as db:
+            db.row_factory = aiosqlite.Row
+            anchor = None
+            if cursor_id is not None:
+                async with db.execute(
+                    f"SELECT created_at, id FROM {table} WHERE id = ?", (cursor_id,)
+                ) as cursor:
+                    anchor = await cursor.fetchone()
+
+            if anchor is None:
+                # Первая страница (или якорь удалён)
+                newer = False
+                seek, seek_params = "", ()
+            else:
+                seek = f" AND ({alias}.created_at, {alias}.id) {'>' if newer else '<'} (?, ?)"
+                seek_params = (anchor[0], anchor[1])
+            order = "ASC" if newer else "DESC"
+
+            async with db.execute(
+                f"""{query}{seek}
+                    ORDER BY {alias}.created_at {order}, {alias}.id {order}
+                    LIMIT ?""",
+                (*params, *seek_params, limit + 1)
+            ) as cursor:
+                items = [dict(row) for row in await cursor.fetchall()]
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        if newer:
+            items.reverse()
+            return {'items': items, 'has_newer': has_more, 'has_older': True}
+        return {'items': items, 'has_newer': anchor is not None, 'has_older': has_more}
+
     async def get_user_videos(self, user_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
         """Получить видео пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT v.*, 
                           COALESCE(c.channel_name, yc.channel_name, ta.username, 'Канал') as channel_name
-                   FROM videos v 
+                   FROM all_videos v 
                    LEFT JOIN channels c ON v.channel_id = c.id 
                    LEFT JOIN youtube_channels yc ON v.youtube_channel_id = yc.id
                    LEFT JOIN tiktok_accounts ta ON v.user_id = ta.user_id AND v.platform = 'tiktok'
@@ -1039,67 +861,90 @@ class Database:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
+    async def get_user_videos_page(self, user_id: int, limit: int = 10, *,
+                                   before: Optional[int] = None,
+                                   after: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Страница видео пользователя (keyset-пагинация, от новых к старым)
+
+        before — id видео, после которого идут более старые (следующая страница),
+        after — id видео, перед которым идут более новые (предыдущая страница).
+        """
+        return await self._keyset_page(
+            'get_user_videos_page',
+            """SELECT v.*, 
+                      COALESCE(c.channel_name, yc.channel_name, ta.username, 'Канал') as channel_name
+               FROM all_videos v 
+               LEFT JOIN channels c ON v.channel_id = c.id 
+               LEFT JOIN youtube_channels yc ON v.youtube_channel_id = yc.id
+               LEFT JOIN tiktok_accounts ta ON v.user_id = ta.user_id AND v.platform = 'tiktok'
+               WHERE v.user_id = ?""",
+            "all_videos", "v", (user_id,), limit, before, after
+        )
+
     async def get_video_count(self, user_id: int) -> int:
-        """Получить количество видео пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE user_id = ?", (user_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return row[0] if row else 0
+        """Получить количество видео пользователя (счётчик users.total_videos)"""
+        user = await self.get_user(user_id)
+        return user['total_videos'] if user else 0
 
     async def update_video_stats(self, video_id: int, views: int, earnings: float):
         """Обновить статистику видео"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            await db.execute(
+        async with self._write() as db:
+            async with db.execute(
                 """UPDATE videos 
                    SET views = ?, earnings = ? 
-                   WHERE id = ?""",
+                   WHERE id = ?
+                   RETURNING user_id""",
                 (views, earnings, video_id)
-            )
-            await db.commit()
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row:
+            self._forget_users(row[0])
     
     async def get_video(self, video_id: int) -> Optional[Dict[str, Any]]:
         """Получить видео по ID"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
-                "SELECT * FROM videos WHERE id = ?", (video_id,)
+                "SELECT * FROM all_videos WHERE id = ?", (video_id,)
             ) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
     
     async def update_video_status(self, video_id: int, status: str):
         """Обновить статус видео"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            await db.execute(
-                "UPDATE videos SET status = ? WHERE id = ?",
+        async with self._write() as db:
+            async with db.execute(
+                "UPDATE videos SET status = ? WHERE id = ? RETURNING user_id",
                 (status, video_id)
-            )
-            await db.commit()
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row:
+            self._forget_users(row[0])
 
     async def update_video_earnings(self, video_id: int, earnings: float):
         """Обновить сумму выплаты за видео"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            await db.execute(
-                "UPDATE videos SET earnings = ? WHERE id = ?",
+        async with self._write() as db:
+            async with db.execute(
+                "UPDATE videos SET earnings = ? WHERE id = ? RETURNING user_id",
                 (earnings, video_id)
-            )
-            await db.commit()
+            ) as cursor:
+                row = await cursor.fetchone()
+        if row:
+            self._forget_users(row[0])
 
     # === PAYMENT METHODS ===
     async def add_payment_method(self, user_id: int, method_type: str, details: str):
         """Добавить способ выплаты"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             await db.execute(
                 "INSERT INTO payment_methods (user_id, method_type, details) VALUES (?, ?, ?)",
                 (user_id, method_type, details)
             )
-            await db.commit()
 
     async def get_payment_methods(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить способы выплаты"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 "SELECT * FROM payment_methods WHERE user_id = ?", (user_id,)
@@ -1109,28 +954,26 @@ class Database:
 
     async def delete_payment_method(self, method_id: int):
         """Удалить способ выплаты"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             await db.execute("DELETE FROM payment_methods WHERE id = ?", (method_id,))
-            await db.commit()
 
     # === WITHDRAWAL METHODS ===
     async def create_withdrawal_request(self, user_id: int, amount: float, 
                                        payment_method: str, payment_details: str):
         """Создать заявку на вывод"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             cursor = await db.execute(
                 """INSERT INTO withdrawal_requests 
                    (user_id, amount, payment_method, payment_details) 
                    VALUES (?, ?, ?, ?)""",
                 (user_id, amount, payment_method, payment_details)
             )
-            await db.commit()
             return cursor.lastrowid
 
     async def get_withdrawal_requests(self, user_id: int, limit: int = 10, 
                                      offset: int = 0) -> List[Dict[str, Any]]:
         """Получить заявки на вывод пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT * FROM withdrawal_requests 
@@ -1142,9 +985,19 @@ class Database:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
+    async def get_withdrawal_requests_page(self, user_id: int, limit: int = 10, *,
+                                           before: Optional[int] = None,
+                                           after: Optional[int] = None) -> Dict[str, Any]:
+        """Страница заявок на вывод пользователя (keyset-пагинация, см. get_user_videos_page)"""
+        return await self._keyset_page(
+            'get_withdrawal_requests_page',
+            "SELECT w.* FROM withdrawal_requests w WHERE w.user_id = ?",
+            "withdrawal_requests", "w", (user_id,), limit, before, after
+        )
+
     async def get_withdrawal_count(self, user_id: int) -> int:
         """Получить количество заявок на вывод"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             async with db.execute(
                 "SELECT COUNT(*) FROM withdrawal_requests WHERE user_id = ?", (user_id,)
             ) as cursor:
@@ -1153,7 +1006,8 @@ class Database:
 
     async def process_withdrawal(self, request_id: int, success: bool):
         """Обработать заявку на вывод"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        user_id = None
+        async with self._write() as db:
             status = "completed" if success else "rejected"
             await db.execute(
                 """UPDATE withdrawal_requests 
@@ -1173,19 +1027,19 @@ class Database:
                         user_id, amount = row
                         # Списываем с баланса
                         await db.execute(
-                            """UPDATE users 
-                               SET balance = balance - ?, 
-                                   total_withdrawn = total_withdrawn + ? 
-                               WHERE user_id = ?""",
-                            (amount, amount, user_id)
+                            "UPDATE users SET total_withdrawn = total_withdrawn + ? WHERE user_id = ?",
+                            (amount, user_id)
                         )
-            
-            await db.commit()
+                        await self._post_balance(
+                            db, user_id, -amount, 'withdrawal', 'withdrawal_request', request_id
+                        )
+        if user_id is not None:
+            self._forget_users(user_id)
 
     # === REFERRAL METHODS ===
     async def get_referrals(self, referrer_id: int) -> List[Dict[str, Any]]:
         """Получить рефералов пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT r.*, u.username, u.full_name 
@@ -1197,29 +1051,33 @@ class Database:
                 rows = await cursor.fetchall()
                 return [dict(row) for row in rows]
 
+    async def get_referrals_page(self, referrer_id: int, limit: int = 10, *,
+                                 before: Optional[int] = None,
+                                 after: Optional[int] = None) -> Dict[str, Any]:
+        """Страница рефералов пользователя (keyset-пагинация, см. get_user_videos_page)"""
+        return await self._keyset_page(
+            'get_referrals_page',
+            """SELECT r.*, u.username, u.full_name 
+               FROM referrals r 
+               JOIN users u ON r.referred_id = u.user_id 
+               WHERE r.referrer_id = ?""",
+            "referrals", "r", (referrer_id,), limit, before, after
+        )
+
     async def get_referral_stats(self, referrer_id: int) -> Dict[str, Any]:
-        """Получить статистику по рефералам"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute(
-                """SELECT 
-                       COUNT(*) as total_referrals,
-                       COALESCE(SUM(earnings), 0) as total_earnings,
-                       COALESCE(AVG(earnings), 0) as avg_earnings
-                   FROM referrals 
-                   WHERE referrer_id = ?""",
-                (referrer_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                return dict(row) if row else {
-                    "total_referrals": 0,
-                    "total_earnings": 0,
-                    "avg_earnings": 0
-                }
+        """Получить статистику по рефералам (счётчики users ведут триггеры)"""
+        user = await self.get_user(referrer_id)
+        total_referrals = user["referral_count"] if user else 0
+        total_earnings = user["referral_earnings"] if user else 0
+        return {
+            "total_referrals": total_referrals,
+            "total_earnings": total_earnings,
+            "avg_earnings": total_earnings / total_referrals if total_referrals else 0
+        }
 
     async def add_referral_earning(self, referrer_id: int, referred_id: int, amount: float):
         """Добавить заработок от реферала"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(referrer_id,)) as db:
             await db.execute(
                 """
                 INSERT INTO referrals (referrer_id, referred_id, earnings)
@@ -1230,20 +1088,66 @@ class Database:
                 (referrer_id, referred_id, amount)
             )
 
-            await db.execute(
-                """UPDATE users 
-                   SET balance = balance + ?, 
-                       referral_earnings = referral_earnings + ? 
-                   WHERE user_id = ?""",
-                (amount, amount, referrer_id)
-            )
+            # users.referral_earnings обновляет триггер referrals
+            await self._post_balance(db, referrer_id, amount, 'referral', 'user', referred_id)
+
+
+    # === BALANCE LEDGER METHODS ===
+    async def get_balance_history(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Последние операции по балансу пользователя (новые первыми)"""
+        async with self._connect() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                """SELECT * FROM balance_ledger
+                   WHERE user_id = ?
+                   ORDER BY id DESC
+                   LIMIT ?""",
+                (user_id, limit)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [dict(row) for row in rows]
+
+    async def reconcile_balances(self, tolerance: float = 0.005) -> Dict[str, Any]:
+        """
+        Сверить users.balance с суммами balance_ledger для всех пользователей
+
+        Один проход: суммы журнала считаются GROUP BY по покрывающему индексу
+        (user_id, amount), без обращения к строкам таблицы.
+
+        Returns:
+            {'checked': пользователей, 'mismatches': [{user_id, balance, ledger_balance, diff}]}
+        """
+        async with self._analytics() as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                """SELECT u.user_id,
+                          COALESCE(u.balance, 0) AS balance,
+                          COALESCE(l.total, 0) AS ledger_balance,
+                          COALESCE(u.balance, 0) - COALESCE(l.total, 0) AS diff
+                   FROM users u
+                   LEFT JOIN (
+                       SELECT user_id, SUM(amount) AS total
+                       FROM balance_ledger
+                       GROUP BY user_id
+                   ) l ON l.user_id = u.user_id
+                   WHERE ABS(COALESCE(u.balance, 0) - COALESCE(l.total, 0)) > ?
+                   ORDER BY u.user_id""",
+                (tolerance,)
+            ) as cursor:
+                mismatches = [dict(row) for row in await cursor.fetchall()]
+
+            async with db.execute("SELECT COUNT(*) FROM users") as cursor:
+                checked = (await cursor.fetchone())[0]
+
+        if mismatches:
+            logger.warning(f"Balance reconciliation: {len(mismatches)} of {checked} users differ from ledger")
+        return {"checked": checked, "mismatches": mismatches}
 
-            await db.commit()
 
     # === ADMIN METHODS ===
     async def get_all_withdrawal_requests(self, status: str = "pending") -> List[Dict[str, Any]]:
         """Получить все заявки на вывод (для админа)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT wr.*, u.username, u.full_name 
@@ -1258,7 +1162,7 @@ class Database:
 
     async def get_stats(self) -> Dict[str, Any]:
         """Получить общую статистику (для админа)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._analytics() as db:
             db.row_factory = aiosqlite.Row
             
             # Статистика пользователей
@@ -1269,7 +1173,7 @@ class Database:
             
             # Статистика видео
             async with db.execute(
-                "SELECT COUNT(*) as total_videos, SUM(views) as total_views FROM videos"
+                "SELECT COUNT(*) as total_videos, SUM(views) as total_views FROM all_videos"
             ) as cursor:
                 video_stats = dict(await cursor.fetchone())
             
@@ -1287,7 +1191,7 @@ class Database:
     # === TIKTOK METHODS ===
     async def get_tiktok_by_username(self, username: str) -> Optional[Dict[str, Any]]:
         """Проверить, привязан ли TikTok аккаунт (по username)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             # Убираем @ и делаем поиск без учета регистра
             clean_username = username.strip().lstrip('@').lower()
@@ -1295,15 +1199,19 @@ class Database:
                 """SELECT ta.*, u.username as telegram_username, u.full_name 
                    FROM tiktok_accounts ta
                    JOIN users u ON ta.user_id = u.user_id
-                   WHERE LOWER(ta.username) = ?""",
+                   WHERE ta.username = ? COLLATE NOCASE""",
                 (clean_username,)
             ) as cursor:
                 row = await cursor.fetchone()
                 return dict(row) if row else None
 
     async def get_user_tiktok(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Получить TikTok аккаунт пользователя (через кэш)"""
+        return await self._cached('tiktok', user_id, self._fetch_tiktok)
+
+    async def _fetch_tiktok(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить TikTok аккаунт пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect('get_user_tiktok') as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 "SELECT * FROM tiktok_accounts WHERE user_id = ?",
@@ -1315,29 +1223,30 @@ class Database:
     async def add_tiktok_account(self, user_id: int, username: str, url: str, 
                                  verification_code: str) -> Dict[str, Any]:
         """Добавить TikTok аккаунт (с проверкой уникальности)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        clean_username = username.strip().lstrip('@').lower()
+
+        # Проверки выполняются до взятия соединения из пула
+        # Проверка 1: Привязан ли этот TikTok к другому пользователю?
+        existing = await self.get_tiktok_by_username(clean_username)
+        if existing:
+            return {
+                'success': False,
+                'error': 'tiktok_taken',
+                'owner_id': existing['user_id'],
+                'owner_username': existing.get('telegram_username', 'неизвестен')
+            }
+
+        # Проверка 2: Есть ли у пользователя уже привязанный TikTok?
+        user_tiktok = await self.get_user_tiktok(user_id)
+        if user_tiktok:
+            return {
+                'success': False,
+                'error': 'user_has_tiktok',
+                'current_username': user_tiktok['username']
+            }
+
+        async with self._write(users=(user_id,)) as db:
             try:
-                clean_username = username.strip().lstrip('@').lower()
-                
-                # Проверка 1: Привязан ли этот TikTok к другому пользователю?
-                existing = await self.get_tiktok_by_username(clean_username)
-                if existing:
-                    return {
-                        'success': False,
-                        'error': 'tiktok_taken',
-                        'owner_id': existing['user_id'],
-                        'owner_username': existing.get('telegram_username', 'неизвестен')
-                    }
-                
-                # Проверка 2: Есть ли у пользователя уже привязанный TikTok?
-                user_tiktok = await self.get_user_tiktok(user_id)
-                if user_tiktok:
-                    return {
-                        'success': False,
-                        'error': 'user_has_tiktok',
-                        'current_username': user_tiktok['username']
-                    }
-                
                 # Добавляем новый аккаунт
                 await db.execute(
                     """INSERT INTO tiktok_accounts 
@@ -1345,7 +1254,6 @@ class Database:
                        VALUES (?, ?, ?, ?, 0)""",
                     (user_id, clean_username, url, verification_code)
                 )
-                await db.commit()
                 
                 return {'success': True}
                 
@@ -1359,29 +1267,27 @@ class Database:
 
     async def verify_tiktok_account(self, user_id: int) -> bool:
         """Верифицировать TikTok аккаунт пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 """UPDATE tiktok_accounts 
                    SET is_verified = 1, verified_at = CURRENT_TIMESTAMP
                    WHERE user_id = ?""",
                 (user_id,)
             )
-            await db.commit()
             return True
 
     async def remove_tiktok_account(self, user_id: int) -> bool:
         """Удалить TikTok аккаунт пользователя (только админ)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             cursor = await db.execute(
                 "DELETE FROM tiktok_accounts WHERE user_id = ?",
                 (user_id,)
             )
-            await db.commit()
             return cursor.rowcount > 0
 
     async def get_all_verified_tiktoks(self) -> List[Dict[str, Any]]:
         """Получить все верифицированные TikTok аккаунты (для админа)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT ta.*, u.username as telegram_username, u.full_name
@@ -1395,8 +1301,12 @@ class Database:
 
     # === YOUTUBE METHODS ===
     async def get_user_youtube(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Получить YouTube канал пользователя (через кэш)"""
+        return await self._cached('youtube', user_id, self._fetch_youtube)
+
+    async def _fetch_youtube(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получить YouTube канал пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect('get_user_youtube') as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 "SELECT * FROM youtube_channels WHERE user_id = ?",
@@ -1407,10 +1317,10 @@ class Database:
 
     async def get_youtube_by_channel_id(self, channel_id: str) -> Optional[Dict[str, Any]]:
         """Получить YouTube канал по channel_id"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
-                "SELECT * FROM youtube_channels WHERE LOWER(channel_id) = LOWER(?)",
+                "SELECT * FROM youtube_channels WHERE channel_id = ? COLLATE NOCASE",
                 (channel_id,)
             ) as cursor:
                 row = await cursor.fetchone()
@@ -1419,25 +1329,26 @@ class Database:
     async def add_youtube_channel(self, user_id: int, channel_id: str, channel_handle: str, 
                                   channel_name: str, url: str, verification_code: str) -> Dict[str, Any]:
         """Добавить YouTube канал"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        # Проверки выполняются до взятия соединения из пула
+        # Проверяем, не занят ли уже этот channel_id
+        existing = await self.get_youtube_by_channel_id(channel_id)
+        if existing:
+            return {
+                'success': False,
+                'error': 'channel_already_bound',
+                'bound_to_user': existing['user_id']
+            }
+
+        # Проверяем, нет ли уже YouTube у этого пользователя
+        user_youtube = await self.get_user_youtube(user_id)
+        if user_youtube:
+            return {
+                'success': False,
+                'error': 'user_already_has_youtube'
+            }
+
+        async with self._write(users=(user_id,)) as db:
             try:
-                # Проверяем, не занят ли уже этот channel_id
-                existing = await self.get_youtube_by_channel_id(channel_id)
-                if existing:
-                    return {
-                        'success': False,
-                        'error': 'channel_already_bound',
-                        'bound_to_user': existing['user_id']
-                    }
-
-                # Проверяем, нет ли уже YouTube у этого пользователя
-                user_youtube = await self.get_user_youtube(user_id)
-                if user_youtube:
-                    return {
-                        'success': False,
-                        'error': 'user_already_has_youtube'
-                    }
-
                 # Добавляем канал
                 await db.execute(
                     """INSERT INTO youtube_channels 
@@ -1445,7 +1356,6 @@ class Database:
                        VALUES (?, ?, ?, ?, ?, ?)""",
                     (user_id, channel_id, channel_handle, channel_name, url, verification_code)
                 )
-                await db.commit()
                 
                 return {
                     'success': True,
@@ -1462,29 +1372,27 @@ class Database:
 
     async def verify_youtube_channel(self, user_id: int) -> bool:
         """Верифицировать YouTube канал пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 """UPDATE youtube_channels 
                    SET is_verified = 1, verified_at = CURRENT_TIMESTAMP
                    WHERE user_id = ?""",
                 (user_id,)
             )
-            await db.commit()
             return True
 
     async def remove_youtube_channel(self, user_id: int) -> bool:
         """Удалить YouTube канал пользователя (только админ)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             cursor = await db.execute(
                 "DELETE FROM youtube_channels WHERE user_id = ?",
                 (user_id,)
             )
-            await db.commit()
             return cursor.rowcount > 0
 
     async def get_all_verified_youtubes(self) -> List[Dict[str, Any]]:
         """Получить все верифицированные YouTube каналы (для админа)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT yc.*, u.username as telegram_username, u.full_name
@@ -1502,7 +1410,10 @@ class Database:
                                video_id: str, title: str, author: str, published_at: str,
                                views: int = 0, likes: int = 0, comments: int = 0) -> Optional[int]:
         """Добавить YouTube видео"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
+            if await self._video_url_taken(db, video_url):
+                logger.error(f"Видео уже существует: {video_url}")
+                return None
             try:
                 cursor = await db.execute(
                     """INSERT INTO videos 
@@ -1512,7 +1423,6 @@ class Database:
                     (user_id, youtube_channel_id, video_url, video_id, title, author,
                      published_at, views, likes, comments)
                 )
-                await db.commit()
                 return cursor.lastrowid
             except aiosqlite.IntegrityError:
                 logger.error(f"Видео уже существует: {video_url}")
@@ -1520,17 +1430,17 @@ class Database:
 
     async def check_youtube_video_exists(self, video_url: str = None, video_id: str = None) -> bool:
         """Проверить, существует ли YouTube видео"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             if video_url:
                 async with db.execute(
-                    "SELECT COUNT(*) FROM videos WHERE video_url = ? AND platform = 'youtube'",
+                    "SELECT COUNT(*) FROM all_videos WHERE video_url = ? AND platform = 'youtube'",
                     (video_url,)
                 ) as cursor:
                     row = await cursor.fetchone()
                     return row[0] > 0
             elif video_id:
                 async with db.execute(
-                    "SELECT COUNT(*) FROM videos WHERE video_id = ? AND platform = 'youtube'",
+                    "SELECT COUNT(*) FROM all_videos WHERE video_id = ? AND platform = 'youtube'",
                     (video_id,)
                 ) as cursor:
                     row = await cursor.fetchone()
@@ -1539,11 +1449,11 @@ class Database:
 
     async def get_user_youtube_videos(self, user_id: int, limit: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
         """Получить YouTube видео пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT v.*, yc.channel_name 
-                   FROM videos v 
+                   FROM all_videos v 
                    JOIN youtube_channels yc ON v.youtube_channel_id = yc.id 
                    WHERE v.user_id = ? AND v.platform = 'youtube'
                    ORDER BY v.created_at DESC 
@@ -1555,9 +1465,9 @@ class Database:
 
     async def get_youtube_video_count(self, user_id: int) -> int:
         """Получить количество YouTube видео пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE user_id = ? AND platform = 'youtube'",
+                "SELECT COUNT(*) FROM all_videos WHERE user_id = ? AND platform = 'youtube'",
                 (user_id,)
             ) as cursor:
                 row = await cursor.fetchone()
@@ -1574,7 +1484,7 @@ class Database:
         spend_id: str
     ) -> Optional[int]:
         """Создать запрос на выплату"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             try:
                 cursor = await db.execute(
                     """INSERT INTO crypto_payouts 
@@ -1582,7 +1492,6 @@ class Database:
                        VALUES (?, ?, ?, ?, ?, 'pending')""",
                     (user_id, video_id, amount_rub, amount_usdt, spend_id)
                 )
-                await db.commit()
                 return cursor.lastrowid
             except Exception as e:
                 logger.error(f"Ошибка создания запроса на выплату: {e}")
@@ -1596,7 +1505,7 @@ class Database:
         admin_id: Optional[int] = None
     ) -> bool:
         """Обновить статус выплаты"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write() as db:
             try:
                 if status == 'paid':
                     await db.execute(
@@ -1612,7 +1521,6 @@ class Database:
                            WHERE id = ?""",
                         (status, admin_id, payout_id)
                     )
-                await db.commit()
                 return True
             except Exception as e:
                 logger.error(f"Ошибка обновления статуса выплаты: {e}")
@@ -1620,7 +1528,7 @@ class Database:
 
     async def get_payout_by_id(self, payout_id: int) -> Optional[Dict[str, Any]]:
         """Получить информацию о выплате"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 "SELECT * FROM crypto_payouts WHERE id = ?",
@@ -1631,7 +1539,7 @@ class Database:
 
     async def get_user_payouts(self, user_id: int) -> List[Dict[str, Any]]:
         """Получить историю выплат пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             async with db.execute(
                 """SELECT * FROM crypto_payouts 
@@ -1644,7 +1552,7 @@ class Database:
 
     async def set_youtube_rate(self, user_id: int, rate: float) -> bool:
         """Установить индивидуальную ставку для YouTube канала"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             try:
                 await db.execute(
                     """UPDATE youtube_channels 
@@ -1652,7 +1560,6 @@ class Database:
                        WHERE user_id = ?""",
                     (rate, user_id)
                 )
-                await db.commit()
                 return True
             except Exception as e:
                 logger.error(f"Ошибка установки ставки: {e}")
@@ -1660,7 +1567,7 @@ class Database:
 
     async def get_youtube_rate(self, user_id: int) -> Optional[float]:
         """Получить ставку для YouTube канала"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             async with db.execute(
                 "SELECT rate_per_1000_views FROM youtube_channels WHERE user_id = ?",
                 (user_id,)
@@ -1670,12 +1577,12 @@ class Database:
 
     async def get_video_with_details(self, video_id: int) -> Optional[Dict[str, Any]]:
         """Получить полную информацию о видео с данными канала"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             db.row_factory = aiosqlite.Row
             
             # Сначала получаем видео
             async with db.execute(
-                "SELECT * FROM videos WHERE id = ?",
+                "SELECT * FROM all_videos WHERE id = ?",
                 (video_id,)
             ) as cursor:
                 video = await cursor.fetchone()
@@ -1707,21 +1614,24 @@ class Database:
 
     async def set_user_tier(self, user_id: int, tier: str) -> bool:
         """Установить уровень пользователя (bronze/gold)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             try:
                 await db.execute(
                     "UPDATE users SET tier = ? WHERE user_id = ?",
                     (tier, user_id)
                 )
-                await db.commit()
                 return True
             except Exception as e:
                 logger.error(f"Ошибка установки уровня: {e}")
                 return False
 
     async def get_user_tier(self, user_id: int) -> str:
+        """Получить уровень пользователя (через кэш)"""
+        return await self._cached('tier', user_id, self._fetch_tier)
+
+    async def _fetch_tier(self, user_id: int) -> str:
         """Получить уровень пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect('get_user_tier') as db:
             async with db.execute(
                 "SELECT tier FROM users WHERE user_id = ?",
                 (user_id,)
@@ -1731,9 +1641,9 @@ class Database:
 
     async def check_first_youtube_video(self, user_id: int) -> bool:
         """Проверить, первое ли это YouTube видео пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE user_id = ? AND platform = 'youtube'",
+                "SELECT COUNT(*) FROM all_videos WHERE user_id = ? AND platform = 'youtube'",
                 (user_id,)
             ) as cursor:
                 count = await cursor.fetchone()
@@ -1741,9 +1651,9 @@ class Database:
 
     async def get_last_youtube_video_time(self, user_id: int) -> Optional[str]:
         """Получить время последнего отправленного YouTube видео"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect() as db:
             async with db.execute(
-                """SELECT created_at FROM videos 
+                """SELECT created_at FROM all_videos 
                    WHERE user_id = ? AND platform = 'youtube' 
                    ORDER BY created_at DESC LIMIT 1""",
                 (user_id,)
@@ -1781,11 +1691,15 @@ class Database:
         return False, time_str
 
     async def get_user_youtube_rate(self, user_id: int) -> Optional[float]:
+        """Получить фиксированную ставку пользователя за YouTube видео (через кэш)"""
+        return await self._cached('youtube_rate', user_id, self._fetch_youtube_rate)
+
+    async def _fetch_youtube_rate(self, user_id: int) -> Optional[float]:
         """Получить фиксированную ставку пользователя за YouTube видео"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._connect('get_user_youtube_rate') as db:
             # Получаем последнее одобренное видео с установленной выплатой
             async with db.execute(
-                """SELECT earnings FROM videos 
+                """SELECT earnings FROM all_videos 
                    WHERE user_id = ? AND platform = 'youtube' AND status = 'approved' AND earnings > 0
                    ORDER BY id DESC LIMIT 1""",
                 (user_id,)
@@ -1794,323 +1708,338 @@ class Database:
                 return row[0] if row else None
 
     # === ADMIN ANALYTICS METHODS ===
-    async def get_admin_analytics(self, start_date, end_date) -> Dict[str, Any]:
-        """Получить общую аналитику для админа"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            stats = {}
-            start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-            end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Пользователи
-            async with db.execute("SELECT COUNT(*) FROM users") as cursor:
-                stats['total_users'] = (await cursor.fetchone())[0]
-            
-            async with db.execute(
-                "SELECT COUNT(*) FROM users WHERE created_at BETWEEN ? AND ?",
-                (start_str, end_str)
-            ) as cursor:
-                stats['new_users'] = (await cursor.fetchone())[0]
-            
-            # Активные пользователи (с видео)
-            async with db.execute(
-                """SELECT COUNT(DISTINCT user_id) FROM videos 
-                   WHERE created_at BETWEEN ? AND ?""",
-                (start_str, end_str)
-            ) as cursor:
-                stats['active_users'] = (await cursor.fetchone())[0]
-            
-            # Видео
-            async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE created_at BETWEEN ? AND ?",
-                (start_str, end_str)
-            ) as cursor:
-                stats['total_videos'] = (await cursor.fetchone())[0]
-            
-            async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE status = 'approved' AND created_at BETWEEN ? AND ?",
-                (start_str, end_str)
-            ) as cursor:
-                stats['approved_videos'] = (await cursor.fetchone())[0]
-            
-            async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE status = 'pending' AND created_at BETWEEN ? AND ?",
-                (start_str, end_str)
-            ) as cursor:
-                stats['pending_videos'] = (await cursor.fetchone())[0]
-            
+    async def rebuild_daily_stats(self) -> int:
+        """Полностью пересобрать дневные сводки; возвращает количество строк daily_stats"""
+        async with self._write() as db:
+            await fill_daily_stats(db, "all_videos")
+            await fill_user_daily_stats(db, "all_videos")
+            async with db.execute("SELECT COUNT(*) FROM daily_stats") as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def get_period_metrics(self, start_date, end_date) -> Dict[str, Any]:
+        """
+        Все метрики админ-аналитики за период
+
+        Целые сутки периода берутся из дневных сводок daily_stats (по строке на
+        день/платформу/статус), неполные дни по краям — из videos по покрывающему
+        индексу. Из результата собираются get_admin_analytics, get_platform_stats
+        и get_finances_stats.
+        """
+        start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
+        end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
+
+        span = _rollup_span(start_date, end_date)
+        if span:
+            first_day, last_day = (day.strftime("%Y-%m-%d") for day in span)
+            head_end = f"{first_day} 00:00:00"
+            tail_start = f"{(span[1] + timedelta(days=1)):%Y-%m-%d} 00:00:00"
+        else:
+            # Целых суток нет: сводки не используются, весь период — из videos
+            first_day, last_day = "1", "0"
+            head_end, tail_start = start_str, start_str
+        # [start, head_end) и [tail_start, end] — неполные дни по краям периода
+        raw_params = (start_str, head_end, tail_start, end_str)
+        raw_where = "(created_at >= ? AND created_at < ?) OR (created_at >= ? AND created_at <= ?)"
+
+        async with self._analytics() as db:
+            db.row_factory = aiosqlite.Row
             async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE status = 'rejected' AND created_at BETWEEN ? AND ?",
-                (start_str, end_str)
+                f"""WITH slices (platform, status, video_count, views, earnings, unpaid_views) AS (
+                       SELECT platform, status, video_count, views, earnings, unpaid_views
+                       FROM daily_stats
+                       WHERE day BETWEEN ? AND ?
+                       UNION ALL
+                       SELECT platform, status, 1, COALESCE(views, 0),
+                              CASE WHEN earnings > 0 THEN earnings ELSE 0 END,
+                              CASE WHEN earnings > 0 THEN 0 ELSE COALESCE(views, 0) END
+                       FROM all_videos
+                       WHERE {raw_where}
+                   )
+                   SELECT
+                       COALESCE(SUM(video_count), 0) AS total_videos,
+                       COALESCE(SUM(CASE WHEN status = 'approved' THEN video_count END), 0) AS approved_videos,
+                       COALESCE(SUM(CASE WHEN status = 'pending' THEN video_count END), 0) AS pending_videos,
+                       COALESCE(SUM(CASE WHEN status = 'rejected' THEN video_count END), 0) AS rejected_videos,
+                       COALESCE(SUM(views), 0) AS total_views,
+                       -- Выплаты: TikTok без начислений считается по ставке из config, прочие — 0
+                       COALESCE(SUM(CASE WHEN status = 'approved' THEN
+                           earnings + CASE WHEN platform = 'tiktok' THEN (unpaid_views / 1000.0) * ? ELSE 0 END
+                       END), 0) AS total_paid,
+
+                       COALESCE(SUM(CASE WHEN platform = 'tiktok' THEN video_count END), 0) AS tiktok_videos,
+                       COALESCE(SUM(CASE WHEN platform = 'tiktok' AND status = 'approved' THEN video_count END), 0) AS tiktok_approved,
+                       COALESCE(SUM(CASE WHEN platform = 'tiktok' THEN views END), 0) AS tiktok_views,
+                       COALESCE(SUM(CASE WHEN platform = 'tiktok' AND status = 'approved' THEN
+                           earnings + (unpaid_views / 1000.0) * ?
+                       END), 0) AS tiktok_paid,
+
+                       COALESCE(SUM(CASE WHEN platform = 'youtube' THEN video_count END), 0) AS youtube_videos,
+                       COALESCE(SUM(CASE WHEN platform = 'youtube' AND status = 'approved' THEN video_count END), 0) AS youtube_approved,
+                       COALESCE(SUM(CASE WHEN platform = 'youtube' THEN views END), 0) AS youtube_views,
+                       COALESCE(SUM(CASE WHEN platform = 'youtube' AND status = 'approved' THEN
+                           earnings + 50 * (unpaid_views / 1000.0)
+                       END), 0) AS youtube_paid
+                   FROM slices""",
+                (first_day, last_day, *raw_params,
+                 config.TIKTOK_RATE_PER_1000_VIEWS, config.TIKTOK_RATE_PER_1000_VIEWS)
             ) as cursor:
-                stats['rejected_videos'] = (await cursor.fetchone())[0]
-            
-            # Просмотры
+                metrics = dict(await cursor.fetchone())
+
             async with db.execute(
-                "SELECT COALESCE(SUM(views), 0) FROM videos WHERE created_at BETWEEN ? AND ?",
-                (start_str, end_str)
+                f"""SELECT COUNT(user_id) FROM (
+                       SELECT user_id FROM daily_active_users WHERE day BETWEEN ? AND ?
+                       UNION
+                       SELECT user_id FROM all_videos WHERE {raw_where}
+                   )""",
+                (first_day, last_day, *raw_params)
             ) as cursor:
-                stats['total_views'] = (await cursor.fetchone())[0]
-            
-            async with db.execute(
-                "SELECT COALESCE(SUM(views), 0) FROM videos WHERE platform = 'tiktok' AND created_at BETWEEN ? AND ?",
-                (start_str, end_str)
-            ) as cursor:
-                stats['tiktok_views'] = (await cursor.fetchone())[0]
-            
+                metrics['active_users'] = (await cursor.fetchone())[0]
+
             async with db.execute(
-                "SELECT COALESCE(SUM(views), 0) FROM videos WHERE platform = 'youtube' AND created_at BETWEEN ? AND ?",
+                """SELECT
+                       COUNT(*) AS total_users,
+                       COALESCE(SUM(created_at BETWEEN ? AND ?), 0) AS new_users,
+                       COALESCE(SUM(balance), 0) AS total_balance,
+                       COALESCE(SUM(referral_earnings), 0) AS referral_earnings
+                   FROM users""",
                 (start_str, end_str)
             ) as cursor:
-                stats['youtube_views'] = (await cursor.fetchone())[0]
-            
-            # Финансы (с автоматическим расчетом для TikTok)
+                metrics.update(dict(await cursor.fetchone()))
+
+        return metrics
+
+    async def get_admin_analytics(self, start_date, end_date) -> Dict[str, Any]:
+        """Получить общую аналитику для админа"""
+        m = await self.get_period_metrics(start_date, end_date)
+        stats = {
+            key: m[key] for key in (
+                'total_users', 'new_users', 'active_users',
+                'total_videos', 'approved_videos', 'pending_videos', 'rejected_videos',
+                'total_views', 'tiktok_views', 'youtube_views',
+                'total_paid', 'total_balance', 'referral_earnings',
+            )
+        }
+        stats['total_paid_usdt'] = stats['total_paid'] / 90.0  # Фикс курс
+
+        # Средние показатели
+        stats['avg_videos_per_user'] = stats['total_videos'] / max(stats['total_users'], 1)
+        stats['avg_payout'] = stats['total_paid'] / max(stats['approved_videos'], 1)
+        stats['avg_views_per_video'] = stats['total_views'] / max(stats['total_videos'], 1)
+
+        return stats
+
+    async def _top_entries(self, db, platform: Optional[str], start_date, end_date,
+                           limit: int) -> List[tuple]:
+        """
+        Лучшие пользователи периода по просмотрам одобренных видео
+
+        Целые сутки берутся из top-K в памяти (перестраивается из user_daily_stats
+        после изменения leaderboard_version), неполные дни по краям — из videos,
+        причём из них читаются только пользователи, способные попасть в первые limit.
+        Возвращает (user_id, video_count, views, earnings, unpaid_views).
+        """
+        start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
+        end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
+        platform_sql = "" if platform is None else "AND platform = ?"
+        platform_params = () if platform is None else (platform,)
+
+        ranking: List[tuple] = []
+        complete = True
+        span = _rollup_span(start_date, end_date)
+        if span:
+            first_day, last_day = (day.strftime("%Y-%m-%d") for day in span)
+            head_end = f"{first_day} 00:00:00"
+            tail_start = f"{(span[1] + timedelta(days=1)):%Y-%m-%d} 00:00:00"
+
+            async with db.execute("SELECT version FROM leaderboard_version WHERE id = 1") as cursor:
+                version = (await cursor.fetchone())[0]
+            key = (platform, first_day, last_day)
+            depth = max(self._leaderboard.depth, limit)
+            ranking = self._leaderboard.get(key, version, depth)
+            if ranking is None:
+                async with db.execute(
+                    f"""SELECT user_id, SUM(video_count), SUM(views), SUM(earnings), SUM(unpaid_views)
+                        FROM user_daily_stats
+                        WHERE day BETWEEN ? AND ? {platform_sql}
+                        GROUP BY user_id
+                        ORDER BY SUM(views) DESC, user_id
+                        LIMIT ?""",
+                    (first_day, last_day, *platform_params, depth)
+                ) as cursor:
+                    ranking = [tuple(row) for row in await cursor.fetchall()]
+                self._leaderboard.put(key, version, depth, ranking)
+            # Неполный top-K содержит всех пользователей с видео за целые сутки
+            complete = len(ranking) < depth
+        else:
+            # Целых суток нет: весь период — из videos
+            head_end, tail_start = start_str, start_str
+
+        # Суммы неполных дней по пользователям. Два диапазона отдельно: через OR
+        # SQLite не использует диапазон created_at индекса
+        edge_rows = f"""SELECT user_id, views, effective_earnings, earnings FROM all_videos
+                        WHERE status = 'approved' AND created_at >= ? AND created_at {{}} ? {platform_sql}"""
+        edge_sql = f"""SELECT user_id, COUNT(*), SUM(COALESCE(views, 0)), SUM(effective_earnings),
+                              SUM(CASE WHEN earnings > 0 THEN 0 ELSE COALESCE(views, 0) END)
+                       FROM ({edge_rows.format('<')} UNION ALL {edge_rows.format('<=')})
+                       WHERE user_id {{}} (SELECT value FROM json_each(?))
+                       GROUP BY user_id"""
+        edge_params = (start_str, head_end, *platform_params, tail_start, end_str, *platform_params)
+        ranked_ids = json.dumps([entry[0] for entry in ranking])
+
+        edges = []
+        if ranking:
+            async with db.execute(edge_sql.format("IN"), (*edge_params, ranked_ids)) as cursor:
+                edges = [tuple(row) for row in await cursor.fetchall()]
+
+        # Остальным нужно набрать не меньше limit-го из top-K с учётом неполных дней;
+        # их сумма за целые сутки не больше последнего в top-K (или 0, если top-K полный)
+        edge_views = {entry[0]: entry[2] for entry in edges}
+        exact = sorted((entry[2] + edge_views.get(entry[0], 0) for entry in ranking), reverse=True)
+        bar = exact[limit - 1] if len(exact) >= limit else 0
+        floor = bar - (0 if complete else ranking[-1][2])
+        async with db.execute(
+            edge_sql.format("NOT IN") + "\nHAVING SUM(COALESCE(views, 0)) >= ?"
+            + ("\nORDER BY SUM(COALESCE(views, 0)) DESC, user_id LIMIT ?" if complete else ""),
+            (*edge_params, ranked_ids, floor, *((limit,) if complete else ()))
+        ) as cursor:
+            others = [tuple(row) for row in await cursor.fetchall()]
+
+        # Суммы за целые сутки для отобранных пользователей вне top-K
+        edge_base = {}
+        if others and not complete:
             async with db.execute(
-                """SELECT COALESCE(SUM(CASE 
-                       WHEN earnings > 0 THEN earnings
-                       WHEN platform = 'tiktok' THEN (views / 1000.0) * 65
-                       ELSE 0
-                   END), 0) 
-                   FROM videos 
-                   WHERE status = 'approved' AND created_at BETWEEN ? AND ?""",
-                (start_str, end_str)
+                f"""SELECT user_id, SUM(video_count), SUM(views), SUM(earnings), SUM(unpaid_views)
+                    FROM user_daily_stats
+                    WHERE user_id IN (SELECT value FROM json_each(?))
+                      AND day BETWEEN ? AND ? {platform_sql}
+                    GROUP BY user_id""",
+                (json.dumps([entry[0] for entry in others]), first_day, last_day, *platform_params)
             ) as cursor:
-                stats['total_paid'] = (await cursor.fetchone())[0]
-            
-            stats['total_paid_usdt'] = stats['total_paid'] / 90.0  # Фикс курс
-            
-            async with db.execute("SELECT COALESCE(SUM(balance), 0) FROM users") as cursor:
-                stats['total_balance'] = (await cursor.fetchone())[0]
-            
-            async with db.execute("SELECT COALESCE(SUM(referral_earnings), 0) FROM users") as cursor:
-                stats['referral_earnings'] = (await cursor.fetchone())[0]
-            
-            # Средние показатели
-            stats['avg_videos_per_user'] = stats['total_videos'] / max(stats['total_users'], 1)
-            stats['avg_payout'] = stats['total_paid'] / max(stats['approved_videos'], 1)
-            stats['avg_views_per_video'] = stats['total_views'] / max(stats['total_videos'], 1)
-            
-            return stats
+                edge_base = {row[0]: tuple(row) for row in await cursor.fetchall()}
+
+        return Leaderboard.merge(ranking, edges + others, edge_base, limit)
 
     async def get_top_users(self, start_date, end_date, limit: int = 10) -> List[Dict[str, Any]]:
         """Получить топ пользователей по просмотрам"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._analytics() as db:
             db.row_factory = aiosqlite.Row
-            start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-            end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
+            entries = [entry for entry in await self._top_entries(db, None, start_date, end_date, limit)
+                       if entry[1] > 0]
+            if not entries:
+                return []
             async with db.execute(
                 """SELECT 
                        u.user_id, u.username, u.full_name, u.tier,
-                       COUNT(DISTINCT v.id) as video_count,
-                       COALESCE(SUM(v.views), 0) as total_views,
-                       COALESCE(SUM(CASE 
-                           WHEN v.earnings > 0 THEN v.earnings
-                           WHEN v.platform = 'tiktok' THEN (v.views / 1000.0) * 65
-                           ELSE 0
-                       END), 0) as total_earnings,
-                       (SELECT platform FROM videos 
-                        WHERE user_id = u.user_id AND status = 'approved'
+                       (SELECT platform FROM user_daily_stats
+                        WHERE user_id = u.user_id
                         GROUP BY platform 
-                        ORDER BY COUNT(*) DESC 
+                        ORDER BY SUM(video_count) DESC 
                         LIMIT 1) as main_platform
                    FROM users u
-                   LEFT JOIN videos v ON u.user_id = v.user_id 
-                       AND v.created_at BETWEEN ? AND ?
-                       AND v.status = 'approved'
-                   GROUP BY u.user_id
-                   HAVING video_count > 0
-                   ORDER BY total_views DESC
-                   LIMIT ?""",
-                (start_str, end_str, limit)
+                   WHERE u.user_id IN (SELECT value FROM json_each(?))""",
+                (json.dumps([entry[0] for entry in entries]),)
             ) as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+                users = {row['user_id']: row for row in await cursor.fetchall()}
+
+        result = []
+        for user_id, video_count, views, earnings, _ in entries:
+            user = users.get(user_id)
+            if user is None:
+                continue
+            result.append({
+                'user_id': user_id,
+                'username': user['username'],
+                'full_name': user['full_name'],
+                'tier': user['tier'],
+                'video_count': video_count,
+                'total_views': views,
+                'total_earnings': earnings,
+                'main_platform': user['main_platform'],
+            })
+        return result
 
     async def get_platform_stats(self, platform: str, start_date, end_date) -> Dict[str, Any]:
-        """Получить статистику по платформе"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            stats = {}
-            start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-            end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
-            
-            async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE platform = ? AND created_at BETWEEN ? AND ?",
-                (platform, start_str, end_str)
-            ) as cursor:
-                stats['total_videos'] = (await cursor.fetchone())[0]
-            
-            async with db.execute(
-                "SELECT COUNT(*) FROM videos WHERE platform = ? AND status = 'approved' AND created_at BETWEEN ? AND ?",
-                (platform, start_str, end_str)
-            ) as cursor:
-                stats['approved_videos'] = (await cursor.fetchone())[0]
-            
-            async with db.execute(
-                "SELECT COALESCE(SUM(views), 0) FROM videos WHERE platform = ? AND created_at BETWEEN ? AND ?",
-                (platform, start_str, end_str)
-            ) as cursor:
-                stats['total_views'] = (await cursor.fetchone())[0]
-            
-            # Выплаты с автоматическим расчетом
-            if platform == 'tiktok':
-                async with db.execute(
-                    """SELECT COALESCE(SUM(CASE 
-                           WHEN earnings > 0 THEN earnings
-                           ELSE (views / 1000.0) * 65
-                       END), 0) 
-                       FROM videos 
-                       WHERE platform = ? AND status = 'approved' AND created_at BETWEEN ? AND ?""",
-                    (platform, start_str, end_str)
-                ) as cursor:
-                    stats['total_paid'] = (await cursor.fetchone())[0]
-            else:  # youtube
-                async with db.execute(
-                    """SELECT COALESCE(SUM(CASE 
-                           WHEN earnings > 0 THEN earnings
-                           ELSE 50 * (views / 1000.0)
-                       END), 0)
-                       FROM videos
-                       WHERE platform = ? AND status = 'approved' AND created_at BETWEEN ? AND ?""",
-                    (platform, start_str, end_str)
-                ) as cursor:
-                    stats['total_paid'] = (await cursor.fetchone())[0]
-            
-            return stats
+        """Получить статистику по платформе (tiktok или youtube)"""
+        m = await self.get_period_metrics(start_date, end_date)
+        return {
+            'total_videos': m[f'{platform}_videos'],
+            'approved_videos': m[f'{platform}_approved'],
+            'total_views': m[f'{platform}_views'],
+            'total_paid': m[f'{platform}_paid'],
+        }
 
     async def get_top_users_by_platform(self, platform: str, start_date, end_date, limit: int = 5) -> List[Dict[str, Any]]:
         """Получить топ пользователей по платформе (сортировка по просмотрам)"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        if platform == 'tiktok':
+            account_key = 'tiktok_username'
+            account_sql = "(SELECT username FROM tiktok_accounts WHERE user_id = u.user_id)"
+        else:  # youtube
+            account_key = 'youtube_channel'
+            account_sql = "(SELECT channel_name FROM youtube_channels WHERE user_id = u.user_id)"
+
+        async with self._analytics() as db:
             db.row_factory = aiosqlite.Row
-            start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-            end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
-            
-            if platform == 'tiktok':
-                async with db.execute(
-                    """SELECT 
-                           u.user_id, u.username, u.full_name,
-                           ta.username as tiktok_username,
-                           COALESCE(SUM(v.views), 0) as total_views,
-                           COALESCE(SUM(CASE 
-                               WHEN v.earnings > 0 THEN v.earnings
-                               ELSE (v.views / 1000.0) * 65
-                           END), 0) as total_earnings
-                       FROM users u
-                       LEFT JOIN videos v ON u.user_id = v.user_id 
-                           AND v.platform = 'tiktok' 
-                           AND v.status = 'approved'
-                           AND v.created_at BETWEEN ? AND ?
-                       LEFT JOIN tiktok_accounts ta ON u.user_id = ta.user_id
-                       GROUP BY u.user_id
-                       HAVING total_views > 0
-                       ORDER BY total_views DESC
-                       LIMIT ?""",
-                    (start_str, end_str, limit)
-                ) as cursor:
-                    rows = await cursor.fetchall()
-                    return [dict(row) for row in rows]
-            else:  # youtube
-                async with db.execute(
-                    """SELECT 
-                           u.user_id, u.username, u.full_name,
-                           yc.channel_name as youtube_channel,
-                           COALESCE(SUM(v.views), 0) as total_views,
-                           COALESCE(SUM(CASE 
-                               WHEN v.earnings > 0 THEN v.earnings
-                               ELSE 50 * (v.views / 1000.0)
-                           END), 0) as total_earnings
-                       FROM users u
-                       LEFT JOIN videos v ON u.user_id = v.user_id 
-                           AND v.platform = 'youtube' 
-                           AND v.status = 'approved'
-                           AND v.created_at BETWEEN ? AND ?
-                       LEFT JOIN youtube_channels yc ON u.user_id = yc.user_id
-                       GROUP BY u.user_id
-                       HAVING total_views > 0
-                       ORDER BY total_views DESC
-                       LIMIT ?""",
-                    (start_str, end_str, limit)
-                ) as cursor:
-                    rows = await cursor.fetchall()
-                    return [dict(row) for row in rows]
+            entries = [entry for entry in await self._top_entries(db, platform, start_date, end_date, limit)
+                       if entry[2] > 0]
+            if not entries:
+                return []
+            async with db.execute(
+                f"""SELECT u.user_id, u.username, u.full_name, {account_sql} AS account
+                    FROM users u
+                    WHERE u.user_id IN (SELECT value FROM json_each(?))""",
+                (json.dumps([entry[0] for entry in entries]),)
+            ) as cursor:
+                users = {row['user_id']: row for row in await cursor.fetchall()}
+
+        result = []
+        for user_id, _, views, earnings, unpaid_views in entries:
+            user = users.get(user_id)
+            if user is None:
+                continue
+            if platform != 'tiktok':
+                # Для YouTube без начислений — оценка по 50 ₽ за 1000 просмотров
+                earnings += 50 * (unpaid_views / 1000.0)
+            result.append({
+                'user_id': user_id,
+                'username': user['username'],
+                'full_name': user['full_name'],
+                account_key: user['account'],
+                'total_views': views,
+                'total_earnings': earnings,
+            })
+        return result
 
     async def get_finances_stats(self, start_date, end_date) -> Dict[str, Any]:
         """Получить финансовую статистику с автоматическим расчетом"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
-            stats = {}
-            start_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-            end_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # Общие выплаты (с автоматическим расчетом для TikTok)
-            async with db.execute(
-                """SELECT 
-                       COALESCE(SUM(CASE 
-                           WHEN earnings > 0 THEN earnings
-                           WHEN platform = 'tiktok' THEN (views / 1000.0) * 65
-                           ELSE 0
-                       END), 0) as total,
-                       COUNT(*) as count
-                   FROM videos 
-                   WHERE status = 'approved' AND created_at BETWEEN ? AND ?""",
-                (start_str, end_str)
-            ) as cursor:
-                row = await cursor.fetchone()
-                stats['total_paid'] = row[0]
-                stats['payout_count'] = row[1]
-            
-            stats['total_paid_usdt'] = stats['total_paid'] / 90.0
-            
-            # Балансы
-            async with db.execute("SELECT COALESCE(SUM(balance), 0) FROM users") as cursor:
-                stats['total_balance'] = (await cursor.fetchone())[0]
-            
-            async with db.execute("SELECT COALESCE(SUM(referral_earnings), 0) FROM users") as cursor:
-                stats['referral_earnings'] = (await cursor.fetchone())[0]
-            
-            # По платформам (с автоматическим расчетом)
-            async with db.execute(
-                """SELECT COALESCE(SUM(CASE 
-                       WHEN earnings > 0 THEN earnings
-                       ELSE (views / 1000.0) * 65
-                   END), 0) 
-                   FROM videos 
-                   WHERE platform = 'tiktok' AND status = 'approved' AND created_at BETWEEN ? AND ?""",
-                (start_str, end_str)
-            ) as cursor:
-                stats['tiktok_paid'] = (await cursor.fetchone())[0]
-            
-            async with db.execute(
-                """SELECT COALESCE(SUM(CASE 
-                       WHEN earnings > 0 THEN earnings
-                       ELSE 50 * (views / 1000.0)
-                   END), 0)
-                   FROM videos 
-                   WHERE platform = 'youtube' AND status = 'approved' AND created_at BETWEEN ? AND ?""",
-                (start_str, end_str)
-            ) as cursor:
-                stats['youtube_paid'] = (await cursor.fetchone())[0]
-            
-            # Средние показатели
-            stats['avg_payout'] = stats['total_paid'] / max(stats['payout_count'], 1)
-            
-            async with db.execute("SELECT COUNT(*) FROM users") as cursor:
-                user_count = (await cursor.fetchone())[0]
-            stats['avg_per_user'] = stats['total_paid'] / max(user_count, 1)
-            
-            return stats
+        m = await self.get_period_metrics(start_date, end_date)
+        stats = {
+            'total_paid': m['total_paid'],
+            'payout_count': m['approved_videos'],
+            'total_paid_usdt': m['total_paid'] / 90.0,
+            'total_balance': m['total_balance'],
+            'referral_earnings': m['referral_earnings'],
+            'tiktok_paid': m['tiktok_paid'],
+            'youtube_paid': m['youtube_paid'],
+        }
+
+        # Средние показатели
+        stats['avg_payout'] = stats['total_paid'] / max(stats['payout_count'], 1)
+        stats['avg_per_user'] = stats['total_paid'] / max(m['total_users'], 1)
+
+        return stats
 
     async def ban_user(self, user_id: int):
         """Забанить пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 "UPDATE users SET tier = 'banned' WHERE user_id = ?",
                 (user_id,)
             )
-            await db.commit()
 
     async def unban_user(self, user_id: int):
         """Разбанить пользователя"""
-        async with aiosqlite.connect(self.db_path, timeout=30.0) as db:
+        async with self._write(users=(user_id,)) as db:
             await db.execute(
                 "UPDATE users SET tier = 'bronze' WHERE user_id = ?",
                 (user_id,)
             )
-            await db.commit()
@@ -0,0 +1,267 @@
+"""
+Инструментирование SQL-запросов core.database.Database
+
+Каждый запрос замеряется вместе с чтением его строк (fetch*) и помечается
+именем публичного метода Database, из которого он выполнен. По скользящему
+окну считаются p50/p95/p99, а запросы дольше порога попадают в журнал
+медленных запросов вместе с EXPLAIN QUERY PLAN.
+
+При выключенном сборе Database отдаёт соединения без обёртки, так что накладные
+расходы сводятся к одной проверке флага.
+"""
+import json
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncContextManager, AsyncIterator, Deque, Dict, List, Optional
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+# Для каких выражений имеет смысл EXPLAIN QUERY PLAN
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def _percentile(sorted_values: List[float], percent: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class QueryMetrics:
+    """
+    Сбор задержек SQL-запросов по методам Database
+
+    Args:
+        enabled: Включён ли сбор
+        window: Размер скользящего окна задержек на метод
+        slow_ms: Порог медленного запроса (в миллисекундах)
+        slow_log_size: Сколько последних медленных запросов хранить
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        window: int = 1000,
+        slow_ms: float = 100.0,
+        slow_log_size: int = 100,
+    ):
+        self.enabled = enabled
+        self.window = window
+        self.slow_ms = slow_ms
+
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._totals: Dict[str, float] = {}
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+        self._started_at = datetime.now()
+
+    def record(self, method: str, duration_ms: float):
+        """Учесть выполнение запроса"""
+        samples = self._latencies.get(method)
+        if samples is None:
+            samples = self._latencies[method] = deque(maxlen=self.window)
+        samples.append(duration_ms)
+        self._counts[method] = self._counts.get(method, 0) + 1
+        self._totals[method] = self._totals.get(method, 0.0) + duration_ms
+
+    def record_slow(self, method: str, sql: str, duration_ms: float, plan: List[str]):
+        """Добавить запись в журнал медленных запросов"""
+        self._slow.append({
+            "method": method,
+            "sql": " ".join(sql.split()),
+            "duration_ms": round(duration_ms, 3),
+            "plan": plan,
+            "at": datetime.now().isoformat(timespec="seconds"),
+        })
+        logger.warning(f"Slow query in Database.{method}: {duration_ms:.1f} ms")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущие гистограммы и журнал медленных запросов (JSON-совместимо)"""
+        methods = {}
+        for method, samples in self._latencies.items():
+            ordered = sorted(samples)
+            methods[method] = {
+                "count": self._counts[method],
+                "total_ms": round(self._totals[method], 3),
+                "p50_ms": round(_percentile(ordered, 50), 3),
+                "p95_ms": round(_percentile(ordered, 95), 3),
+                "p99_ms": round(_percentile(ordered, 99), 3),
+                "max_ms": round(ordered[-1], 3) if ordered else 0.0,
+            }
+        return {
+            "enabled": self.enabled,
+            "since": self._started_at.isoformat(timespec="seconds"),
+            "slow_threshold_ms": self.slow_ms,
+            "methods": methods,
+            "slow_queries": list(self._slow),
+        }
+
+    def dump(self, path: str):
+        """Сохранить снимок метрик в JSON-файл"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+
+    def reset(self):
+        """Сбросить накопленные метрики"""
+        self._latencies.clear()
+        self._counts.clear()
+        self._totals.clear()
+        self._slow.clear()
+        self._started_at = datetime.now()
+
+    @asynccontextmanager
+    async def instrument(self, source: AsyncContextManager, method: str) -> AsyncIterator["InstrumentedConnection"]:
+        """Обернуть соединение из source, помечая его запросы именем метода"""
+        async with source as conn:
+            instrumented = InstrumentedConnection(conn, method, self)
+            try:
+                yield instrumented
+            finally:
+                await instrumented._finish()
+
+
+class _Query:
+    """Выполняемый запрос: время execute плюс время чтения его строк"""
+
+    __slots__ = ("sql", "parameters", "explain", "duration_ms")
+
+    def __init__(self, sql: str, parameters, explain: bool, duration_ms: float):
+        self.sql = sql
+        self.parameters = parameters
+        self.explain = explain
+        self.duration_ms = duration_ms
+
+
+class _TimedCursor:
+    """Прокси курсора: время fetch* добавляется к времени запроса"""
+
+    def __init__(self, cursor, conn: "InstrumentedConnection", query: _Query):
+        self._cursor = cursor
+        self._conn = conn
+        self._query = query
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def _fetch(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return await fetch(*args)
+        finally:
+            self._query.duration_ms += (time.perf_counter() - started) * 1000
+
+    async def fetchone(self):
+        return await self._fetch(self._cursor.fetchone)
+
+    async def fetchmany(self, size: Optional[int] = None):
+        return await self._fetch(self._cursor.fetchmany, size)
+
+    async def fetchall(self):
+        return await self._fetch(self._cursor.fetchall)
+
+    async def __aiter__(self):
+        while True:
+            rows = await self.fetchmany(self._cursor.arraysize)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+    async def close(self):
+        await self._cursor.close()
+        await self._conn._finish(self._query)
+
+
+class _TimedExecute:
+    """Результат execute: можно и await, и async with (как у aiosqlite)"""
+
+    __slots__ = ("_coro", "_cursor")
+
+    def __init__(self, coro):
+        self._coro = coro
+        self._cursor = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self):
+        self._cursor = await self._coro
+        return self._cursor
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._cursor.close()
+
+
+class InstrumentedConnection:
+    """
+    Прокси aiosqlite-соединения с замером execute/executemany
+
+    Запрос учитывается вместе с чтением его строк: при закрытии курсора,
+    при следующем запросе на этом соединении или при возврате соединения.
+    """
+
+    def __init__(self, conn, method: str, metrics: QueryMetrics):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_method", method)
+        object.__setattr__(self, "_metrics", metrics)
+        object.__setattr__(self, "_pending", None)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        # row_factory и прочие атрибуты устанавливаются на настоящем соединении
+        setattr(self._conn, name, value)
+
+    def execute(self, sql: str, parameters: Optional[Any] = None) -> _TimedExecute:
+        return _TimedExecute(self._timed(self._conn.execute, sql, parameters))
+
+    def executemany(self, sql: str, parameters) -> _TimedExecute:
+        return _TimedExecute(self._timed(self._conn.executemany, sql, parameters, explain=False))
+
+    async def _timed(self, execute, sql: str, parameters, explain: bool = True) -> _TimedCursor:
+        await self._finish()
+        started = time.perf_counter()
+        cursor = await (execute(sql, parameters) if parameters is not None else execute(sql))
+        query = _Query(sql, parameters, explain, (time.perf_counter() - started) * 1000)
+        object.__setattr__(self, "_pending", query)
+        return _TimedCursor(cursor, self, query)
+
+    async def _finish(self, query: Optional[_Query] = None):
+        """Учесть незавершённый запрос (или query, если он ещё не учтён)"""
+        pending = self._pending
+        if pending is None or (query is not None and query is not pending):
+            return
+        object.__setattr__(self, "_pending", None)
+
+        metrics = self._metrics
+        metrics.record(self._method, pending.duration_ms)
+        if pending.duration_ms >= metrics.slow_ms:
+            plan = await self._explain(pending.sql, pending.parameters) if pending.explain else []
+            metrics.record_slow(self._method, pending.sql, pending.duration_ms, plan)
+
+    async def _explain(self, sql: str, parameters) -> List[str]:
+        """EXPLAIN QUERY PLAN для медленного запроса (ошибки не пробрасываются)"""
+        if not sql.lstrip().upper().startswith(_EXPLAINABLE):
+            return []
+        try:
+            async with self._conn.execute(f"EXPLAIN QUERY PLAN {sql}", parameters or []) as cursor:
+                rows = await cursor.fetchall()
+            return [row[-1] for row in rows]
+        except Exception as e:
+            logger.debug(f"EXPLAIN QUERY PLAN failed for Database.{self._method}: {e}")
+            return []
+
+
+# Глобальный экземпляр, общий для всех Database
+query_metrics = QueryMetrics(
+    enabled=config.DB_METRICS_ENABLED,
+    window=config.DB_METRICS_WINDOW,
+    slow_ms=config.DB_SLOW_QUERY_MS,
+)
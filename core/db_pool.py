@@ -0,0 +1,425 @@
+"""
+Пул соединений SQLite для core.database.Database
+
+Все экземпляры Database с одинаковым путём к файлу используют один общий пул:
+соединения открываются лениво, живут всё время работы бота и переиспользуются,
+поэтому запрос к БД стоит одну выдачу соединения из очереди, а не запуск нового
+потока aiosqlite с повторным открытием файла.
+
+Читающие соединения пула работают в режиме query_only. Все записи проходят через
+единственное пишущее соединение (SingleWriter): операции из очереди объединяются
+в одну транзакцию с одним fsync, каждая операция изолирована своей SAVEPOINT.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+import aiosqlite
+
+from core.archive import attach_archive
+
+logger = logging.getLogger(__name__)
+
+# PRAGMA, действующие только в рамках соединения (применяются один раз при открытии)
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-10000",  # 10MB кэш страниц
+    "PRAGMA mmap_size=268435456",  # 256MB memory-mapped I/O
+)
+
+
+class ConnectionPool:
+    """
+    Пул долгоживущих aiosqlite-соединений
+
+    Args:
+        db_path: Путь к файлу базы данных
+        size: Максимальное количество одновременно открытых соединений
+        statement_cache: Размер кэша подготовленных выражений на соединение
+        timeout: Таймаут ожидания блокировки БД (в секундах)
+        write_batch: Максимум операций записи в одной групповой транзакции
+        archive_path: Файл архива видео, подключаемый к каждому соединению (см. core.archive)
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        size: int = 5,
+        statement_cache: int = 256,
+        timeout: float = 30.0,
+        write_batch: int = 64,
+        archive_path: Optional[str] = None,
+    ):
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.size = max(1, size)
+        self.statement_cache = statement_cache
+        self.timeout = timeout
+
+        self._idle: List[aiosqlite.Connection] = []
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._opened = 0
+        self._closed = False
+
+        # Выдачи, ждавшие освобождения соединения (все соединения заняты)
+        self.checkout_waits = 0
+        self.checkout_wait_ms = 0.0
+
+        self.writer = SingleWriter(self, max_batch=write_batch)
+
+    async def _open(self, *, readonly: bool = True, **kwargs) -> aiosqlite.Connection:
+        """Открыть новое соединение и применить PRAGMA"""
+        conn = aiosqlite.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.statement_cache,
+            **kwargs,
+        )
+        # Поток соединения не должен мешать завершению процесса
+        conn.daemon = True
+        await conn
+        try:
+            await conn.execute(f"PRAGMA busy_timeout={int(self.timeout * 1000)}")
+            for pragma in CONNECTION_PRAGMAS:
+                await conn.execute(pragma)
+            # Представление all_videos (videos + архив) нужно каждому соединению
+            await attach_archive(conn, self.archive_path)
+            if readonly:
+                # Писать разрешено только соединению SingleWriter
+                await conn.execute("PRAGMA query_only=ON")
+        except Exception:
+            await conn.close()
+            raise
+        logger.debug("Opened pooled connection to %s", self.db_path)
+        return conn
+
+    async def _checkout(self) -> aiosqlite.Connection:
+        """Получить соединение: свободное, новое или дождаться освобождения"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        if self._idle:
+            return self._idle.pop()
+
+        if self._opened < self.size:
+            self._opened += 1
+            try:
+                return await self._open()
+            except Exception:
+                self._opened -= 1
+                raise
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            conn = await waiter
+            self.checkout_waits += 1
+            self.checkout_wait_ms += (time.perf_counter() - started) * 1000
+            return conn
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Соединение успели передать, но ожидающий отменён
+                await self._checkin(waiter.result())
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            raise
+
+    async def _checkin(self, conn: aiosqlite.Connection):
+        """Вернуть соединение в пул в чистом состоянии"""
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+            conn.row_factory = None
+        except Exception as e:
+            # Соединение сломано — закрываем и освобождаем место в пуле
+            logger.warning(f"Discarding broken pooled connection: {e}")
+            self._opened -= 1
+            try:
+                await conn.close()
+            except Exception:
+                pass
+            return
+
+        if self._closed:
+            self._opened -= 1
+            await conn.close()
+            return
+
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(conn)
+                return
+
+        self._idle.append(conn)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Взять соединение из пула на время блока `async with`"""
+        conn = await self._checkout()
+        try:
+            yield conn
+        finally:
+            await self._checkin(conn)
+
+    def transaction(self):
+        """
+        Групповая транзакция записи (async with pool.transaction() as db)
+
+        Блок выполняется на пишущем соединении внутри своей SAVEPOINT; выход из
+        блока ждёт COMMIT всей группы. Ошибка внутри блока откатывает только его.
+        """
+        return self.writer.transaction()
+
+    async def close(self):
+        """Закрыть все свободные соединения (занятые закроются при возврате)"""
+        self._closed = True
+        await self.writer.close()
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            self._opened -= 1
+            try:
+                await conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing pooled connection: {e}")
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_exception(RuntimeError("Connection pool is closed"))
+        self._waiters.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Текущее состояние пула"""
+        return {
+            "size": self.size,
+            "opened": self._opened,
+            "idle": len(self._idle),
+            "waiting": len(self._waiters),
+            "checkout_waits": self.checkout_waits,
+            "checkout_wait_ms": round(self.checkout_wait_ms, 3),
+            **self.writer.stats(),
+        }
+
+
+class _WriteRequest:
+    """Заявка на запись: передача соединения, результат блока и итог COMMIT"""
+
+    __slots__ = ("ready", "done", "committed")
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.ready = loop.create_future()      # writer → вызывающий: соединение
+        self.done = loop.create_future()       # вызывающий → writer: None или исключение
+        self.committed = loop.create_future()  # writer → вызывающий: итог COMMIT
+
+
+def _resolve(future: asyncio.Future, result=None, exc: Optional[BaseException] = None):
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
+
+
+class SingleWriter:
+    """
+    Единственный писатель БД с групповым коммитом
+
+    Фоновая задача владеет пишущим соединением и по очереди выполняет блоки
+    записи. Всё, что накопилось в очереди, пока выполнялась транзакция, попадает
+    в неё же (до max_batch операций), затем один COMMIT и рассылка результатов.
+    Блок записи должен работать только с БД: пока он выполняется, остальные
+    записи ждут.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_batch: int = 64):
+        self.pool = pool
+        self.max_batch = max(1, max_batch)
+
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Писатель выполняет транзакцию (от BEGIN до COMMIT)
+        self._active = False
+
+        self.batches = 0
+        self.writes = 0
+        self.max_batch_seen = 0
+        self.write_waits = 0
+        self.write_wait_ms = 0.0
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._active = False
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        return loop
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[aiosqlite.Connection]:
+        if self.pool._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        request = _WriteRequest(self._ensure_started())
+        # Запись ждёт, если писатель занят чужим блоком или очередь не пуста
+        blocked = self._active or not self._queue.empty()
+        self._queue.put_nowait(request)
+
+        started = time.perf_counter()
+        try:
+            conn = await request.ready
+            if blocked:
+                self.write_waits += 1
+                self.write_wait_ms += (time.perf_counter() - started) * 1000
+        except asyncio.CancelledError as e:
+            # Соединение могли выдать одновременно с отменой — вернём его писателю
+            if request.ready.done() and not request.ready.cancelled():
+                _resolve(request.done, e)
+            raise
+
+        try:
+            yield conn
+        except BaseException as e:
+            _resolve(request.done, e)
+            raise
+        _resolve(request.done, None)
+        await request.committed
+
+    async def _run(self):
+        """Цикл писателя: BEGIN → блоки в SAVEPOINT → COMMIT"""
+        queue = self._queue
+        while True:
+            request = await queue.get()
+            if request is None:
+                return
+
+            self._active = True
+            try:
+                if self._conn is None:
+                    # Ручное управление транзакциями (isolation_level=None)
+                    self._conn = await self.pool._open(readonly=False, isolation_level=None)
+                await self._conn.execute("BEGIN IMMEDIATE")
+            except Exception as e:
+                logger.error(f"Writer failed to begin transaction: {e}")
+                _resolve(request.ready, exc=e)
+                self._active = False
+                continue
+
+            applied: List[_WriteRequest] = []
+            pending: Optional[_WriteRequest] = request
+            count = 0
+            stop = False
+            try:
+                while pending is not None:
+                    if not pending.ready.done():
+                        count += 1
+                        if await self._apply(pending):
+                            applied.append(pending)
+
+                    pending = None
+                    if count < self.max_batch and not queue.empty():
+                        pending = queue.get_nowait()
+                        if pending is None:
+                            stop = True
+                            pending = None
+
+                await self._conn.execute("COMMIT")
+            except Exception as e:
+                logger.error(f"Group commit failed, rolling back {len(applied)} writes: {e}")
+                try:
+                    await self._conn.execute("ROLLBACK")
+                except Exception:
+                    pass
+                for item in applied:
+                    _resolve(item.committed, exc=e)
+                if pending is not None:
+                    _resolve(pending.ready, exc=e)
+                    _resolve(pending.committed, exc=e)
+            else:
+                for item in applied:
+                    _resolve(item.committed)
+                if applied:
+                    self.batches += 1
+                    self.writes += len(applied)
+                    self.max_batch_seen = max(self.max_batch_seen, len(applied))
+            self._active = False
+
+            if stop:
+                return
+
+    async def _apply(self, request: _WriteRequest) -> bool:
+        """Выполнить один блок записи в своей SAVEPOINT; True — если применён"""
+        await self._conn.execute("SAVEPOINT write_op")
+        _resolve(request.ready, self._conn)
+
+        error = await request.done
+        if error is None:
+            await self._conn.execute("RELEASE write_op")
+            return True
+
+        await self._conn.execute("ROLLBACK TO write_op")
+        await self._conn.execute("RELEASE write_op")
+        return False
+
+    async def close(self):
+        """Дождаться записи очереди и закрыть пишущее соединение"""
+        if self._task is not None and not self._task.done():
+            if self._loop is asyncio.get_running_loop():
+                self._queue.put_nowait(None)
+                await self._task
+            else:
+                self._task.cancel()
+        self._task = None
+        if self._conn is not None:
+            try:
+                await self._conn.close()
+            except Exception as e:
+                logger.warning(f"Error closing writer connection: {e}")
+            self._conn = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "write_batches": self.batches,
+            "writes": self.writes,
+            "max_write_batch": self.max_batch_seen,
+            "write_queue": self._queue.qsize() if self._queue is not None else 0,
+            "write_waits": self.write_waits,
+            "write_wait_ms": round(self.write_wait_ms, 3),
+        }
+
+
+# Общие пулы по абсолютному пути к файлу БД
+_pools: Dict[str, ConnectionPool] = {}
+
+
+def get_pool(db_path: str, **kwargs) -> ConnectionPool:
+    """
+    Получить общий пул для файла БД (создаётся при первом обращении)
+
+    Параметры kwargs передаются в ConnectionPool и учитываются только при создании.
+    """
+    key = os.path.abspath(db_path)
+    pool = _pools.get(key)
+    if pool is None or pool._closed:
+        pool = ConnectionPool(db_path, **kwargs)
+        _pools[key] = pool
+    return pool
+
+
+async def close_all_pools():
+    """Закрыть все пулы соединений (вызывается при остановке бота)"""
+    pools = list(_pools.values())
+    _pools.clear()
+    for pool in pools:
+        await pool.close()
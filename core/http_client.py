@@ -0,0 +1,224 @@
+"""
+Общий HTTP-клиент для исходящих запросов парсеров и хендлеров
+
+Одна aiohttp-сессия на процесс: соединения к tiktok.com и youtube.com
+остаются открытыми между запросами (keep-alive), DNS-ответы кэшируются,
+поэтому повторный парсинг не платит за TCP, TLS и DNS заново. Ответы
+запрашиваются сжатыми (brotli, если установлен пакет для распаковки, иначе
+gzip/deflate) и распаковываются aiohttp.
+
+read_until читает тело частями и обрывает загрузку, как только нужные
+данные получены. Для него ответ запрашивается через get_raw_http_session() —
+сессию без распаковки на том же пуле соединений: read_until сам распаковывает
+тело и считает байты, пришедшие по сети, поэтому может дочитать небольшой
+сжатый остаток и вернуть соединение в пул. Счётчики — в get_http_stats().
+
+Сессии создаются при запуске бота (get_http_session) и закрываются при
+остановке (close_http_session) вместе с сессией Crypto Pay.
+"""
+import logging
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import aiohttp
+
+from core import config
+
+logger = logging.getLogger(__name__)
+
+# aiohttp распаковывает brotli, только если установлен Brotli или brotlicffi
+try:
+    import brotlicffi as _brotli
+except ImportError:
+    try:
+        import brotli as _brotli
+    except ImportError:
+        _brotli = None
+
+ACCEPT_ENCODING = 'br, gzip, deflate' if _brotli else 'gzip, deflate'
+
+# Заголовки обычного браузера — без них TikTok и YouTube отдают урезанную страницу
+BROWSER_HEADERS: Dict[str, str] = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
+    'Accept-Encoding': ACCEPT_ENCODING,
+}
+
+_session: Optional[aiohttp.ClientSession] = None
+_raw_session: Optional[aiohttp.ClientSession] = None
+
+# Счётчики потокового чтения (read_until)
+_stream_stats: Dict[str, int] = {
+    "requests": 0,
+    "early_closed": 0,
+    "drained": 0,
+    "network_bytes": 0,
+    "bytes_read": 0,
+}
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """
+    Получить общую HTTP-сессию (создаётся при первом обращении)
+
+    Вызывается внутри работающего цикла событий. Сессию нельзя закрывать
+    после запроса — её закрывает close_http_session при остановке бота.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=config.HTTP_POOL_LIMIT,
+            limit_per_host=config.HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=config.HTTP_DNS_CACHE_TTL,
+            enable_cleanup_closed=True,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            headers=BROWSER_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=config.HTTP_TIMEOUT, connect=10),
+            auto_decompress=True,
+        )
+        logger.info(
+            f"✓ HTTP-сессия создана: до {config.HTTP_POOL_LIMIT} соединений "
+            f"({config.HTTP_POOL_LIMIT_PER_HOST} на хост), keep-alive {config.HTTP_KEEPALIVE_TIMEOUT:.0f} сек"
+        )
+    return _session
+
+
+def get_raw_http_session() -> aiohttp.ClientSession:
+    """
+    Сессия без распаковки ответов на пуле соединений общей сессии
+
+    Только для read_until: тело приходит сжатым, как по сети.
+    """
+    global _raw_session
+    session = get_http_session()
+    if _raw_session is None or _raw_session.closed or _raw_session.connector is not session.connector:
+        _raw_session = aiohttp.ClientSession(
+            connector=session.connector,
+            connector_owner=False,
+            headers=BROWSER_HEADERS,
+            timeout=session.timeout,
+            auto_decompress=False,
+        )
+    return _raw_session
+
+
+async def close_http_session():
+    """Закрыть общую HTTP-сессию"""
+    global _session, _raw_session
+    if _raw_session is not None:
+        # Пул соединений принадлежит общей сессии — закрывается вместе с ней
+        await _raw_session.close()
+        _raw_session = None
+    if _session is None:
+        return
+    try:
+        await _session.close()
+        logger.info("HTTP-сессия закрыта")
+    except Exception as e:
+        logger.error(f"Ошибка закрытия HTTP-сессии: {e}")
+    finally:
+        _session = None
+
+
+def _decoder(encoding: str) -> Optional[Tuple[Callable[[bytes], bytes], Callable[[], bytes]]]:
+    """Распаковка частей тела для Content-Encoding: (decompress, flush) или None без сжатия"""
+    encoding = encoding.strip().lower()
+    if encoding in ('', 'identity'):
+        return None
+    if encoding in ('gzip', 'x-gzip', 'deflate'):
+        decompressor = zlib.decompressobj(zlib.MAX_WBITS + (16 if encoding != 'deflate' else 0))
+        return decompressor.decompress, decompressor.flush
+    if encoding == 'br' and _brotli is not None:
+        decompressor = _brotli.Decompressor()
+        return getattr(decompressor, 'process', None) or decompressor.decompress, lambda: b''
+    raise aiohttp.ClientPayloadError(f"Неподдерживаемый Content-Encoding: {encoding}")
+
+
+async def read_until(
+    response: aiohttp.ClientResponse,
+    feed: Callable[[bytes], bool],
+    chunk_size: Optional[int] = None,
+    drain_limit: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Читать тело ответа частями, пока feed(часть) не вернёт True
+
+    Ответ получен через get_raw_http_session(): части распаковываются здесь
+    (gzip, deflate, br) и передаются в feed уже распакованными. Когда данные
+    получены до конца тела, остаток дочитывается без распаковки, если он не
+    больше drain_limit сетевых байт, — соединение тогда возвращается в пул.
+    Иначе соединение закрывается: большой остаток дороже нового соединения.
+    Возвращает статистику запроса: network_bytes (загружено по сети, вместе
+    с дочитанным остатком), bytes_read (распакованных байт), early (оборвано
+    ли чтение), drained, content_length (в сетевых байтах).
+    """
+    chunk_size = chunk_size or config.HTTP_STREAM_CHUNK_SIZE
+    drain_limit = config.HTTP_STREAM_DRAIN_BYTES if drain_limit is None else drain_limit
+    decoder = _decoder(response.headers.get("Content-Encoding", ""))
+    result = {
+        "network_bytes": 0,
+        "bytes_read": 0,
+        "early": False,
+        "drained": False,
+        "content_length": response.content_length,
+    }
+
+    done = False
+    async for chunk in response.content.iter_chunked(chunk_size):
+        result["network_bytes"] += len(chunk)
+        data = decoder[0](chunk) if decoder else chunk
+        if not data:
+            continue
+        result["bytes_read"] += len(data)
+        if feed(data):
+            done = True
+            break
+
+    if done and not response.content.at_eof():
+        remaining = (response.content_length or 0) - result["network_bytes"]
+        if response.content_length is None or remaining <= drain_limit:
+            # Остаток неизвестен или мал — дочитываем не больше drain_limit байт
+            budget = drain_limit
+            while budget > 0 and not response.content.at_eof():
+                tail = await response.content.read(min(chunk_size, budget))
+                if not tail:
+                    break
+                result["network_bytes"] += len(tail)
+                budget -= len(tail)
+            result["drained"] = response.content.at_eof()
+        if not result["drained"]:
+            result["early"] = True
+            response.close()
+    elif not done and decoder:
+        # Конец тела: отдаём то, что осталось в буфере распаковки
+        tail = decoder[1]()
+        if tail:
+            result["bytes_read"] += len(tail)
+            feed(tail)
+
+    _stream_stats["requests"] += 1
+    _stream_stats["network_bytes"] += result["network_bytes"]
+    _stream_stats["bytes_read"] += result["bytes_read"]
+    if result["early"]:
+        _stream_stats["early_closed"] += 1
+    if result["drained"]:
+        _stream_stats["drained"] += 1
+    return result
+
+
+def get_http_stats() -> Dict[str, Any]:
+    """
+    Счётчики потокового чтения: запросы, оборванные досрочно и дочитанные,
+    байты по сети (network_bytes) и после распаковки (bytes_read)
+    """
+    requests = _stream_stats["requests"]
+    return {
+        **_stream_stats,
+        "avg_network_bytes": round(_stream_stats["network_bytes"] / requests) if requests else 0,
+        "avg_bytes_read": round(_stream_stats["bytes_read"] / requests) if requests else 0,
+        "accept_encoding": ACCEPT_ENCODING,
+    }
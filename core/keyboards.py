@@ -1,5 +1,6 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
+from typing import Optional
 
 
 def main_menu_keyboard(is_admin: bool = False) -> ReplyKeyboardMarkup:
@@ -108,18 +109,27 @@ def payment_methods_list_keyboard(methods: list) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def pagination_keyboard(page: int, total_pages: int, prefix: str) -> InlineKeyboardMarkup:
-    """Клавиатура пагинации"""
+def pagination_keyboard(page: int, total_pages: int, prefix: str,
+                        prev_cursor: Optional[str] = None,
+                        next_cursor: Optional[str] = None) -> InlineKeyboardMarkup:
+    """
+    Клавиатура пагинации
+
+    prev_cursor/next_cursor — позиция для keyset-пагинации, добавляется в
+    callback_data как {prefix}_page_{n}_{cursor}.
+    """
     builder = InlineKeyboardBuilder()
     
     buttons = []
     if page > 1:
-        buttons.append(InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}_page_{page-1}"))
+        prev_data = f"{prefix}_page_{page-1}" + (f"_{prev_cursor}" if prev_cursor else "")
+        buttons.append(InlineKeyboardButton(text="⬅️", callback_data=prev_data))
     
     buttons.append(InlineKeyboardButton(text=f"{page}/{total_pages}", callback_data="current_page"))
     
     if page < total_pages:
-        buttons.append(InlineKeyboardButton(text="➡️", callback_data=f"{prefix}_page_{page+1}"))
+        next_data = f"{prefix}_page_{page+1}" + (f"_{next_cursor}" if next_cursor else "")
+        buttons.append(InlineKeyboardButton(text="➡️", callback_data=next_data))
     
     builder.row(*buttons)
     builder.row(
@@ -0,0 +1,113 @@
+"""
+Рейтинги пользователей (top-K) для admin-панели
+
+Суммы одобренных видео по пользователю/платформе/дню поддерживаются триггерами
+в user_daily_stats. Для целых суток периода здесь хранится top-K пользователей
+по просмотрам; он перестраивается лениво — при первом чтении после изменения
+leaderboard_version (её увеличивают те же триггеры).
+
+Неполные дни по краям периода Database досчитывает из videos и объединяет с
+сохранённым top-K через merge(). Пока глубина top-K не меньше запрошенного
+limit, результат совпадает с полным пересчётом.
+"""
+import heapq
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# (user_id, video_count, views, earnings, unpaid_views)
+Entry = Tuple[int, int, int, float, int]
+
+
+def _rank_key(entry: Entry):
+    # Больше просмотров — выше; при равенстве — меньший user_id
+    return (-entry[2], entry[0])
+
+
+class Leaderboard:
+    """
+    Top-K рейтинги по периодам из целых суток
+
+    Args:
+        depth: Сколько лучших пользователей хранить на период
+        maxsize: Максимальное количество хранимых периодов
+    """
+
+    def __init__(self, depth: int = 100, maxsize: int = 64):
+        self.depth = max(1, depth)
+        self.maxsize = max(1, maxsize)
+
+        # key → (version, depth, entries)
+        self._rankings: "OrderedDict[Hashable, Tuple[int, int, List[Entry]]]" = OrderedDict()
+
+        self.hits = 0
+        self.rebuilds = 0
+
+    def get(self, key: Hashable, version: int, limit: int) -> Optional[List[Entry]]:
+        """Сохранённый top-K периода, если он актуален и достаточно глубок"""
+        ranking = self._rankings.get(key)
+        if ranking is None or ranking[0] != version or ranking[1] < limit:
+            return None
+        self._rankings.move_to_end(key)
+        self.hits += 1
+        return ranking[2]
+
+    def put(self, key: Hashable, version: int, depth: int, entries: List[Entry]):
+        """Сохранить top-K периода (entries отсортированы по рейтингу)"""
+        self._rankings[key] = (version, depth, entries)
+        self._rankings.move_to_end(key)
+        while len(self._rankings) > self.maxsize:
+            self._rankings.popitem(last=False)
+        self.rebuilds += 1
+
+    def clear(self):
+        self._rankings.clear()
+
+    @staticmethod
+    def merge(ranking: Iterable[Entry], edges: Iterable[Entry],
+              edge_base: Dict[int, Entry], limit: int) -> List[Entry]:
+        """
+        Объединить top-K целых суток с суммами неполных дней
+
+        edges — суммы неполных дней; edge_base — суммы за целые сутки для
+        пользователей из edges, которых нет в ranking. Пользователь вне ranking
+        и edges не может обогнать ни одного из K пользователей ranking, поэтому
+        кандидатов достаточно.
+        """
+        totals: Dict[int, List] = {entry[0]: list(entry) for entry in ranking}
+        for user_id, base in edge_base.items():
+            totals.setdefault(user_id, list(base))
+        for entry in edges:
+            total = totals.get(entry[0])
+            if total is None:
+                totals[entry[0]] = list(entry)
+            else:
+                for i in range(1, 5):
+                    total[i] += entry[i]
+        return heapq.nsmallest(limit, (tuple(total) for total in totals.values()), key=_rank_key)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "periods": len(self._rankings),
+            "depth": self.depth,
+            "hits": self.hits,
+            "rebuilds": self.rebuilds,
+        }
+
+
+# Общие рейтинги по абсолютному пути к файлу БД
+_leaderboards: Dict[str, Leaderboard] = {}
+
+
+def get_leaderboard(db_path: str, **kwargs) -> Leaderboard:
+    """
+    Получить общий рейтинг для файла БД (создаётся при первом обращении)
+
+    Параметры kwargs передаются в Leaderboard и учитываются только при создании.
+    """
+    key = os.path.abspath(db_path)
+    leaderboard = _leaderboards.get(key)
+    if leaderboard is None:
+        leaderboard = Leaderboard(**kwargs)
+        _leaderboards[key] = leaderboard
+    return leaderboard
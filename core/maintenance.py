@@ -0,0 +1,285 @@
+"""
+Фоновое обслуживание файла БД
+
+Задачи выполняет отдельное соединение мелкими шагами, каждый — в своей
+короткой транзакции, так что блокировка записи держится миллисекунды и
+SingleWriter бота ждёт не дольше одного шага:
+- checkpoint — PASSIVE-чекпойнт WAL на каждом проходе (не блокирует ни
+  читателей, ни писателей); если WAL перенесён целиком и файл -wal вырос,
+  он обрезается TRUNCATE-чекпойнтом с коротким busy_timeout;
+- analyze — ANALYZE каждой таблицы отдельно с PRAGMA analysis_limit, затем
+  PRAGMA optimize;
+- vacuum — PRAGMA incremental_vacuum пачками страниц с паузами, пока список
+  свободных страниц не опустеет (нужен auto_vacuum=INCREMENTAL: новые БД
+  создаются с ним, старые переводит scripts/optimize_database.py).
+
+analyze и vacuum выполняются раз в сутки в окне низкой нагрузки; пока у
+писателя есть очередь, шаги откладываются. Длительность и результат каждого
+прогона сохраняются в history и пишутся в лог.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from datetime import time as dt_time
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних прогонов хранить в history
+HISTORY_SIZE = 50
+
+
+def parse_window(text: str) -> Optional[Tuple[dt_time, dt_time]]:
+    """Окно «ЧЧ:ММ-ЧЧ:ММ» (может переходить через полночь); пустая строка — без окна"""
+    if not text:
+        return None
+    start, end = text.split("-", 1)
+    return dt_time.fromisoformat(start.strip()), dt_time.fromisoformat(end.strip())
+
+
+class DatabaseMaintenance:
+    """
+    Планировщик обслуживания БД
+
+    Args:
+        pool: Пул основной БД (очередь его писателя откладывает шаги обслуживания)
+        interval: Интервал проходов (в секундах)
+        window: Окно низкой нагрузки для analyze и vacuum (None — в любое время)
+        analysis_limit: PRAGMA analysis_limit для ANALYZE (строк на индекс)
+        vacuum_pages: Страниц за один шаг incremental_vacuum
+        step_pause: Пауза между шагами (в секундах)
+        wal_truncate_bytes: Размер -wal, после которого файл обрезается
+        busy_timeout: Ожидание блокировки одним шагом (в мс); занято — шаг повторяется позже
+    """
+
+    def __init__(
+        self,
+        pool,
+        interval: float = 300.0,
+        window: Optional[Tuple[dt_time, dt_time]] = None,
+        analysis_limit: int = 1000,
+        vacuum_pages: int = 256,
+        step_pause: float = 0.05,
+        wal_truncate_bytes: int = 64 * 2**20,
+        busy_timeout: int = 10,
+        max_retries: int = 100,
+    ):
+        self.pool = pool
+        self.interval = interval
+        self.window = window
+        self.analysis_limit = analysis_limit
+        self.vacuum_pages = max(1, vacuum_pages)
+        self.step_pause = step_pause
+        self.wal_truncate_bytes = wal_truncate_bytes
+        self.busy_timeout = busy_timeout
+        self.max_retries = max_retries
+
+        self._last_daily: Optional[str] = None
+
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=HISTORY_SIZE)
+        self.runs = 0
+
+    @property
+    def db_path(self) -> str:
+        return self.pool.db_path
+
+    @asynccontextmanager
+    async def _connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Отдельное соединение в autocommit: каждый шаг — своя транзакция
+
+        Короткий busy_timeout: шаг не ждёт блокировку долго, а уступает её
+        писателю бота и повторяется (см. _step).
+        """
+        conn = aiosqlite.connect(self.db_path, timeout=self.busy_timeout / 1000, isolation_level=None)
+        conn.daemon = True
+        await conn
+        try:
+            await conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+            yield conn
+        finally:
+            await conn.close()
+
+    async def _yield_to_writes(self):
+        """Пауза между шагами; пока у писателя бота есть очередь — дольше"""
+        await asyncio.sleep(self.step_pause)
+        # Ожидание ограничено: при постоянной нагрузке шаг всё равно выполнится
+        for _ in range(20):
+            if not self.pool.writer.stats()["write_queue"]:
+                break
+            await asyncio.sleep(self.step_pause)
+
+    @staticmethod
+    async def _pragma(db: aiosqlite.Connection, pragma: str):
+        async with db.execute(f"PRAGMA {pragma}") as cursor:
+            return await cursor.fetchone()
+
+    async def _step(self, db: aiosqlite.Connection, sql: str) -> float:
+        """
+        Выполнить шаг, уступая писателю бота; возвращает длительность успешной попытки
+
+        Шаг выполняется через executescript: incremental_vacuum через execute
+        освобождает одну страницу за выбранную строку результата, а
+        sqlite3_exec проходит все шаги оператора.
+        """
+        for attempt in range(self.max_retries):
+            await self._yield_to_writes()
+            started = time.perf_counter()
+            try:
+                await db.executescript(sql)
+                return time.perf_counter() - started
+            except aiosqlite.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+        raise aiosqlite.OperationalError(f"БД занята: {sql}")
+
+    def _record(self, job: str, started: float, max_step: float, effect: Dict[str, Any]) -> Dict[str, Any]:
+        run = {
+            "job": job,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "max_step_ms": round(max_step * 1000, 2),
+            **effect,
+        }
+        self.history.append(run)
+        self.runs += 1
+        return run
+
+    # === ЗАДАЧИ ===
+
+    async def checkpoint(self, db: aiosqlite.Connection) -> Dict[str, Any]:
+        """PASSIVE-чекпойнт; TRUNCATE, если WAL перенесён целиком и -wal вырос"""
+        started = time.perf_counter()
+        busy, log_frames, checkpointed = await self._pragma(db, "wal_checkpoint(PASSIVE)")
+        max_step = time.perf_counter() - started
+
+        wal_path = f"{self.db_path}-wal"
+        wal_size = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        truncated = False
+        if not busy and log_frames == checkpointed and wal_size > self.wal_truncate_bytes:
+            # Все кадры уже в файле БД — TRUNCATE только обнуляет -wal. Если
+            # читатели или писатель заняты дольше busy_timeout, попробуем в следующий раз
+            step = time.perf_counter()
+            truncated = (await self._pragma(db, "wal_checkpoint(TRUNCATE)"))[0] == 0
+            max_step = max(max_step, time.perf_counter() - step)
+
+        return self._record("checkpoint", started, max_step, {
+            "wal_frames": log_frames,
+            "checkpointed": checkpointed,
+            "wal_bytes": wal_size,
+            "truncated": truncated,
+        })
+
+    async def analyze(self, db: aiosqlite.Connection) -> Dict[str, Any]:
+        """ANALYZE по таблицам с analysis_limit, затем PRAGMA optimize"""
+        started = time.perf_counter()
+        max_step = 0.0
+        await db.execute(f"PRAGMA analysis_limit={int(self.analysis_limit)}")
+        async with db.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ) as cursor:
+            tables = [row[0] for row in await cursor.fetchall()]
+
+        for table in tables:
+            max_step = max(max_step, await self._step(db, f'ANALYZE main."{table}"'))
+        max_step = max(max_step, await self._step(db, "PRAGMA optimize"))
+        return self._record("analyze", started, max_step, {"tables": len(tables)})
+
+    async def vacuum(self, db: aiosqlite.Connection) -> Dict[str, Any]:
+        """incremental_vacuum по vacuum_pages страниц, пока есть свободные"""
+        started = time.perf_counter()
+        max_step = 0.0
+        if (await self._pragma(db, "auto_vacuum"))[0] != 2:
+            return self._record("vacuum", started, max_step, {"skipped": "auto_vacuum не INCREMENTAL"})
+
+        page_size = (await self._pragma(db, "page_size"))[0]
+        free_before = free = (await self._pragma(db, "freelist_count"))[0]
+        while free:
+            max_step = max(max_step, await self._step(db, f"PRAGMA incremental_vacuum({self.vacuum_pages})"))
+            remaining = (await self._pragma(db, "freelist_count"))[0]
+            if remaining >= free:
+                break
+            free = remaining
+
+        return self._record("vacuum", started, max_step, {
+            "freed_pages": free_before - free,
+            "freed_bytes": (free_before - free) * page_size,
+            "free_pages": free,
+        })
+
+    # === ПЛАНИРОВАНИЕ ===
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        if self.window is None:
+            return True
+        current = (now or datetime.now()).time()
+        start, end = self.window
+        if start <= end:
+            return start <= current < end
+        return current >= start or current < end
+
+    async def run_once(self, *, daily: Optional[bool] = None):
+        """
+        Один проход: чекпойнт и, если пора, суточные analyze и vacuum
+
+        daily=None — суточные задачи раз в сутки в окне; True/False — принудительно.
+        """
+        today = datetime.now().date().isoformat()
+        if daily is None:
+            daily = self._last_daily != today and self.in_window()
+
+        async with self._connection() as db:
+            runs = [await self.checkpoint(db)]
+            if daily:
+                runs.append(await self.analyze(db))
+                runs.append(await self.vacuum(db))
+                self._last_daily = today
+                # После vacuum в WAL новые кадры — переносим их сразу
+                runs.append(await self.checkpoint(db))
+
+        for run in runs:
+            if run["job"] != "checkpoint" or run["truncated"]:
+                logger.info(f"🧰 Обслуживание БД: {run}")
+        return runs
+
+    async def run_periodic(self):
+        """Фоновое обслуживание каждые interval секунд"""
+        window = "-".join(t.strftime("%H:%M") for t in self.window) if self.window else "любое время"
+        logger.info(f"✓ Обслуживание БД: проход каждые {self.interval:.0f} сек, analyze/vacuum: {window}")
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"❌ Ошибка обслуживания БД: {e}")
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self.runs,
+            "last_daily": self._last_daily,
+            "recent": list(self.history)[-5:],
+        }
+
+
+# Общие планировщики по абсолютному пути к файлу БД
+_maintenances: Dict[str, DatabaseMaintenance] = {}
+
+
+def get_maintenance(pool, **kwargs) -> DatabaseMaintenance:
+    """
+    Получить общий планировщик обслуживания для пула БД (создаётся при первом обращении)
+
+    Параметры kwargs передаются в DatabaseMaintenance и учитываются только при создании.
+    """
+    key = os.path.abspath(pool.db_path)
+    maintenance = _maintenances.get(key)
+    if maintenance is None or maintenance.pool is not pool:
+        maintenance = DatabaseMaintenance(pool, **kwargs)
+        _maintenances[key] = maintenance
+    return maintenance
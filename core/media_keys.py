@@ -1,6 +1,5 @@
 import asyncio
 import logging
-from datetime import datetime
 from typing import List, Tuple
 
 from aiogram import Bot
@@ -21,11 +20,13 @@ class MediaKeyDistributor:
         min_videos: int = 2,
         period_days: int = 7,
         interval_hours: int = 24,
+        notify_concurrency: int = 20,
     ):
         self.db = Database(db_path)
         self.min_videos = min_videos
         self.period_days = period_days
         self.interval = interval_hours * 3600
+        self.notify_concurrency = max(1, notify_concurrency)
         self._running = False
 
     async def start_auto_distribution(self, bot: Bot):
@@ -73,27 +74,30 @@ class MediaKeyDistributor:
             )
             return
 
-        assigned: List[Tuple[dict, dict]] = []
-
-        for user in eligible_users:
-            if available_keys <= 0:
-                logger.info("Ключи закончились, остановка выдачи")
-                break
-
-            key = await self.db.get_next_available_media_key()
-            if not key:
-                logger.info("Свободные ключи закончились")
-                break
+        # Ключи закрепляются одной транзакцией: без гонок и повторной выдачи
+        allocations = await self.db.allocate_media_keys(
+            [user["user_id"] for user in eligible_users]
+        )
+        if len(allocations) < len(eligible_users):
+            logger.info(
+                "Ключи закончились: выдано %s из %s", len(allocations), len(eligible_users)
+            )
 
-            await self.db.mark_media_key_assigned(key["id"], user["user_id"])
-            await self.db.update_user_last_key_issued(user["user_id"], datetime.utcnow())
+        users_by_id = {user["user_id"]: user for user in eligible_users}
+        assigned: List[Tuple[dict, dict]] = [
+            (users_by_id[item["user_id"]], {"id": item["key_id"], "key_value": item["key_value"]})
+            for item in allocations
+        ]
 
-            available_keys -= 1
-            assigned.append((user, key))
+        if assigned:
+            # Уведомления отправляются параллельно (с ограничением одновременных запросов)
+            semaphore = asyncio.Semaphore(self.notify_concurrency)
 
-            await self._notify_user(bot, user, key)
+            async def notify(user: dict, key: dict):
+                async with semaphore:
+                    await self._notify_user(bot, user, key)
 
-        if assigned:
+            await asyncio.gather(*(notify(user, key) for user, key in assigned))
             await self._notify_admin(bot, assigned)
         else:
             logger.info("Никому не удалось выдать ключи в этот цикл")
@@ -0,0 +1,827 @@
+"""
+Версионированные миграции схемы БД
+
+Каждая миграция — пронумерованный шаг, который применяется один раз в своей
+транзакции и записывается в таблицу schema_version. На актуальной БД запуск
+сводится к одной проверке версии.
+
+Новый шаг добавляется функцией с декоратором @migration(<следующий номер>, "<описание>").
+Шаги должны быть идемпотентны (IF NOT EXISTS и т.п.): базы, созданные до
+появления schema_version, проходят все шаги с начала.
+"""
+import logging
+from typing import Awaitable, Callable, List, Tuple
+
+import aiosqlite
+
+logger = logging.getLogger(__name__)
+
+Migration = Tuple[int, str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Зарегистрировать шаг миграции (номера строго по возрастанию)"""
+    def register(func):
+        if MIGRATIONS and version <= MIGRATIONS[-1][0]:
+            raise ValueError(f"Migration {version} is out of order")
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+async def _execute_all(db: aiosqlite.Connection, statements):
+    for sql in statements:
+        await db.execute(sql)
+
+
+async def _add_missing_columns(db: aiosqlite.Connection, table: str, columns):
+    """Добавить колонки, которых нет в таблице (для баз, созданных старыми версиями)"""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {row[1] for row in await cursor.fetchall()}
+    for name, definition in columns:
+        if name not in existing:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+            logger.info(f"✅ Добавлена колонка {table}.{name}")
+
+
+# === СХЕМА ===
+
+BASE_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        full_name TEXT,
+        balance REAL DEFAULT 0,
+        total_videos INTEGER DEFAULT 0,
+        total_views INTEGER DEFAULT 0,
+        total_withdrawn REAL DEFAULT 0,
+        referrer_id INTEGER,
+        referral_earnings REAL DEFAULT 0,
+        tier TEXT DEFAULT 'bronze',
+        last_key_issued_at TIMESTAMP,
+        blocked_until TIMESTAMP,
+        free_key_claimed_at TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (referrer_id) REFERENCES users(user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS channels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        channel_id TEXT NOT NULL,
+        channel_name TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id),
+        UNIQUE(user_id, channel_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS videos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        channel_id INTEGER,
+        youtube_channel_id INTEGER,
+        platform TEXT DEFAULT 'tiktok',
+        video_url TEXT NOT NULL UNIQUE,
+        video_id TEXT UNIQUE,
+        tiktok_video_id TEXT,
+        video_title TEXT,
+        video_author TEXT,
+        video_published_at TIMESTAMP,
+        views INTEGER DEFAULT 0,
+        likes INTEGER DEFAULT 0,
+        comments INTEGER DEFAULT 0,
+        shares INTEGER DEFAULT 0,
+        favorites INTEGER DEFAULT 0,
+        earnings REAL DEFAULT 0,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id),
+        FOREIGN KEY (channel_id) REFERENCES channels(id),
+        FOREIGN KEY (youtube_channel_id) REFERENCES youtube_channels(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS withdrawal_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        amount REAL NOT NULL,
+        payment_method TEXT NOT NULL,
+        payment_details TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        processed_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS payment_methods (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        method_type TEXT NOT NULL,
+        details TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS referrals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        referrer_id INTEGER NOT NULL,
+        referred_id INTEGER NOT NULL,
+        earnings REAL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (referrer_id) REFERENCES users(user_id),
+        FOREIGN KEY (referred_id) REFERENCES users(user_id),
+        UNIQUE(referrer_id, referred_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tiktok_accounts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL UNIQUE,
+        username TEXT NOT NULL UNIQUE COLLATE NOCASE,
+        url TEXT NOT NULL,
+        verification_code TEXT,
+        is_verified INTEGER DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        verified_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS youtube_channels (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL UNIQUE,
+        channel_id TEXT NOT NULL UNIQUE COLLATE NOCASE,
+        channel_handle TEXT,
+        channel_name TEXT,
+        url TEXT NOT NULL,
+        verification_code TEXT,
+        is_verified INTEGER DEFAULT 0,
+        rate_per_1000_views REAL DEFAULT 50.0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        verified_at TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS crypto_payouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        video_id INTEGER NOT NULL,
+        amount_rub REAL NOT NULL,
+        amount_usdt REAL NOT NULL,
+        spend_id TEXT NOT NULL UNIQUE,
+        transfer_id TEXT,
+        status TEXT DEFAULT 'pending',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        paid_at TIMESTAMP,
+        admin_id INTEGER,
+        FOREIGN KEY (user_id) REFERENCES users(user_id),
+        FOREIGN KEY (video_id) REFERENCES videos(id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS media_keys (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        key_value TEXT NOT NULL UNIQUE,
+        status TEXT DEFAULT 'available',
+        is_free_promo INTEGER DEFAULT 0,
+        assigned_to INTEGER,
+        uploaded_by INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        assigned_at TIMESTAMP,
+        FOREIGN KEY (assigned_to) REFERENCES users(user_id),
+        FOREIGN KEY (uploaded_by) REFERENCES users(user_id)
+    )
+    """,
+)
+
+BASE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_users_balance ON users(balance)",
+    "CREATE INDEX IF NOT EXISTS idx_users_tier ON users(tier)",
+    "CREATE INDEX IF NOT EXISTS idx_users_referrer_id ON users(referrer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_users_created_at ON users(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_users_blocked_until ON users(blocked_until)",
+
+    "CREATE INDEX IF NOT EXISTS idx_videos_user_id ON videos(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_status ON videos(status)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_platform ON videos(platform)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_user_status ON videos(user_id, status)",
+    "CREATE INDEX IF NOT EXISTS idx_videos_platform_status ON videos(platform, status)",
+
+    "CREATE INDEX IF NOT EXISTS idx_yt_channels_user_id ON youtube_channels(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_yt_channels_channel_id ON youtube_channels(channel_id)",
+
+    "CREATE INDEX IF NOT EXISTS idx_crypto_payouts_user ON crypto_payouts(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_crypto_payouts_video ON crypto_payouts(video_id)",
+    "CREATE INDEX IF NOT EXISTS idx_crypto_payouts_status ON crypto_payouts(status)",
+    "CREATE INDEX IF NOT EXISTS idx_crypto_payouts_created_at ON crypto_payouts(created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_crypto_payouts_user_status ON crypto_payouts(user_id, status)",
+
+    "CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_user_id ON tiktok_accounts(user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_username ON tiktok_accounts(username)",
+
+    "CREATE INDEX IF NOT EXISTS idx_referrals_referrer_id ON referrals(referrer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_referrals_referred_id ON referrals(referred_id)",
+
+    "CREATE INDEX IF NOT EXISTS idx_media_keys_status ON media_keys(status)",
+    "CREATE INDEX IF NOT EXISTS idx_media_keys_assigned_to ON media_keys(assigned_to)",
+)
+
+ROLLUP_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        day TEXT NOT NULL,
+        platform TEXT NOT NULL,
+        status TEXT NOT NULL,
+        video_count INTEGER NOT NULL DEFAULT 0,
+        views INTEGER NOT NULL DEFAULT 0,
+        earnings REAL NOT NULL DEFAULT 0,
+        unpaid_views INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, platform, status)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_active_users (
+        day TEXT NOT NULL,
+        user_id INTEGER NOT NULL,
+        video_count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, user_id)
+    ) WITHOUT ROWID
+    """,
+)
+
+
+# === ТРИГГЕРЫ ===
+
+def _daily_stats_delta(row: str, sign: str) -> str:
+    """Прибавить (sign='') или вычесть (sign='-') видео row из daily_stats"""
+    cleanup = ""
+    if sign:
+        cleanup = f"""
+        DELETE FROM daily_stats
+        WHERE day = COALESCE(substr({row}.created_at, 1, 10), '') AND platform = COALESCE({row}.platform, '')
+          AND status = COALESCE({row}.status, '') AND video_count <= 0;"""
+    return f"""
+        INSERT INTO daily_stats (day, platform, status, video_count, views, earnings, unpaid_views)
+        SELECT COALESCE(substr({row}.created_at, 1, 10), ''),
+               COALESCE({row}.platform, ''),
+               COALESCE({row}.status, ''),
+               {sign}1,
+               {sign}COALESCE({row}.views, 0),
+               {sign}(CASE WHEN {row}.earnings > 0 THEN {row}.earnings ELSE 0 END),
+               {sign}(CASE WHEN {row}.earnings > 0 THEN 0 ELSE COALESCE({row}.views, 0) END)
+        WHERE 1
+        ON CONFLICT(day, platform, status) DO UPDATE SET
+            video_count = video_count + excluded.video_count,
+            views = views + excluded.views,
+            earnings = earnings + excluded.earnings,
+            unpaid_views = unpaid_views + excluded.unpaid_views;{cleanup}
+    """
+
+
+def _daily_active_delta(row: str, sign: str, condition: str = "1") -> str:
+    """Изменить счётчик видео пользователя row за его день в daily_active_users"""
+    return f"""
+        INSERT INTO daily_active_users (day, user_id, video_count)
+        SELECT COALESCE(substr({row}.created_at, 1, 10), ''), {row}.user_id, {sign}1
+        WHERE {condition}
+        ON CONFLICT(day, user_id) DO UPDATE SET video_count = video_count + excluded.video_count;
+        DELETE FROM daily_active_users
+        WHERE day = COALESCE(substr({row}.created_at, 1, 10), '') AND user_id = {row}.user_id AND video_count <= 0;
+    """
+
+
+_DAY_CHANGED = "NEW.user_id IS NOT OLD.user_id OR substr(NEW.created_at, 1, 10) IS NOT substr(OLD.created_at, 1, 10)"
+
+# Триггеры, поддерживающие дневные сводки admin-аналитики при любых изменениях videos
+DAILY_STATS_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_daily_stats_insert AFTER INSERT ON videos
+        BEGIN
+            {_daily_stats_delta('NEW', '')}
+            {_daily_active_delta('NEW', '')}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_daily_stats_update
+        AFTER UPDATE OF user_id, platform, status, views, earnings, created_at ON videos
+        BEGIN
+            {_daily_stats_delta('OLD', '-')}
+            {_daily_stats_delta('NEW', '')}
+            {_daily_active_delta('OLD', '-', _DAY_CHANGED)}
+            {_daily_active_delta('NEW', '', _DAY_CHANGED)}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_daily_stats_delete AFTER DELETE ON videos
+        BEGIN
+            {_daily_stats_delta('OLD', '-')}
+            {_daily_active_delta('OLD', '-')}
+        END""",
+)
+
+
+# Счётчик users.total_videos: поддерживается триггерами вместо ручного обновления
+USER_VIDEO_COUNT_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_videos_user_count_insert AFTER INSERT ON videos
+        BEGIN
+            UPDATE users SET total_videos = total_videos + 1 WHERE user_id = NEW.user_id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_videos_user_count_delete AFTER DELETE ON videos
+        BEGIN
+            UPDATE users SET total_videos = total_videos - 1 WHERE user_id = OLD.user_id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_videos_user_count_update AFTER UPDATE OF user_id ON videos
+        WHEN NEW.user_id IS NOT OLD.user_id
+        BEGIN
+            UPDATE users SET total_videos = total_videos - 1 WHERE user_id = OLD.user_id;
+            UPDATE users SET total_videos = total_videos + 1 WHERE user_id = NEW.user_id;
+        END""",
+)
+
+
+
+def _effective_earnings(row: str) -> str:
+    """Выплата за видео row: начисленная или по ставке платформы из payout_rates"""
+    return f"""CASE WHEN {row}.earnings > 0 THEN {row}.earnings
+                ELSE ({row}.views / 1000.0) * COALESCE(
+                    (SELECT rate_per_1000 FROM payout_rates WHERE platform = {row}.platform), 0
+                )
+           END"""
+
+
+# videos.effective_earnings: пересчитывается при изменении видео и ставок платформ
+EFFECTIVE_EARNINGS_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_effective_insert AFTER INSERT ON videos
+        BEGIN
+            UPDATE videos SET effective_earnings = COALESCE({_effective_earnings('NEW')}, 0)
+            WHERE id = NEW.id;
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_effective_update AFTER UPDATE OF views, earnings, platform ON videos
+        BEGIN
+            UPDATE videos SET effective_earnings = COALESCE({_effective_earnings('NEW')}, 0)
+            WHERE id = NEW.id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_payout_rates_insert AFTER INSERT ON payout_rates
+        BEGIN
+            UPDATE videos SET effective_earnings = COALESCE((views / 1000.0) * NEW.rate_per_1000, 0)
+            WHERE platform = NEW.platform AND COALESCE(earnings, 0) <= 0;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_payout_rates_update AFTER UPDATE OF rate_per_1000 ON payout_rates
+        BEGIN
+            UPDATE videos SET effective_earnings = COALESCE((views / 1000.0) * NEW.rate_per_1000, 0)
+            WHERE platform = NEW.platform AND COALESCE(earnings, 0) <= 0;
+        END""",
+)
+
+
+
+def _user_daily_delta(row: str, sign: str) -> str:
+    """Прибавить (sign='') или вычесть (sign='-') одобренное видео row из user_daily_stats"""
+    cleanup = ""
+    if sign:
+        cleanup = f"""
+        DELETE FROM user_daily_stats
+        WHERE day = COALESCE(substr({row}.created_at, 1, 10), '') AND platform = COALESCE({row}.platform, '')
+          AND user_id = {row}.user_id AND video_count <= 0;"""
+    return f"""
+        INSERT INTO user_daily_stats (day, platform, user_id, video_count, views, earnings, unpaid_views)
+        SELECT COALESCE(substr({row}.created_at, 1, 10), ''),
+               COALESCE({row}.platform, ''),
+               {row}.user_id,
+               {sign}1,
+               {sign}COALESCE({row}.views, 0),
+               {sign}COALESCE({row}.effective_earnings, 0),
+               {sign}(CASE WHEN {row}.earnings > 0 THEN 0 ELSE COALESCE({row}.views, 0) END)
+        WHERE {row}.status = 'approved'
+        ON CONFLICT(day, platform, user_id) DO UPDATE SET
+            video_count = video_count + excluded.video_count,
+            views = views + excluded.views,
+            earnings = earnings + excluded.earnings,
+            unpaid_views = unpaid_views + excluded.unpaid_views;{cleanup}
+    """
+
+
+_BUMP_LEADERBOARD = "UPDATE leaderboard_version SET version = version + 1 WHERE id = 1;"
+
+# Суммы одобренных видео по пользователю/платформе/дню для рейтингов (get_top_users*)
+USER_DAILY_STATS_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_user_daily_insert AFTER INSERT ON videos
+        WHEN NEW.status = 'approved'
+        BEGIN
+            {_user_daily_delta('NEW', '')}
+            {_BUMP_LEADERBOARD}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_user_daily_update
+        AFTER UPDATE OF user_id, platform, status, views, earnings, effective_earnings, created_at ON videos
+        WHEN OLD.status = 'approved' OR NEW.status = 'approved'
+        BEGIN
+            {_user_daily_delta('OLD', '-')}
+            {_user_daily_delta('NEW', '')}
+            {_BUMP_LEADERBOARD}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_user_daily_delete AFTER DELETE ON videos
+        WHEN OLD.status = 'approved'
+        BEGIN
+            {_user_daily_delta('OLD', '-')}
+            {_BUMP_LEADERBOARD}
+        END""",
+)
+
+
+
+def _user_counters_delta(row: str, sign: str) -> str:
+    """Прибавить (sign='+') или вычесть (sign='-') видео row из счётчиков его пользователя"""
+    return f"""
+        UPDATE users SET
+            total_videos = total_videos {sign} 1,
+            pending_videos = pending_videos {sign} ({row}.status = 'pending'),
+            approved_videos = approved_videos {sign} ({row}.status = 'approved'),
+            rejected_videos = rejected_videos {sign} ({row}.status = 'rejected'),
+            total_views = total_views {sign} COALESCE({row}.views, 0),
+            approved_earnings = approved_earnings {sign}
+                (CASE WHEN {row}.status = 'approved' THEN COALESCE({row}.effective_earnings, 0) ELSE 0 END)
+        WHERE user_id = {row}.user_id;
+    """
+
+
+# Счётчики видео пользователя (users.total_videos, *_videos, total_views, approved_earnings)
+USER_COUNTERS_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_user_counters_insert AFTER INSERT ON videos
+        BEGIN
+            {_user_counters_delta('NEW', '+')}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_user_counters_update
+        AFTER UPDATE OF user_id, status, views, effective_earnings ON videos
+        BEGIN
+            {_user_counters_delta('OLD', '-')}
+            {_user_counters_delta('NEW', '+')}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_videos_user_counters_delete AFTER DELETE ON videos
+        BEGIN
+            {_user_counters_delta('OLD', '-')}
+        END""",
+)
+
+# Реферальные счётчики реферера (users.referral_count, referral_earnings)
+REFERRAL_COUNTERS_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_referrals_counters_insert AFTER INSERT ON referrals
+        BEGIN
+            UPDATE users SET referral_count = referral_count + 1,
+                             referral_earnings = referral_earnings + COALESCE(NEW.earnings, 0)
+            WHERE user_id = NEW.referrer_id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_referrals_counters_update AFTER UPDATE OF referrer_id, earnings ON referrals
+        BEGIN
+            UPDATE users SET referral_count = referral_count - 1,
+                             referral_earnings = referral_earnings - COALESCE(OLD.earnings, 0)
+            WHERE user_id = OLD.referrer_id;
+            UPDATE users SET referral_count = referral_count + 1,
+                             referral_earnings = referral_earnings + COALESCE(NEW.earnings, 0)
+            WHERE user_id = NEW.referrer_id;
+        END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_referrals_counters_delete AFTER DELETE ON referrals
+        BEGIN
+            UPDATE users SET referral_count = referral_count - 1,
+                             referral_earnings = referral_earnings - COALESCE(OLD.earnings, 0)
+            WHERE user_id = OLD.referrer_id;
+        END""",
+)
+
+
+def _not_archiving(trigger: str) -> str:
+    """Добавить к триггеру условие: срабатывать, только если это не перенос в архив"""
+    head, body = trigger.split("BEGIN", 1)
+    head = head.rstrip()
+    condition = "(SELECT moving FROM archive_state WHERE id = 1) = 0"
+    head += f" AND {condition}" if " WHEN " in head else f" WHEN {condition}"
+    return f"{head}\n        BEGIN{body}"
+
+
+# Перенос видео в архив (core.archive) — не удаление: сводки и счётчики не меняются
+ARCHIVE_GUARDED_DELETE_TRIGGERS = tuple(
+    _not_archiving(trigger)
+    for trigger in DAILY_STATS_TRIGGERS + USER_DAILY_STATS_TRIGGERS + USER_COUNTERS_TRIGGERS
+    if "AFTER DELETE ON videos" in trigger
+)
+
+async def fill_daily_stats(db, source: str = "videos"):
+    """Пересчитать daily_stats и daily_active_users из source (videos или all_videos) на соединении db"""
+    await db.execute("DELETE FROM daily_stats")
+    await db.execute(
+        f"""INSERT INTO daily_stats (day, platform, status, video_count, views, earnings, unpaid_views)
+           SELECT COALESCE(substr(created_at, 1, 10), ''), COALESCE(platform, ''), COALESCE(status, ''),
+                  COUNT(*),
+                  SUM(COALESCE(views, 0)),
+                  SUM(CASE WHEN earnings > 0 THEN earnings ELSE 0 END),
+                  SUM(CASE WHEN earnings > 0 THEN 0 ELSE COALESCE(views, 0) END)
+           FROM {source}
+           GROUP BY 1, 2, 3"""
+    )
+    await db.execute("DELETE FROM daily_active_users")
+    await db.execute(
+        f"""INSERT INTO daily_active_users (day, user_id, video_count)
+           SELECT COALESCE(substr(created_at, 1, 10), ''), user_id, COUNT(*)
+           FROM {source}
+           GROUP BY 1, 2"""
+    )
+
+
+async def fill_user_daily_stats(db, source: str = "videos"):
+    """Пересчитать user_daily_stats из source (videos или all_videos) на соединении db"""
+    await db.execute("DELETE FROM user_daily_stats")
+    await db.execute(
+        f"""INSERT INTO user_daily_stats (day, platform, user_id, video_count, views, earnings, unpaid_views)
+           SELECT COALESCE(substr(created_at, 1, 10), ''), COALESCE(platform, ''), user_id,
+                  COUNT(*),
+                  SUM(COALESCE(views, 0)),
+                  SUM(effective_earnings),
+                  SUM(CASE WHEN earnings > 0 THEN 0 ELSE COALESCE(views, 0) END)
+           FROM {source}
+           WHERE status = 'approved'
+           GROUP BY 1, 2, 3"""
+    )
+    await db.execute(_BUMP_LEADERBOARD)
+
+
+# === ШАГИ МИГРАЦИЙ ===
+
+@migration(1, "Базовая схема")
+async def _base_schema(db: aiosqlite.Connection):
+    await _execute_all(db, BASE_TABLES)
+    # Колонки, которые раньше добавлялись через ALTER TABLE при каждом запуске
+    await _add_missing_columns(db, "users", (
+        ("last_key_issued_at", "TIMESTAMP"),
+        ("blocked_until", "TIMESTAMP"),
+        ("free_key_claimed_at", "TIMESTAMP"),
+    ))
+    await _add_missing_columns(db, "videos", (("tiktok_video_id", "TEXT"),))
+    await _add_missing_columns(db, "media_keys", (("is_free_promo", "INTEGER DEFAULT 0"),))
+    await _execute_all(db, BASE_INDEXES)
+
+
+@migration(2, "Покрывающий индекс videos для аналитики за период")
+async def _analytics_index(db: aiosqlite.Connection):
+    await db.execute(
+        """CREATE INDEX IF NOT EXISTS idx_videos_created_analytics
+           ON videos(created_at, platform, status, views, earnings, user_id)"""
+    )
+
+
+@migration(3, "Дневные сводки daily_stats / daily_active_users")
+async def _daily_stats(db: aiosqlite.Connection):
+    await _execute_all(db, ROLLUP_TABLES)
+    await _execute_all(db, DAILY_STATS_TRIGGERS)
+    await fill_daily_stats(db)
+
+
+@migration(4, "Счётчик users.total_videos и индексы keyset-пагинации")
+async def _keyset_pagination(db: aiosqlite.Connection):
+    await _execute_all(db, USER_VIDEO_COUNT_TRIGGERS)
+    # Раньше total_videos увеличивался вручную и только для TikTok — пересчитываем
+    await db.execute(
+        """UPDATE users SET total_videos = (
+               SELECT COUNT(*) FROM videos WHERE videos.user_id = users.user_id
+           )"""
+    )
+    await _execute_all(db, (
+        # (owner, created_at) + неявный rowid
+        "CREATE INDEX IF NOT EXISTS idx_videos_user_created ON videos(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_referrals_referrer_created ON referrals(referrer_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_user_created ON withdrawal_requests(user_id, created_at)",
+    ))
+
+
+@migration(5, "Индекс очереди свободных медиа-ключей")
+async def _media_keys_queue(db: aiosqlite.Connection):
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_media_keys_queue ON media_keys(status, is_free_promo, created_at)"
+    )
+
+
+
+@migration(6, "Журнал операций по балансу balance_ledger")
+async def _balance_ledger(db: aiosqlite.Connection):
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS balance_ledger (
+               id INTEGER PRIMARY KEY,
+               user_id INTEGER NOT NULL,
+               amount REAL NOT NULL,
+               balance_after REAL,
+               reason TEXT NOT NULL,
+               ref_type TEXT,
+               ref_id INTEGER,
+               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+               FOREIGN KEY (user_id) REFERENCES users(user_id)
+           )"""
+    )
+    # Покрывающий индекс для сверки (SUM(amount) GROUP BY user_id) и истории пользователя
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_balance_ledger_user ON balance_ledger(user_id, amount)"
+    )
+    # Текущие балансы становятся начальными записями журнала
+    await db.execute(
+        """INSERT INTO balance_ledger (user_id, amount, balance_after, reason)
+           SELECT user_id, balance, balance, 'opening'
+           FROM users
+           WHERE COALESCE(balance, 0) != 0
+             AND user_id NOT IN (SELECT user_id FROM balance_ledger)"""
+    )
+
+
+
+@migration(7, "Колонка videos.effective_earnings и покрывающий индекс выплат")
+async def _effective_earnings_column(db: aiosqlite.Connection):
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS payout_rates (
+               platform TEXT PRIMARY KEY,
+               rate_per_1000 REAL NOT NULL
+           )"""
+    )
+    await _add_missing_columns(db, "videos", (("effective_earnings", "REAL NOT NULL DEFAULT 0"),))
+    await _execute_all(db, EFFECTIVE_EARNINGS_TRIGGERS)
+    # Ставки из config записываются при запуске (Database.sync_payout_rates),
+    # их триггеры пересчитают видео без начислений
+    await db.execute(
+        f"UPDATE videos SET effective_earnings = COALESCE({_effective_earnings('videos')}, 0)"
+    )
+    # Топ пользователей за период: весь расчёт по индексу, без чтения строк videos
+    await db.execute(
+        """CREATE INDEX IF NOT EXISTS idx_videos_payout
+           ON videos(status, created_at, platform, user_id, views, effective_earnings, earnings)"""
+    )
+
+
+
+@migration(8, "Суммы по пользователям за день для рейтингов")
+async def _user_daily_stats(db: aiosqlite.Connection):
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS user_daily_stats (
+               day TEXT NOT NULL,
+               platform TEXT NOT NULL,
+               user_id INTEGER NOT NULL,
+               video_count INTEGER NOT NULL DEFAULT 0,
+               views INTEGER NOT NULL DEFAULT 0,
+               earnings REAL NOT NULL DEFAULT 0,
+               unpaid_views INTEGER NOT NULL DEFAULT 0,
+               PRIMARY KEY (day, platform, user_id)
+           ) WITHOUT ROWID"""
+    )
+    # Суммы отдельных пользователей за период (дополнение рейтинга неполными днями)
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_user_daily_stats_user ON user_daily_stats(user_id, day)"
+    )
+    # Версия данных рейтингов: меняется триггерами, сбрасывает top-K в памяти
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS leaderboard_version (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               version INTEGER NOT NULL
+           )"""
+    )
+    await db.execute("INSERT OR IGNORE INTO leaderboard_version (id, version) VALUES (1, 0)")
+    await _execute_all(db, USER_DAILY_STATS_TRIGGERS)
+
+    await fill_user_daily_stats(db)
+
+
+
+@migration(9, "Счётчики пользователя на триггерах (видео по статусам, просмотры, рефералы)")
+async def _user_counters(db: aiosqlite.Connection):
+    await _add_missing_columns(db, "users", (
+        ("pending_videos", "INTEGER NOT NULL DEFAULT 0"),
+        ("approved_videos", "INTEGER NOT NULL DEFAULT 0"),
+        ("rejected_videos", "INTEGER NOT NULL DEFAULT 0"),
+        ("approved_earnings", "REAL NOT NULL DEFAULT 0"),
+        ("referral_count", "INTEGER NOT NULL DEFAULT 0"),
+    ))
+    # total_videos теперь ведут общие триггеры счётчиков
+    for name in ("insert", "delete", "update"):
+        await db.execute(f"DROP TRIGGER IF EXISTS trg_videos_user_count_{name}")
+    await _execute_all(db, USER_COUNTERS_TRIGGERS)
+    await _execute_all(db, REFERRAL_COUNTERS_TRIGGERS)
+
+    # total_views раньше не обновлялся после добавления видео — пересчитываем всё
+    await db.execute(
+        """UPDATE users SET
+               (total_videos, pending_videos, approved_videos, rejected_videos,
+                total_views, approved_earnings) = (
+                   SELECT COUNT(*),
+                          COALESCE(SUM(status = 'pending'), 0),
+                          COALESCE(SUM(status = 'approved'), 0),
+                          COALESCE(SUM(status = 'rejected'), 0),
+                          COALESCE(SUM(views), 0),
+                          COALESCE(SUM(CASE WHEN status = 'approved' THEN effective_earnings ELSE 0 END), 0)
+                   FROM videos WHERE videos.user_id = users.user_id
+               ),
+               (referral_count, referral_earnings) = (
+                   SELECT COUNT(*), COALESCE(SUM(earnings), 0)
+                   FROM referrals WHERE referrals.referrer_id = users.user_id
+               )"""
+    )
+
+
+
+@migration(10, "Архивация видео: archive_state и триггеры удаления videos")
+async def _archive_state(db: aiosqlite.Connection):
+    await db.execute(
+        """CREATE TABLE IF NOT EXISTS archive_state (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               moving INTEGER NOT NULL DEFAULT 0,
+               archived_videos INTEGER NOT NULL DEFAULT 0,
+               last_archived_at TIMESTAMP
+           )"""
+    )
+    await db.execute("INSERT OR IGNORE INTO archive_state (id) VALUES (1)")
+    for name in ("daily_stats", "user_daily", "user_counters"):
+        await db.execute(f"DROP TRIGGER IF EXISTS trg_videos_{name}_delete")
+    await _execute_all(db, ARCHIVE_GUARDED_DELETE_TRIGGERS)
+
+
+
+@migration(11, "Индексы по результатам проверки планов запросов")
+async def _plan_indexes(db: aiosqlite.Connection):
+    # Индексы с тем же префиксом, заменяемые более широкими
+    for name in ("idx_media_keys_assigned_to", "idx_crypto_payouts_user"):
+        await db.execute(f"DROP INDEX IF EXISTS {name}")
+    await _execute_all(db, (
+        "CREATE INDEX IF NOT EXISTS idx_payment_methods_user ON payment_methods(user_id)",
+        # История баланса: порядок id внутри user_id — без сортировки
+        "CREATE INDEX IF NOT EXISTS idx_balance_ledger_user_id ON balance_ledger(user_id)",
+        "CREATE INDEX IF NOT EXISTS idx_media_keys_assigned ON media_keys(assigned_to, is_free_promo, assigned_at)",
+        "CREATE INDEX IF NOT EXISTS idx_media_keys_status_assigned ON media_keys(status, assigned_at)",
+        "CREATE INDEX IF NOT EXISTS idx_crypto_payouts_user_created ON crypto_payouts(user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_status_created ON withdrawal_requests(status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tiktok_accounts_verified ON tiktok_accounts(is_verified, verified_at)",
+        "CREATE INDEX IF NOT EXISTS idx_yt_channels_verified ON youtube_channels(is_verified, verified_at)",
+        # Частичный: размер зависит от числа получивших бесплатный ключ, а не всех пользователей
+        """CREATE INDEX IF NOT EXISTS idx_users_free_key_claimed ON users(free_key_claimed_at)
+           WHERE free_key_claimed_at IS NOT NULL""",
+    ))
+
+
+# === ПРИМЕНЕНИЕ ===
+
+async def _current_version(db: aiosqlite.Connection) -> int:
+    try:
+        async with db.execute("SELECT MAX(version) FROM schema_version") as cursor:
+            row = await cursor.fetchone()
+    except aiosqlite.OperationalError:
+        # Таблицы ещё нет — база до появления миграций или новая
+        return 0
+    return row[0] or 0
+
+
+async def migrate(db_path: str) -> int:
+    """
+    Применить недостающие миграции; возвращает текущую версию схемы
+
+    Каждый шаг выполняется в BEGIN IMMEDIATE-транзакции вместе с записью в
+    schema_version, поэтому при ошибке или параллельном запуске шаг не
+    применится наполовину и не применится дважды.
+    """
+    latest = MIGRATIONS[-1][0]
+    async with aiosqlite.connect(db_path, timeout=30.0, isolation_level=None) as db:
+        current = await _current_version(db)
+        if current >= latest:
+            return current
+
+        # Действует только для новой (пустой) БД: существующую переводит VACUUM
+        # в scripts/optimize_database.py. Нужен для incremental_vacuum (core.maintenance)
+        await db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL сохраняется в файле БД — достаточно включить один раз
+        await db.execute("PRAGMA journal_mode=WAL")
+        await db.execute("PRAGMA busy_timeout=30000")
+        await db.execute(
+            """CREATE TABLE IF NOT EXISTS schema_version (
+                   version INTEGER PRIMARY KEY,
+                   description TEXT NOT NULL,
+                   applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+               )"""
+        )
+
+        for version, description, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                # Шаг мог применить другой процесс, пока ждали блокировку
+                if await _current_version(db) >= version:
+                    await db.execute("ROLLBACK")
+                    continue
+                await apply(db)
+                await db.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                    (version, description)
+                )
+                await db.execute("COMMIT")
+            except BaseException:
+                await db.execute("ROLLBACK")
+                logger.error(f"❌ Миграция {version} ({description}) не применена")
+                raise
+            logger.info(f"✅ Миграция {version}: {description}")
+            current = version
+
+    return current
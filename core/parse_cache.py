@@ -0,0 +1,251 @@
+"""
+Кэш результатов парсинга TikTok и YouTube
+
+Пользователи повторяют отправку видео и жмут «✅ Поменял описание» по
+нескольку раз подряд — без кэша каждое нажатие заново загружает страницу
+(HTTP, Playwright или yt-dlp). Результат кэшируется по каноническому ID
+платформы (ID видео, handle канала, username) с временем жизни по типу:
+био и описание канала (в них пользователь вписывает код верификации) —
+секунды, метаданные видео — минуты.
+
+- Память: LRU с ограничением размера (core.cache.TTLCache).
+- Диск (необязательно, PARSE_CACHE_PATH): SQLite-файл, чтобы результаты
+  переживали перезапуск бота.
+- Отрицательное кэширование: результат, помеченный парсером not_found
+  (видео удалено или не существует), хранится negative_ttl секунд.
+  Временные ошибки (таймауты, сетевые сбои) не кэшируются.
+- Одновременные запросы одного ключа ждут одну загрузку.
+- fresh=True (запрос от администратора) обходит кэш и
+  обновляет запись.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core import config
+from core.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Типы результатов
+TIKTOK_VIDEO = "tiktok_video"
+TIKTOK_BIO = "tiktok_bio"
+YOUTUBE_VIDEO = "youtube_video"
+YOUTUBE_CHANNEL = "youtube_channel"
+
+# Удалять просроченные записи с диска раз в столько записей
+_PURGE_EVERY = 200
+
+
+def _encode(value: Any) -> str:
+    def default(obj):
+        if isinstance(obj, datetime):
+            return {"$datetime": obj.isoformat()}
+        raise TypeError(f"{type(obj).__name__} не сериализуется")
+    return json.dumps(value, default=default, ensure_ascii=False)
+
+
+def _decode(text: str) -> Any:
+    def object_hook(obj):
+        if len(obj) == 1 and "$datetime" in obj:
+            return datetime.fromisoformat(obj["$datetime"])
+        return obj
+    return json.loads(text, object_hook=object_hook)
+
+
+def _copy(value: Any) -> Any:
+    return dict(value) if isinstance(value, dict) else value
+
+
+def _classify(result: Any) -> Optional[str]:
+    """'ok' — успешный результат, 'negative' — окончательная ошибка, None — не кэшировать"""
+    if isinstance(result, dict):
+        if result.get("not_found"):
+            return "negative"
+        return "ok" if result.get("success", True) else None
+    return "ok" if result else None
+
+
+class _DiskTier:
+    """Записи кэша в SQLite-файле (вызывается в отдельном потоке)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS parse_cache ("
+                " kind TEXT NOT NULL, key TEXT NOT NULL, expires_at REAL NOT NULL, value TEXT NOT NULL,"
+                " PRIMARY KEY (kind, key)) WITHOUT ROWID"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, kind: str, key: str) -> Tuple[Any, float]:
+        """(значение, оставшееся время жизни) или (MISSING, 0)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT expires_at, value FROM parse_cache WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+        if row is None or row[0] <= time.time():
+            return MISSING, 0.0
+        return _decode(row[1]), row[0] - time.time()
+
+    def set(self, kind: str, key: str, value: Any, ttl: float):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO parse_cache (kind, key, expires_at, value) VALUES (?, ?, ?, ?)",
+                (kind, key, time.time() + ttl, _encode(value)),
+            )
+            self._writes += 1
+            if self._writes % _PURGE_EVERY == 0:
+                conn.execute("DELETE FROM parse_cache WHERE expires_at <= ?", (time.time(),))
+
+
+class ParseCache:
+    """
+    Кэш результатов парсинга с TTL по типу
+
+    Args:
+        ttls: Время жизни успешного результата по типу (в секундах)
+        negative_ttl: Время жизни окончательной ошибки (not_found)
+        maxsize: Записей в памяти
+        disk_path: SQLite-файл дискового уровня (None — только память)
+    """
+
+    def __init__(
+        self,
+        ttls: Dict[str, float],
+        negative_ttl: float = 60.0,
+        maxsize: int = 2048,
+        disk_path: Optional[str] = None,
+    ):
+        self.ttls = ttls
+        self.negative_ttl = negative_ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=max(ttls.values(), default=60.0))
+        self._disk = _DiskTier(disk_path) if disk_path else None
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.coalesced = 0
+        self.bypassed = 0
+
+    async def _lookup(self, kind: str, key: str) -> Any:
+        value = self._memory.get((kind, key))
+        if value is MISSING and self._disk is not None:
+            try:
+                value, remaining = await asyncio.to_thread(self._disk.get, kind, key)
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Дисковый кэш парсинга недоступен: {e}")
+                return MISSING
+            if value is not MISSING:
+                self.disk_hits += 1
+                self._memory.set((kind, key), value, ttl=remaining)
+        return value
+
+    async def _store(self, kind: str, key: str, value: Any):
+        verdict = _classify(value)
+        if verdict is None:
+            return
+        ttl = self.negative_ttl if verdict == "negative" else self.ttls.get(kind, self._memory.ttl)
+        if ttl <= 0:
+            return
+        self._memory.set((kind, key), value, ttl=ttl)
+        if self._disk is not None:
+            try:
+                await asyncio.to_thread(self._disk.set, kind, key, value, ttl)
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.warning(f"⚠️ Не удалось записать дисковый кэш парсинга: {e}")
+
+    async def get_or_fetch(
+        self,
+        kind: str,
+        key: Optional[str],
+        fetch: Callable[[], Awaitable[Any]],
+        fresh: bool = False,
+    ) -> Any:
+        """
+        Результат из кэша или fetch() с сохранением в кэш
+
+        key — канонический ID (регистр приводит вызывающий код: ID видео YouTube
+        регистрозависимы); без него (нераспознанный URL) кэш не используется.
+        fresh=True — всегда вызвать fetch() и обновить запись. Словари
+        отдаются копиями: изменения у вызывающего не попадают в кэш.
+        """
+        if not key:
+            return await fetch()
+
+        if fresh:
+            self.bypassed += 1
+        else:
+            value = await self._lookup(kind, key)
+            if value is not MISSING:
+                if _classify(value) == "negative":
+                    self.negative_hits += 1
+                logger.info(f"📦 Кэш парсинга: {kind} {key}")
+                return _copy(value)
+
+        task = None if fresh else self._inflight.get((kind, key))
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_store(kind, key, fetch))
+            self._inflight[(kind, key)] = task
+            task.add_done_callback(lambda done: self._fetched(kind, key, done))
+        else:
+            self.coalesced += 1
+        # Загрузка — отдельная задача: отмена одного вызывающего не прерывает её для остальных
+        return _copy(await asyncio.shield(task))
+
+    async def _fetch_and_store(self, kind: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value = await fetch()
+        await self._store(kind, key, _copy(value))
+        return value
+
+    def _fetched(self, kind: str, key: str, task: asyncio.Task):
+        if self._inflight.get((kind, key)) is task:
+            del self._inflight[(kind, key)]
+        # Если все ожидающие отменены, ошибку некому забрать — не логировать «never retrieved»
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._memory.stats(),
+            "ttls": self.ttls,
+            "negative_ttl": self.negative_ttl,
+            "disk": self._disk.path if self._disk else None,
+            "disk_hits": self.disk_hits,
+            "negative_hits": self.negative_hits,
+            "coalesced": self.coalesced,
+            "bypassed": self.bypassed,
+        }
+
+
+_cache: Optional[ParseCache] = None
+
+
+def get_parse_cache() -> ParseCache:
+    """Получить общий кэш результатов парсинга (создаётся при первом обращении)"""
+    global _cache
+    if _cache is None:
+        _cache = ParseCache(
+            ttls={
+                TIKTOK_BIO: config.PARSE_CACHE_TTL_BIO,
+                TIKTOK_VIDEO: config.PARSE_CACHE_TTL_VIDEO,
+                YOUTUBE_VIDEO: config.PARSE_CACHE_TTL_VIDEO,
+                # Канал проверяется по коду в описании — как био, короткий TTL
+                YOUTUBE_CHANNEL: config.PARSE_CACHE_TTL_BIO,
+            },
+            negative_ttl=config.PARSE_CACHE_NEGATIVE_TTL,
+            maxsize=config.PARSE_CACHE_SIZE,
+            disk_path=config.PARSE_CACHE_PATH or None,
+        )
+    return _cache
@@ -0,0 +1,180 @@
+"""
+Read-only реплика БД для тяжёлой admin-аналитики
+
+Снимок основного файла делается через sqlite3 backup API в фоновом потоке во
+временный файл, который затем атомарно подменяет файл реплики. Агрегатные
+запросы admin-панели читают снимок и не держат долгих транзакций чтения на
+основной БД, поэтому не мешают записям бота и чекпойнтам WAL.
+
+Снимок используется, пока он не старше max_staleness; устаревший снимок
+обновляется перед чтением. Если обновить его не удалось, Database читает из
+основной БД.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiosqlite
+
+from core.archive import attach_archive
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsReplica:
+    """
+    Периодически обновляемый снимок файла БД
+
+    Args:
+        db_path: Путь к основной базе данных
+        replica_path: Путь к файлу снимка
+        max_staleness: Максимальный возраст снимка для чтения (в секундах)
+        refresh_interval: Интервал фонового обновления (в секундах)
+        timeout: Таймаут ожидания блокировки основной БД (в секундах)
+        archive_path: Файл архива видео, подключаемый к снимку только на чтение
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        replica_path: str,
+        max_staleness: float = 300.0,
+        refresh_interval: float = 120.0,
+        timeout: float = 30.0,
+        archive_path: Optional[str] = None,
+    ):
+        self.db_path = db_path
+        self.replica_path = replica_path
+        self.max_staleness = max_staleness
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self.archive_path = archive_path
+
+        self._lock: Optional[asyncio.Lock] = None
+        self._refreshed_at: Optional[float] = None
+
+        self.refreshes = 0
+        self.failures = 0
+        self.last_duration = 0.0
+
+    def _copy(self):
+        """Снять копию основной БД (выполняется в отдельном потоке)"""
+        tmp_path = f"{self.replica_path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+        source = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=self.timeout)
+        try:
+            target = sqlite3.connect(tmp_path)
+            try:
+                # Копия за один шаг — согласованный снимок в одной короткой транзакции
+                # чтения; пошаговая копия перезапускалась бы после каждой записи бота
+                source.backup(target)
+                # Снимок открывается только на чтение — WAL ему не нужен
+                target.execute("PRAGMA journal_mode=DELETE")
+            finally:
+                target.close()
+        finally:
+            source.close()
+
+        # Открытые соединения дочитают старый снимок, новые откроют свежий
+        os.replace(tmp_path, self.replica_path)
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def age(self) -> Optional[float]:
+        """Возраст текущего снимка в секундах (None — снимка ещё нет)"""
+        if self._refreshed_at is None:
+            return None
+        return time.monotonic() - self._refreshed_at
+
+    def is_fresh(self) -> bool:
+        age = self.age()
+        return age is not None and age <= self.max_staleness
+
+    async def refresh(self) -> bool:
+        """Обновить снимок; True — если обновление прошло успешно"""
+        lock = self._get_lock()
+        started_wait = time.monotonic()
+        async with lock:
+            # Пока ждали блокировку, снимок мог обновить другой вызов
+            if self._refreshed_at is not None and self._refreshed_at >= started_wait:
+                return True
+
+            started = time.monotonic()
+            try:
+                await asyncio.to_thread(self._copy)
+            except Exception as e:
+                self.failures += 1
+                logger.error(f"❌ Не удалось обновить реплику аналитики: {e}")
+                return False
+
+            self._refreshed_at = started
+            self.refreshes += 1
+            self.last_duration = time.monotonic() - started
+            logger.debug(f"Analytics replica refreshed in {self.last_duration:.3f}s")
+            return True
+
+    async def ready(self) -> bool:
+        """Есть ли снимок не старше max_staleness (устаревший обновляется)"""
+        if self.is_fresh():
+            return True
+        return await self.refresh() and self.is_fresh()
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Соединение только для чтения к текущему снимку"""
+        # Файл снимка не меняется на месте (только подменяется) — immutable
+        # отключает блокировки и проверки изменений
+        conn = aiosqlite.connect(f"file:{self.replica_path}?mode=ro&immutable=1", uri=True)
+        conn.daemon = True
+        await conn
+        try:
+            # Архив не входит в снимок — подключается живой файл (см. all_videos)
+            await attach_archive(conn, self.archive_path, readonly=True)
+            yield conn
+        finally:
+            await conn.close()
+
+    async def run_periodic(self):
+        """Фоновое обновление снимка каждые refresh_interval секунд"""
+        logger.info(f"✓ Реплика аналитики: {self.replica_path} (обновление каждые {self.refresh_interval:.0f} сек)")
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        age = self.age()
+        return {
+            "replica_path": self.replica_path,
+            "age_seconds": round(age, 3) if age is not None else None,
+            "max_staleness": self.max_staleness,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_refresh_seconds": round(self.last_duration, 3),
+        }
+
+
+# Общие реплики по абсолютному пути к основному файлу БД
+_replicas: Dict[str, AnalyticsReplica] = {}
+
+
+def get_replica(db_path: str, replica_path: str, **kwargs) -> AnalyticsReplica:
+    """
+    Получить общую реплику для файла БД (создаётся при первом обращении)
+
+    Параметры kwargs передаются в AnalyticsReplica и учитываются только при создании.
+    """
+    key = os.path.abspath(db_path)
+    replica = _replicas.get(key)
+    if replica is None:
+        replica = AnalyticsReplica(db_path, replica_path, **kwargs)
+        _replicas[key] = replica
+    return replica
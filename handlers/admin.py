@@ -327,7 +327,10 @@ async def approve_video(callback: CallbackQuery):
     await db.update_video_status(video_id, "approved")
     
     # Начисляем на баланс пользователя
-    await db.update_user_balance(video['user_id'], payout_amount, operation='add')
+    await db.update_user_balance(
+        video['user_id'], payout_amount, operation='add',
+        reason='video_payout', ref_type='video', ref_id=video_id
+    )
     
     # Начисляем реферальные бонусы (10% от выплаты)
     referrer = await db.get_user(video['user_id'])
@@ -1,6 +1,7 @@
 """
 Админ-панель с расширенной аналитикой и управлением
 """
+import io
 import logging
 from datetime import datetime, timedelta
 from aiogram import Router, F
@@ -289,8 +290,6 @@ async def receive_media_keys(message: Message, state: FSMContext):
         await message.answer("❌ У вас нет прав!", parse_mode="HTML")
         return
 
-    keys: list[str] = []
-
     if message.document:
         document = message.document
         if not document.file_name.endswith('.txt'):
@@ -299,10 +298,10 @@ async def receive_media_keys(message: Message, state: FSMContext):
             )
             return
         file = await message.bot.download(document)
-        content = file.read().decode('utf-8')
-        keys = content.splitlines()
+        # Файл разбирается построчно, без декодирования целиком в память
+        lines = io.TextIOWrapper(file, encoding='utf-8-sig', errors='replace')
     elif message.text:
-        keys = message.text.splitlines()
+        lines = message.text.splitlines()
     else:
         await message.answer(
             "❌ Не удалось прочитать ключи. Отправьте текст или .txt файл.",
@@ -310,11 +309,15 @@ async def receive_media_keys(message: Message, state: FSMContext):
         )
         return
 
-    inserted = await db.add_media_keys(keys, uploaded_by=message.from_user.id)
+    result = await db.import_media_keys(lines, uploaded_by=message.from_user.id)
     await state.clear()
 
+    text = f"✅ Загружено ключей: <b>{result['inserted']}</b>"
+    if result['duplicates']:
+        text += f"\n♻️ Пропущено дубликатов: <b>{result['duplicates']}</b>"
+
     await message.answer(
-        f"✅ Загружено ключей: <b>{inserted}</b>",
+        text,
         reply_markup=admin_media_keys_keyboard(),
         parse_mode="HTML"
     )
@@ -432,7 +435,7 @@ async def reset_balance(callback: CallbackQuery):
     old_balance = user.get('balance', 0) if user else 0
     
     # Обнуляем баланс
-    await db.update_user_balance(user_id, 0, operation='set')
+    await db.update_user_balance(user_id, 0, operation='set', reason='admin_reset')
     
     await callback.answer(f"✅ Баланс обнулен! Было: {old_balance:.2f} ₽", show_alert=True)
     await callback.message.edit_text(
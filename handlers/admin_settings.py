@@ -242,7 +242,10 @@ async def process_youtube_rate(message: Message, state: FSMContext):
             await message.answer(updated_admin_text, parse_mode="HTML")
         
         # Начисляем на баланс пользователя
-        await db.update_user_balance(user_id, amount, operation='add')
+        await db.update_user_balance(
+            user_id, amount, operation='add',
+            reason='video_payout', ref_type='video', ref_id=video_id
+        )
         
         # Начисляем реферальные бонусы (10% от выплаты)
         if user and user.get('referrer_id'):
@@ -111,7 +111,7 @@ async def process_balance_withdrawal(callback: CallbackQuery):
     
     if result['success']:
         # Списываем с баланса
-        await db.update_user_balance(callback.from_user.id, balance, operation='subtract')
+        await db.update_user_balance(callback.from_user.id, balance, operation='subtract', reason='withdrawal')
         
         await callback.message.edit_text(
             f"✅ <b>Мгновенный вывод выполнен!</b>\n\n"
@@ -248,7 +248,10 @@ async def approve_payout_callback(callback: CallbackQuery):
         status='paid',
         admin_id=callback.from_user.id
     )
-    await db.update_user_balance(payout['user_id'], payout['amount_rub'], operation='add')
+    await db.update_user_balance(
+        payout['user_id'], payout['amount_rub'], operation='add',
+        reason='crypto_payout', ref_type='crypto_payout', ref_id=payout_id
+    )
     await db.update_user_stats_withdrawal(payout['user_id'], payout['amount_rub'])
 
     updated_user = await db.get_user(payout['user_id'])
@@ -59,7 +59,7 @@ async def show_referral_info(message: Message):
 async def show_referral_stats(callback: CallbackQuery):
     """Показать статистику рефералов"""
     stats = await db.get_referral_stats(callback.from_user.id)
-    referrals = await db.get_referrals(callback.from_user.id)
+    referrals = (await db.get_referrals_page(callback.from_user.id, limit=10))['items']
     
     stats_text = (
         f"📊 <b>Статистика рефералов</b>\n\n"
@@ -70,15 +70,15 @@ async def show_referral_stats(callback: CallbackQuery):
     
     if referrals:
         stats_text += "<b>Ваши рефералы:</b>\n\n"
-        for ref in referrals[:10]:  # Показываем первых 10
+        for ref in referrals:  # Показываем последних 10
             username = f"@{ref['username']}" if ref['username'] else ref['full_name']
             stats_text += (
                 f"👤 {username}\n"
                 f"   💰 Заработано с реферала: {format_currency(ref['earnings'])}\n\n"
             )
         
-        if len(referrals) > 10:
-            stats_text += f"... и еще {len(referrals) - 10} рефералов"
+        if stats['total_referrals'] > 10:
+            stats_text += f"... и еще {stats['total_referrals'] - 10} рефералов"
     else:
         stats_text += "У вас пока нет рефералов."
     
@@ -89,17 +89,17 @@ async def show_referral_stats(callback: CallbackQuery):
 @router.callback_query(F.data == "referral_history")
 async def show_referral_history(callback: CallbackQuery):
     """Показать историю реферальных начислений"""
-    referrals = await db.get_referrals(callback.from_user.id)
+    stats = await db.get_referral_stats(callback.from_user.id)
+    referrals = (await db.get_referrals_page(callback.from_user.id, limit=20))['items']
     
     history_text = f"📜 <b>История реферальных начислений</b>\n\n"
     
     if not referrals:
         history_text += "История пуста."
     else:
-        total_earnings = sum(ref['earnings'] for ref in referrals)
-        history_text += f"💰 <b>Всего заработано:</b> {format_currency(total_earnings)}\n\n"
+        history_text += f"💰 <b>Всего заработано:</b> {format_currency(stats['total_earnings'])}\n\n"
         
-        for ref in referrals[:20]:  # Показываем последние 20
+        for ref in referrals:  # Показываем последние 20
             username = f"@{ref['username']}" if ref['username'] else ref['full_name']
             history_text += (
                 f"━━━━━━━━━━━━━━━━━━\n"
@@ -107,8 +107,8 @@ async def show_referral_history(callback: CallbackQuery):
                 f"💰 Заработано: {format_currency(ref['earnings'])}\n"
             )
         
-        if len(referrals) > 20:
-            history_text += f"\n... и еще {len(referrals) - 20} записей"
+        if stats['total_referrals'] > 20:
+            history_text += f"\n... и еще {stats['total_referrals'] - 20} записей"
     
     await callback.message.edit_text(history_text, reply_markup=referral_keyboard(""), parse_mode="HTML")
     await callback.answer()
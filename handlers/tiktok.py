@@ -13,6 +13,10 @@ import asyncio
 from core.database import Database
 from core.keyboards import cancel_keyboard, tiktok_verification_keyboard
 from core import config
+from core.browser_pool import get_browser_pool
+from core.parse_cache import TIKTOK_BIO, get_parse_cache
+from parsers.tiktok_extractor import extract_profile_bio
+from parsers.tiktok_parser import fetch_tiktok_page
 
 logger = logging.getLogger(__name__)
 
@@ -75,7 +79,18 @@ def extract_tiktok_username(url: str) -> str:
     return None
 
 
-async def get_tiktok_profile_bio(username: str) -> str:
+async def get_tiktok_profile_bio(username: str, fresh: bool = False) -> str:
+    """
+    Получить био профиля TikTok с коротким кэшем по username (см. core.parse_cache)
+    
+    fresh=True — кэш не используется, запись обновляется (запрос администратора).
+    """
+    return await get_parse_cache().get_or_fetch(
+        TIKTOK_BIO, username.lower(), lambda: _fetch_tiktok_profile_bio(username), fresh=fresh
+    )
+
+
+async def _fetch_tiktok_profile_bio(username: str) -> str:
     """
     Получить био профиля TikTok используя HTTP запрос (быстро) или Playwright (резерв)
     Автоматически парсит страницу
@@ -85,83 +100,19 @@ async def get_tiktok_profile_bio(username: str) -> str:
     
     # Метод 1: Пробуем HTTP запрос (быстро)
     try:
-        import aiohttp
-        from bs4 import BeautifulSoup
-        import json
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
-        }
-        
         logger.info(f"📡 HTTP запрос к {url}")
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=15)) as response:
-                if response.status == 200:
-                    html = await response.text()
-                    soup = BeautifulSoup(html, 'html.parser')
-                    logger.info(f"✅ HTML загружен, размер: {len(html)} символов")
-                    
-                    # Ищем данные в script тегах с SIGI_STATE
-                    for script in soup.find_all('script', {'id': 'SIGI_STATE'}):
-                        script_text = script.string or ''
-                        logger.info(f"🔎 Найден SIGI_STATE script, размер: {len(script_text)}")
-                        try:
-                            data = json.loads(script_text)
-                            logger.info(f"📦 JSON распарсен, ключи: {list(data.keys())}")
-                            
-                            # Ищем UserModule
-                            if 'UserModule' in data:
-                                user_module = data['UserModule']
-                                logger.info(f"👤 UserModule найден, ключи: {list(user_module.keys())}")
-                                
-                                # Ищем users
-                                if 'users' in user_module:
-                                    for user_id, user_data in user_module['users'].items():
-                                        logger.info(f"🆔 Пользователь {user_id}, ключи: {list(user_data.keys())}")
-                                        
-                                        # Проверяем все возможные поля с био
-                                        bio_fields = ['signature', 'desc', 'bioLink', 'bio']
-                                        for field in bio_fields:
-                                            if field in user_data and user_data[field]:
-                                                bio = user_data[field]
-                                                logger.info(f"✅ Bio найдено в поле '{field}': {bio}")
-                                                return bio
-                        except Exception as e:
-                            logger.error(f"❌ Ошибка парсинга SIGI_STATE: {e}")
-                    
-                    # Ищем данные в обычных script тегах
-                    for script in soup.find_all('script'):
-                        script_text = script.string or ''
-                        if 'signature' in script_text or 'bioLink' in script_text:
-                            logger.info(f"🔎 Найден script с 'signature', размер: {len(script_text)}")
-                            try:
-                                # Ищем все JSON объекты в script
-                                json_matches = re.findall(r'\{[^{}]*"signature"[^{}]*\}', script_text)
-                                for json_str in json_matches:
-                                    try:
-                                        data = json.loads(json_str)
-                                        bio = data.get('signature', '')
-                                        if bio:
-                                            logger.info(f"✅ Bio найдено в script: {bio[:50]}")
-                                            return bio
-                                    except:
-                                        continue
-                            except Exception as e:
-                                logger.debug(f"⚠️ Не удалось распарсить script: {e}")
-                    
-                    # Также пробуем найти в meta тегах
-                    meta_desc = soup.find('meta', {'name': 'description'})
-                    if meta_desc and meta_desc.get('content'):
-                        content = meta_desc.get('content', '')
-                        logger.info(f"📝 Meta description найден: {content[:100]}")
-                        # В description часто есть био после имени пользователя
-                        if content and len(content) > 10:
-                            logger.info(f"✅ Используем meta description как bio")
-                            return content
-                    
-                    logger.warning(f"⚠️ Bio не найдено в HTTP методе")
+        status, page = await fetch_tiktok_page(url)
+        if status == 200:
+            logger.info(f"✅ HTML загружен, размер: {len(page)} байт")
+            
+            # JSON гидратации ищется в сырых байтах, без построения DOM
+            extracted = extract_profile_bio(page)
+            if extracted:
+                source, bio = extracted
+                logger.info(f"✅ Bio найдено ({source}): {bio[:50]}")
+                return bio
+            
+            logger.warning(f"⚠️ Bio не найдено в HTTP методе")
         
     except Exception as e:
         logger.error(f"❌ HTTP метод провалился: {e}")
@@ -169,37 +120,10 @@ async def get_tiktok_profile_bio(username: str) -> str:
     # Метод 2: Используем Playwright (медленнее, но надежнее)
     logger.info("🎭 Пробуем Playwright метод")
     try:
-        from playwright.async_api import async_playwright
         import asyncio
         
-        async with async_playwright() as p:
-            # Запускаем headless браузер
-            logger.info("🌐 Запускаем браузер Chromium")
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-dev-shm-usage',
-                    '--disable-web-security'
-                ]
-            )
-            
-            # Создаем контекст с настройками
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                locale='ru-RU',
-                timezone_id='Europe/Moscow',
-                extra_http_headers={
-                    'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                }
-            )
-            
-            page = await context.new_page()
-            
+        # Страница из общего пула: браузер уже запущен, контекст прогрет
+        async with get_browser_pool().page() as page:
             try:
                 # Переходим на страницу профиля с увеличенным таймаутом и другой стратегией
                 logger.info(f"🔗 Переход на {url}")
@@ -325,8 +249,6 @@ async def get_tiktok_profile_bio(username: str) -> str:
                     except Exception as e:
                         logger.error(f"❌ Ошибка парсинга HTML: {e}")
                 
-                await browser.close()
-                
                 if bio_text:
                     logger.info(f"✅ [Playwright] @{username} bio: {bio_text[:100]}")
                 else:
@@ -335,7 +257,6 @@ async def get_tiktok_profile_bio(username: str) -> str:
                 return bio_text
                 
             except Exception as e:
-                await browser.close()
                 logger.error(f"❌ Ошибка при парсинге страницы: {e}")
                 return ""
                 
@@ -593,7 +514,8 @@ async def confirm_bio_button(callback: CallbackQuery, state: FSMContext):
         except:
             pass
         
-        bio = await get_tiktok_profile_bio(username)
+        # Запросы администраторов всегда парсятся заново, минуя кэш
+        bio = await get_tiktok_profile_bio(username, fresh=callback.from_user.id in config.ADMIN_IDS)
         
         # Шаг 4: Проверка кода (анимация 2 секунды)
         for i in range(4):
@@ -195,7 +195,10 @@ async def submit_video_url(message: Message, state: FSMContext):
         
         # Шаг 2-4: Валидация видео
         await update_progress_message(parsing_msg, "Проверка видео...", steps, 2, 4)
-        validation = await validate_tiktok_video(video_url, tiktok['username'])
+        # Запросы администраторов всегда парсятся заново, минуя кэш
+        validation = await validate_tiktok_video(
+            video_url, tiktok['username'], fresh=message.from_user.id in config.ADMIN_IDS
+        )
         
         await update_progress_message(parsing_msg, "Проверка видео...", steps, 3, 4)
         await asyncio.sleep(0.3)
@@ -259,8 +262,7 @@ async def submit_video_url(message: Message, state: FSMContext):
             await state.clear()
             return
         
-        # Обновляем статистику пользователя
-        await db.update_user_stats(message.from_user.id, videos=1)
+        # Счётчик total_videos обновляется триггером при добавлении видео
         
         # Успешно добавлено!
         published_str = video_data['published_at'].strftime('%d.%m.%Y %H:%M') if video_data['published_at'] else 'неизвестно'
@@ -321,14 +323,9 @@ async def show_history(message: Message):
 
 async def show_history_page(message: Message, page: int = 1):
     """Показать страницу истории"""
-    items_per_page = 5
-    offset = (page - 1) * items_per_page
-    
-    videos = await db.get_user_videos(message.from_user.id, limit=items_per_page, offset=offset)
-    total_videos = await db.get_video_count(message.from_user.id)
-    total_pages = calculate_pages(total_videos, items_per_page)
+    page_text = await render_history_page(message.from_user.id, page)
     
-    if not videos:
+    if page_text is None:
         await message.answer(
             "📭 <b>История заявок пуста</b>\n\n"
             "У вас пока нет поданных роликов.",
@@ -336,49 +333,36 @@ async def show_history_page(message: Message, page: int = 1):
         )
         return
     
-    history_text = f"📜 <b>История заявок</b>\n\n"
-    
-    for video in videos:
-        status_emoji = get_status_emoji(video['status'])
-        status_text = get_status_text(video['status'])
-        created_at = format_timestamp(video['created_at'])
-        
-        # Показываем TikTok автора вместо канала
-        author_display = f"@{video['video_author']}" if video.get('video_author') else video.get('channel_name', 'TikTok')
-        
-        history_text += (
-            f"━━━━━━━━━━━━━━━━━━\n"
-            f"🆔 ID: <code>{video['id']}</code>\n"
-            f"🎵 Автор: <code>{author_display}</code>\n"
-            f"🔗 Ссылка: {video['video_url'][:50]}...\n"
-            f"📊 Статистика:\n"
-            f"  👁 Просмотры: {video['views']:,}\n"
-            f"  ❤️ Лайки: {video.get('likes', 0):,}\n"
-            f"  💬 Комментарии: {video.get('comments', 0):,}\n"
-            f"💰 Заработано: {format_currency(video['earnings'])}\n"
-            f"{status_emoji} Статус: <b>{status_text}</b>\n"
-            f"📅 Подано: {created_at}\n"
-        )
-    
-    history_text += f"\n━━━━━━━━━━━━━━━━━━\n"
-    history_text += f"📄 Страница {page} из {total_pages}"
-    
-    keyboard = pagination_keyboard(page, total_pages, "history") if total_pages > 1 else None
-    
+    history_text, keyboard = page_text
     await message.answer(history_text, reply_markup=keyboard, parse_mode="HTML")
 
 
-@router.callback_query(F.data.startswith("history_page_"))
-async def history_pagination(callback: CallbackQuery):
-    """Пагинация истории"""
-    page = int(callback.data.split("_")[2])
-    
+async def render_history_page(user_id: int, page: int, cursor: str = None, legacy: bool = False):
+    """
+    Текст и клавиатура страницы истории (None, если заявок нет)
+
+    cursor — позиция из callback_data: 'b<id>' (старше видео id) или 'a<id>' (новее).
+    legacy — старые кнопки без позиции: страница выбирается через OFFSET.
+    """
     items_per_page = 5
-    offset = (page - 1) * items_per_page
     
-    videos = await db.get_user_videos(callback.from_user.id, limit=items_per_page, offset=offset)
-    total_videos = await db.get_video_count(callback.from_user.id)
-    total_pages = calculate_pages(total_videos, items_per_page)
+    if legacy:
+        offset = (page - 1) * items_per_page
+        videos = await db.get_user_videos(user_id, limit=items_per_page, offset=offset)
+    else:
+        before = int(cursor[1:]) if cursor and cursor[0] == 'b' else None
+        after = int(cursor[1:]) if cursor and cursor[0] == 'a' else None
+        result = await db.get_user_videos_page(user_id, limit=items_per_page, before=before, after=after)
+        videos = result['items']
+        if not result['has_newer']:
+            # Якорь не найден или это начало списка
+            page = 1
+    
+    total_videos = await db.get_video_count(user_id)
+    total_pages = max(calculate_pages(total_videos, items_per_page), page)
+    
+    if not videos:
+        return None
     
     history_text = f"📜 <b>История заявок</b>\n\n"
     
@@ -407,7 +391,30 @@ async def history_pagination(callback: CallbackQuery):
     history_text += f"\n━━━━━━━━━━━━━━━━━━\n"
     history_text += f"📄 Страница {page} из {total_pages}"
     
-    keyboard = pagination_keyboard(page, total_pages, "history")
+    keyboard = None
+    if total_pages > 1:
+        keyboard = pagination_keyboard(
+            page, total_pages, "history",
+            prev_cursor=f"a{videos[0]['id']}",
+            next_cursor=f"b{videos[-1]['id']}"
+        )
+    
+    return history_text, keyboard
+
+
+@router.callback_query(F.data.startswith("history_page_"))
+async def history_pagination(callback: CallbackQuery):
+    """Пагинация истории"""
+    # history_page_{page}_{cursor}; кнопки старых сообщений — history_page_{page}
+    parts = callback.data.split("_")
+    page = int(parts[2])
+    cursor = parts[3] if len(parts) > 3 else None
+    
+    page_text = await render_history_page(callback.from_user.id, page, cursor, legacy=cursor is None)
+    if page_text is None:
+        await callback.answer("📭 История заявок пуста")
+        return
     
+    history_text, keyboard = page_text
     await callback.message.edit_text(history_text, reply_markup=keyboard, parse_mode="HTML")
     await callback.answer()
@@ -156,7 +156,8 @@ async def youtube_check_description(callback: CallbackQuery, state: FSMContext):
         )
         
         try:
-            channel_data = await parse_youtube_channel(youtube_url)
+            # Запросы администраторов всегда парсятся заново, минуя кэш
+            channel_data = await parse_youtube_channel(youtube_url, fresh=callback.from_user.id in config.ADMIN_IDS)
         except Exception as e:
             logger.error(f"Ошибка парсинга YouTube канала: {e}")
             await progress_msg.edit_text(
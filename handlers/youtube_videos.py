@@ -115,7 +115,8 @@ async def receive_youtube_video_url(message: Message, state: FSMContext):
     )
     
     # Парсим видео
-    video_data = await parse_youtube_video(url)
+    # Запросы администраторов всегда парсятся заново, минуя кэш
+    video_data = await parse_youtube_video(url, fresh=message.from_user.id in config.ADMIN_IDS)
     
     if not video_data:
         await progress_msg.edit_text(
@@ -261,7 +262,10 @@ async def receive_youtube_video_url(message: Message, state: FSMContext):
             await db.update_video_earnings(video_id, user_rate)
 
             # Начисляем на баланс
-            await db.update_user_balance(message.from_user.id, user_rate, operation='add')
+            await db.update_user_balance(
+                message.from_user.id, user_rate, operation='add',
+                reason='video_payout', ref_type='video', ref_id=video_id
+            )
 
             # Реферальное вознаграждение (10%)
             referrer = await db.get_user(message.from_user.id)
@@ -0,0 +1,263 @@
+"""
+Извлечение данных из страниц TikTok без построения DOM
+
+Страница видео или профиля — сотни КБ HTML, из которых нужен один блок
+JSON гидратации. Блоки ищутся поиском по сырым байтам ответа (без
+декодирования всей страницы и без BeautifulSoup), а в json.loads попадает
+только тело нужного <script>; следующий блок декодируется, только если в
+предыдущем нет данных. Порядок источников:
+- <script id="__UNIVERSAL_DATA_FOR_REHYDRATION__"> — текущий формат;
+- <script id="SIGI_STATE"> — прежний формат (ItemModule / UserModule);
+- <script type="application/ld+json"> — без репостов и избранного.
+
+Страницы видео и профиля разбираются одним кодом (hydration_blocks);
+сравнение с прежним разбором — scripts/benchmark_extractor.py. Для
+потоковой загрузки HydrationLocator определяет, когда нужный блок уже
+получен и остаток страницы можно не читать.
+"""
+import html
+import json
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+UNIVERSAL_DATA = 'universal'
+SIGI_STATE = 'sigi'
+LD_JSON = 'ld_json'
+
+# Признаки нужных <script> в порядке предпочтения
+_SCRIPT_MARKERS = (
+    (UNIVERSAL_DATA, b'id="__UNIVERSAL_DATA_FOR_REHYDRATION__"'),
+    (SIGI_STATE, b'id="SIGI_STATE"'),
+    (LD_JSON, b'type="application/ld+json"'),
+)
+
+# statusCode webapp.video-detail «item doesn't exist» — видео удалено или не существовало
+_VIDEO_NOT_FOUND_CODES = {10204}
+
+_META_DESCRIPTION = re.compile(rb'<meta[^>]+name="description"[^>]+content="([^"]*)"')
+_SIGNATURE = re.compile(rb'"signature"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+
+def _script_body_start(page: bytes, position: int) -> Optional[int]:
+    """Начало тела <script>, которому принадлежит атрибут в position, или None"""
+    # Атрибут должен принадлежать открывающему тегу <script, а не тексту страницы
+    tag_start = page.rfind(b'<', 0, position)
+    if tag_start == -1 or not page.startswith(b'<script', tag_start) or b'>' in page[tag_start:position]:
+        return None
+    body_start = page.find(b'>', position)
+    return None if body_start == -1 else body_start + 1
+
+
+def find_script(page: bytes, marker: bytes) -> Optional[bytes]:
+    """Тело первого <script> с атрибутом marker (как байты) или None"""
+    position = page.find(marker)
+    while position != -1:
+        body_start = _script_body_start(page, position)
+        if body_start is not None:
+            body_end = page.find(b'</script>', body_start)
+            return None if body_end == -1 else page[body_start:body_end]
+        position = page.find(marker, position + len(marker))
+    return None
+
+
+class HydrationLocator:
+    """
+    Инкрементальный поиск блока гидратации в потоке ответа
+
+    feed() получает очередную часть тела и возвращает True, когда блок
+    UNIVERSAL_DATA или SIGI_STATE прочитан целиком (до </script>) — остаток
+    страницы можно не загружать. Каждая часть просматривается один раз (с
+    небольшим перекрытием на стыке частей); buffer — прочитанный префикс
+    страницы, его разбирают extract_video / extract_profile_bio.
+    """
+
+    # Перекрытие на стыке частей: маркер или начало тега, разрезанные между частями
+    OVERLAP = 1024
+
+    def __init__(self, targets: Tuple[str, ...] = (UNIVERSAL_DATA, SIGI_STATE)):
+        self.buffer = bytearray()
+        self._markers = [(source, marker) for source, marker in _SCRIPT_MARKERS if source in targets]
+        self._body_start: Optional[int] = None
+        self.found: Optional[str] = None
+        self.complete = False
+
+    def feed(self, chunk: bytes) -> bool:
+        scan_from = max(0, len(self.buffer) - self.OVERLAP)
+        self.buffer += chunk
+        if self._body_start is None:
+            for source, marker in self._markers:
+                position = self.buffer.find(marker, scan_from)
+                while position != -1:
+                    body_start = _script_body_start(self.buffer, position)
+                    if body_start is not None:
+                        self._body_start, self.found = body_start, source
+                        scan_from = body_start
+                        break
+                    position = self.buffer.find(marker, position + len(marker))
+                if self._body_start is not None:
+                    break
+        if self._body_start is not None and not self.complete:
+            self.complete = self.buffer.find(b'</script>', max(self._body_start, scan_from)) != -1
+        return self.complete
+
+
+def hydration_blocks(page: Union[bytes, str]) -> Iterator[Tuple[str, Any]]:
+    """
+    Блоки JSON гидратации страницы (источник, данные) в порядке предпочтения
+
+    Каждый блок декодируется только когда до него дошла итерация; битый
+    JSON пропускается.
+    """
+    if isinstance(page, str):
+        page = page.encode()
+    for source, marker in _SCRIPT_MARKERS:
+        body = find_script(page, marker)
+        if not body:
+            continue
+        try:
+            yield source, json.loads(body)
+        except ValueError as e:
+            logger.warning(f"Битый JSON в блоке {source}: {e}")
+
+
+def _stats_result(video_id: str, author: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Результат парсинга видео из itemStruct (UNIVERSAL_DATA) или ItemModule (SIGI_STATE)"""
+    stats = item.get('stats') or {}
+    result = {
+        'success': True,
+        'video_id': video_id,
+        'author': author,
+        'published_at': None,
+        'views': int(stats.get('playCount', 0)),
+        'likes': int(stats.get('diggCount', 0)),
+        'comments': int(stats.get('commentCount', 0)),
+        'shares': int(stats.get('shareCount', 0)),
+        'favorites': int(stats.get('collectCount', 0)),
+        'description': item.get('desc', ''),
+    }
+    create_time = item.get('createTime')
+    if create_time:
+        try:
+            result['published_at'] = datetime.fromtimestamp(int(create_time))
+        except (TypeError, ValueError, OverflowError, OSError):
+            pass
+    return result
+
+
+def _ld_json_result(video_id: str, author: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    result = {
+        'success': True,
+        'video_id': video_id,
+        'author': author,
+        'published_at': None,
+        'views': 0,
+        'likes': 0,
+        'comments': 0,
+        'shares': 0,
+        'favorites': 0,
+        'description': data.get('description', ''),
+    }
+    upload_date = data.get('uploadDate')
+    if upload_date:
+        try:
+            result['published_at'] = datetime.fromisoformat(upload_date.replace('Z', '+00:00'))
+        except ValueError:
+            pass
+
+    for stat in data.get('interactionStatistic', []):
+        interaction_type = str(stat.get('interactionType', '')).lower()
+        count = int(stat.get('userInteractionCount', 0))
+        if 'watch' in interaction_type or 'view' in interaction_type:
+            result['views'] = count
+        elif 'like' in interaction_type:
+            result['likes'] = count
+        elif 'comment' in interaction_type:
+            result['comments'] = count
+    return result
+
+
+def extract_video(page: Union[bytes, str], video_id: str, fallback_author: str = '') -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    Метаданные видео со страницы TikTok: (источник, результат) или None
+
+    Результат в формате parse_tiktok_video; fallback_author — автор из URL,
+    если в данных его нет. Для удалённого видео — неуспешный результат с
+    not_found=True.
+    """
+    for source, data in hydration_blocks(page):
+        if not isinstance(data, dict):
+            continue
+        if source == UNIVERSAL_DATA:
+            video_detail = data.get('__DEFAULT_SCOPE__', {}).get('webapp.video-detail', {})
+            item = video_detail.get('itemInfo', {}).get('itemStruct')
+            if item:
+                author = (item.get('author') or {}).get('uniqueId', '') or fallback_author
+                return source, _stats_result(video_id, author, item)
+            if video_detail.get('statusCode') in _VIDEO_NOT_FOUND_CODES:
+                return source, {'success': False, 'error': 'Видео не найдено или удалено', 'not_found': True}
+        elif source == SIGI_STATE:
+            items = data.get('ItemModule') or data.get('itemModule') or {}
+            item = items.get(video_id) or next(iter(items.values()), None)
+            if item and 'stats' in item:
+                author = item.get('author')
+                if isinstance(author, dict):
+                    author = author.get('uniqueId', '')
+                author = author or item.get('authorName', '') or fallback_author
+                return source, _stats_result(video_id, author, item)
+        elif source == LD_JSON:
+            author = data.get('author', {})
+            if isinstance(author, dict):
+                author = author.get('name', '') or author.get('alternateName', '') or author.get('@id', '')
+            author = author or fallback_author
+            return source, _ld_json_result(video_id, author, data)
+    return None
+
+
+def extract_profile_bio(page: Union[bytes, str]) -> Optional[Tuple[str, str]]:
+    """
+    Био профиля со страницы TikTok: (источник, текст) или None
+
+    После блоков гидратации пробует первое поле "signature" на странице и
+    meta description.
+    """
+    if isinstance(page, str):
+        page = page.encode()
+
+    for source, data in hydration_blocks(page):
+        if not isinstance(data, dict):
+            continue
+        if source == UNIVERSAL_DATA:
+            user_detail = data.get('__DEFAULT_SCOPE__', {}).get('webapp.user-detail', {})
+            signature = user_detail.get('userInfo', {}).get('user', {}).get('signature')
+            if signature:
+                return source, signature
+        elif source == SIGI_STATE:
+            for user_data in data.get('UserModule', {}).get('users', {}).values():
+                # Проверяем все возможные поля с био
+                for field in ('signature', 'desc', 'bioLink', 'bio'):
+                    value = user_data.get(field)
+                    if value and isinstance(value, str):
+                        return source, value
+        elif source == LD_JSON and data.get('description'):
+            return source, data['description']
+
+    match = _SIGNATURE.search(page)
+    if match:
+        try:
+            signature = json.loads(match.group(1))
+        except ValueError:
+            signature = ''
+        if signature:
+            return 'signature', signature
+
+    # В description часто есть био после имени пользователя
+    match = _META_DESCRIPTION.search(page)
+    if match:
+        content = html.unescape(match.group(1).decode(errors='replace'))
+        if len(content) > 10:
+            return 'meta', content
+    return None
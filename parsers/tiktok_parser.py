@@ -5,10 +5,16 @@ TikTok Video Parser
 
 import re
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import logging
 import aiohttp
 
+from core import config
+from core.browser_pool import get_browser_pool
+from core.http_client import get_http_session, get_raw_http_session, read_until
+from core.parse_cache import TIKTOK_VIDEO, get_parse_cache
+from parsers.tiktok_extractor import HydrationLocator, extract_video
+
 logger = logging.getLogger(__name__)
 
 
@@ -46,192 +52,86 @@ def extract_tiktok_username_from_url(url: str) -> Optional[str]:
     return None
 
 
+async def fetch_tiktok_page(url: str, timeout: float = 15) -> Tuple[int, bytes]:
+    """
+    Загрузить страницу TikTok: (HTTP статус, тело)
+
+    В потоковом режиме (TIKTOK_STREAM_FETCH) тело читается частями и
+    загрузка обрывается сразу после блока JSON гидратации — возвращается
+    прочитанный префикс страницы, в котором уже есть всё для tiktok_extractor.
+    """
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    # Общая сессия: соединение с tiktok.com переиспользуется между запросами
+    if not config.TIKTOK_STREAM_FETCH:
+        async with get_http_session().get(url, timeout=client_timeout) as response:
+            return response.status, (await response.read() if response.status == 200 else b'')
+
+    # Без распаковки aiohttp: read_until распаковывает сам и считает сетевые байты
+    async with get_raw_http_session().get(url, timeout=client_timeout) as response:
+        if response.status != 200:
+            return response.status, b''
+        locator = HydrationLocator()
+        fetch = await read_until(response, locator.feed)
+    
+    if fetch['early']:
+        ending = f"загрузка оборвана после блока {locator.found}"
+    elif fetch['drained']:
+        ending = f"остаток после блока {locator.found} дочитан, соединение в пуле"
+    else:
+        ending = "страница целиком"
+    logger.info(
+        f"TikTok page: {fetch['network_bytes']} байт по сети, "
+        f"{fetch['bytes_read']} после распаковки ({ending})"
+    )
+    return 200, bytes(locator.buffer)
+
+
 async def parse_tiktok_video_http(url: str) -> Dict[str, Any]:
     """
     Резервный метод парсинга через HTTP запрос (без Playwright)
     Быстрее, но менее надежен
     """
     try:
-        from bs4 import BeautifulSoup
-        import json
-        
         video_id = extract_tiktok_video_id(url)
         if not video_id:
             return {'success': False, 'error': 'Неверный формат TikTok URL'}
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
-        }
+        status, page = await fetch_tiktok_page(url)
+        if status in (404, 410):
+            # Окончательная ошибка: результат кэшируется как отрицательный
+            return {'success': False, 'error': 'Видео не найдено или удалено', 'not_found': True}
+        if status != 200:
+            return {'success': False, 'error': f'HTTP {status}'}
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=15)) as response:
-                if response.status != 200:
-                    return {'success': False, 'error': f'HTTP {response.status}'}
-                
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Логируем для диагностики
-                logger.info(f"HTTP response length: {len(html)} chars")
-                
-                # Метод 1: Ищем JSON-LD данные
-                json_ld_script = soup.find('script', {'type': 'application/ld+json'})
-                
-                # Если нет JSON-LD, ищем данные в <script id="__UNIVERSAL_DATA_FOR_REHYDRATION__">
-                if not json_ld_script:
-                    logger.info("JSON-LD not found, trying __UNIVERSAL_DATA_FOR_REHYDRATION__")
-                    universal_data_script = soup.find('script', {'id': '__UNIVERSAL_DATA_FOR_REHYDRATION__'})
-                    if universal_data_script:
-                        try:
-                            data = json.loads(universal_data_script.string)
-                            # Извлекаем данные из универсального формата TikTok
-                            video_detail = data.get('__DEFAULT_SCOPE__', {}).get('webapp.video-detail', {})
-                            if video_detail:
-                                item_info = video_detail.get('itemInfo', {}).get('itemStruct', {})
-                                if item_info:
-                                    author_info = item_info.get('author', {})
-                                    stats = item_info.get('stats', {})
-                                    
-                                    author_name = author_info.get('uniqueId', '')
-                                    if not author_name:
-                                        author_name = extract_tiktok_username_from_url(url) or ''
-                                    
-                                    result = {
-                                        'success': True,
-                                        'video_id': video_id,
-                                        'author': author_name,
-                                        'published_at': None,
-                                        'views': int(stats.get('playCount', 0)),
-                                        'likes': int(stats.get('diggCount', 0)),
-                                        'comments': int(stats.get('commentCount', 0)),
-                                        'shares': int(stats.get('shareCount', 0)),
-                                        'favorites': int(stats.get('collectCount', 0)),
-                                        'description': item_info.get('desc', '')
-                                    }
-                                    
-                                    # Парсим дату
-                                    create_time = item_info.get('createTime')
-                                    if create_time:
-                                        try:
-                                            result['published_at'] = datetime.fromtimestamp(int(create_time))
-                                        except:
-                                            pass
-                                    
-                                    logger.info(f"TikTok video parsed via HTTP (UNIVERSAL_DATA): {video_id}")
-                                    return result
-                        except Exception as e:
-                            logger.warning(f"Failed to parse UNIVERSAL_DATA: {e}")
-                
-                # Метод 3: Ищем данные в любых script тегах с "itemModule" или "videoData"
-                if not json_ld_script:
-                    logger.info("Trying to find video data in any script tags...")
-                    for script in soup.find_all('script'):
-                        script_text = script.string or ''
-                        if 'itemModule' in script_text or 'videoData' in script_text or 'ItemModule' in script_text:
-                            try:
-                                # Пытаемся найти JSON внутри скрипта
-                                json_match = re.search(r'({[^<>]*"itemModule"[^<>]*})', script_text, re.DOTALL)
-                                if not json_match:
-                                    json_match = re.search(r'({[^<>]*"stats"[^<>]*"playCount"[^<>]*})', script_text, re.DOTALL)
-                                
-                                if json_match:
-                                    data = json.loads(json_match.group(1))
-                                    
-                                    # Ищем данные видео в структуре
-                                    item_data = None
-                                    if 'itemModule' in data:
-                                        item_data = list(data['itemModule'].values())[0] if data['itemModule'] else None
-                                    elif 'stats' in data:
-                                        item_data = data
-                                    
-                                    if item_data and 'stats' in item_data:
-                                        stats = item_data['stats']
-                                        author_info = item_data.get('author', {})
-                                        
-                                        author_name = author_info.get('uniqueId', '') or item_data.get('authorName', '')
-                                        if not author_name:
-                                            author_name = extract_tiktok_username_from_url(url) or ''
-                                        
-                                        result = {
-                                            'success': True,
-                                            'video_id': video_id,
-                                            'author': author_name,
-                                            'published_at': None,
-                                            'views': int(stats.get('playCount', 0)),
-                                            'likes': int(stats.get('diggCount', 0)),
-                                            'comments': int(stats.get('commentCount', 0)),
-                                            'shares': int(stats.get('shareCount', 0)),
-                                            'favorites': int(stats.get('collectCount', 0)),
-                                            'description': item_data.get('desc', '')
-                                        }
-                                        
-                                        create_time = item_data.get('createTime')
-                                        if create_time:
-                                            try:
-                                                result['published_at'] = datetime.fromtimestamp(int(create_time))
-                                            except:
-                                                pass
-                                        
-                                        logger.info(f"TikTok video parsed via HTTP (script search): {video_id}")
-                                        return result
-                            except Exception as e:
-                                continue
-                
-                # Метод 4: JSON-LD данные (если найдены)
-                if json_ld_script:
-                    data = json.loads(json_ld_script.string)
-                    
-                    author_name = data.get('author', {}).get('name', '')
-                    if not author_name:
-                        author_name = extract_tiktok_username_from_url(url) or ''
-                    
-                    result = {
-                        'success': True,
-                        'video_id': video_id,
-                        'author': author_name,
-                        'published_at': None,
-                        'views': 0,
-                        'likes': 0,
-                        'comments': 0,
-                        'shares': 0,
-                        'favorites': 0,
-                        'description': data.get('description', '')
-                    }
-                    
-                    # Парсим дату
-                    upload_date = data.get('uploadDate')
-                    if upload_date:
-                        try:
-                            result['published_at'] = datetime.fromisoformat(upload_date.replace('Z', '+00:00'))
-                        except:
-                            pass
-                    
-                    # Парсим статистику
-                    interaction_statistic = data.get('interactionStatistic', [])
-                    for stat in interaction_statistic:
-                        interaction_type = stat.get('interactionType', '').lower()
-                        count = int(stat.get('userInteractionCount', 0))
-                        
-                        if 'watch' in interaction_type or 'view' in interaction_type:
-                            result['views'] = count
-                        elif 'like' in interaction_type:
-                            result['likes'] = count
-                        elif 'comment' in interaction_type:
-                            result['comments'] = count
-                    
-                    logger.info(f"TikTok video parsed via HTTP: {video_id}")
-                    return result
-                
-                return {'success': False, 'error': 'Не найдены JSON-LD данные'}
+        # JSON гидратации ищется в сырых байтах, без построения DOM
+        extracted = extract_video(page, video_id, extract_tiktok_username_from_url(url) or '')
+        if extracted:
+            source, result = extracted
+            if result.get('not_found'):
+                logger.info(f"TikTok video not found ({source}): {video_id}")
+            else:
+                logger.info(f"TikTok video parsed via HTTP ({source}): {video_id}")
+            return result
+        
+        return {'success': False, 'error': 'Не найдены данные видео на странице'}
                 
     except Exception as e:
         logger.error(f"HTTP parsing error: {e}")
         return {'success': False, 'error': f'Ошибка HTTP парсинга: {str(e)}'}
 
 
-async def parse_tiktok_video(url: str) -> Dict[str, Any]:
+async def parse_tiktok_video(url: str, fresh: bool = False) -> Dict[str, Any]:
+    """
+    Метаданные TikTok видео с кэшем по ID видео (см. core.parse_cache)
+    
+    fresh=True — кэш не используется, запись обновляется (запрос администратора).
+    """
+    return await get_parse_cache().get_or_fetch(
+        TIKTOK_VIDEO, extract_tiktok_video_id(url), lambda: _parse_tiktok_video(url), fresh=fresh
+    )
+
+
+async def _parse_tiktok_video(url: str) -> Dict[str, Any]:
     """
     Парсит метаданные TikTok видео через Playwright
     
@@ -253,7 +153,7 @@ async def parse_tiktok_video(url: str) -> Dict[str, Any]:
     # Сначала пробуем быстрый HTTP метод
     logger.info(f"Trying HTTP method for: {url}")
     http_result = await parse_tiktok_video_http(url)
-    if http_result.get('success'):
+    if http_result.get('success') or http_result.get('not_found'):
         return http_result
     
     logger.warning(f"HTTP method failed: {http_result.get('error')}")
@@ -287,38 +187,12 @@ async def parse_tiktok_video(url: str) -> Dict[str, Any]:
     
     # Если HTTP не сработал, используем Playwright
     try:
-        from playwright.async_api import async_playwright
-        import json
-        
         video_id = extract_tiktok_video_id(url)
         if not video_id:
             return {'success': False, 'error': 'Неверный формат TikTok URL'}
         
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                headless=True,
-                args=[
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-dev-shm-usage',
-                    '--disable-web-security'
-                ]
-            )
-            
-            context = await browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                locale='ru-RU',
-                timezone_id='Europe/Moscow',
-                extra_http_headers={
-                    'Accept-Language': 'ru-RU,ru;q=0.9,en;q=0.8',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                }
-            )
-            
-            page = await context.new_page()
-            
+        # Страница из общего пула: браузер уже запущен, контекст прогрет
+        async with get_browser_pool().page() as page:
             try:
                 # Переходим на страницу видео с увеличенным таймаутом
                 # Пробуем несколько стратегий загрузки
@@ -336,66 +210,15 @@ async def parse_tiktok_video(url: str) -> Dict[str, Any]:
                 
                 await page.wait_for_timeout(2000)  # Ждем загрузки JS
                 
-                # Метод 1: Ищем JSON-LD данные (самый надежный)
+                # Метод 1: JSON гидратации из отрендеренной страницы (тот же разбор, что в HTTP методе)
                 try:
-                    json_ld = await page.query_selector('script[type="application/ld+json"]')
-                    if json_ld:
-                        json_content = await json_ld.inner_text()
-                        data = json.loads(json_content)
-                        
-                        # Парсим данные из JSON-LD
-                        # Пробуем разные способы получить автора
-                        author_name = ''
-                        author_data = data.get('author', {})
-                        if isinstance(author_data, dict):
-                            author_name = author_data.get('name', '') or author_data.get('alternateName', '') or author_data.get('@id', '')
-                        elif isinstance(author_data, str):
-                            author_name = author_data
-                        
-                        # Если автор не найден, берем из URL
-                        if not author_name or author_name == '':
-                            author_name = extract_tiktok_username_from_url(url) or ''
-                            logger.info(f"Author extracted from URL: {author_name}")
-                        
-                        result = {
-                            'success': True,
-                            'video_id': video_id,
-                            'author': author_name,
-                            'published_at': None,
-                            'views': 0,
-                            'likes': 0,
-                            'comments': 0,
-                            'shares': 0,
-                            'favorites': 0,
-                            'description': data.get('description', '')
-                        }
-                        
-                        # Парсим дату публикации
-                        upload_date = data.get('uploadDate')
-                        if upload_date:
-                            try:
-                                result['published_at'] = datetime.fromisoformat(upload_date.replace('Z', '+00:00'))
-                            except:
-                                pass
-                        
-                        # Парсим статистику
-                        interaction_statistic = data.get('interactionStatistic', [])
-                        for stat in interaction_statistic:
-                            interaction_type = stat.get('interactionType', '').lower()
-                            count = int(stat.get('userInteractionCount', 0))
-                            
-                            if 'watch' in interaction_type or 'view' in interaction_type:
-                                result['views'] = count
-                            elif 'like' in interaction_type:
-                                result['likes'] = count
-                            elif 'comment' in interaction_type:
-                                result['comments'] = count
-                        
-                        await browser.close()
-                        logger.info(f"TikTok video parsed (JSON-LD): {video_id}, views: {result['views']}")
+                    extracted = extract_video(await page.content(), video_id, extract_tiktok_username_from_url(url) or '')
+                    if extracted:
+                        source, result = extracted
+                        logger.info(f"TikTok video parsed ({source}): {video_id}, views: {result.get('views')}")
                         return result
                 except Exception as e:
-                    logger.warning(f"JSON-LD parsing failed: {e}")
+                    logger.warning(f"Hydration JSON parsing failed: {e}")
                 
                 # Метод 2: Парсим через селекторы (резервный)
                 result = {
@@ -455,12 +278,10 @@ async def parse_tiktok_video(url: str) -> Dict[str, Any]:
                 # Дату публикации сложно получить без JSON-LD, используем текущее время
                 result['published_at'] = datetime.now()
                 
-                await browser.close()
                 logger.info(f"TikTok video parsed (selectors): {video_id}, views: {result['views']}")
                 return result
                 
             except Exception as e:
-                await browser.close()
                 logger.error(f"Error parsing TikTok video page: {e}")
                 return {'success': False, 'error': f'Ошибка парсинга страницы: {str(e)}'}
                 
@@ -520,7 +341,7 @@ def is_video_recent(published_at: Optional[datetime], max_hours: int = 24) -> bo
     return age <= max_age
 
 
-async def validate_tiktok_video(url: str, user_tiktok_username: str) -> Dict[str, Any]:
+async def validate_tiktok_video(url: str, user_tiktok_username: str, fresh: bool = False) -> Dict[str, Any]:
     """
     Полная валидация TikTok видео:
     1. Парсит метаданные
@@ -534,9 +355,11 @@ async def validate_tiktok_video(url: str, user_tiktok_username: str) -> Dict[str
             'error': str,        # если success=False
             'error_code': str    # 'parse_error', 'too_old', 'wrong_author'
         }
+    
+    fresh=True — не брать метаданные из кэша парсинга (запрос администратора).
     """
     # Парсим видео
-    video_data = await parse_tiktok_video(url)
+    video_data = await parse_tiktok_video(url, fresh=fresh)
     
     if not video_data.get('success'):
         return {
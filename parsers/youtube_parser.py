@@ -2,8 +2,12 @@ import asyncio
 import re
 import logging
 from typing import Optional, Dict, Any
+import aiohttp
 import yt_dlp
 
+from core.http_client import get_http_session
+from core.parse_cache import YOUTUBE_CHANNEL, get_parse_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -41,7 +45,29 @@ def normalize_youtube_url(identifier: str) -> str:
         return f"https://www.youtube.com/@{identifier}"
 
 
-async def parse_youtube_channel(url: str) -> Optional[Dict[str, Any]]:
+def _channel_cache_key(url: str) -> Optional[str]:
+    """Ключ кэша канала: channel ID как есть, handle и имена — без учёта регистра"""
+    identifier = extract_channel_id_from_url(url)
+    if not identifier:
+        return None
+    for kind in ('channel', 'c', 'user'):
+        if f'youtube.com/{kind}/' in url:
+            return f"{kind}:{identifier if kind == 'channel' else identifier.lower()}"
+    return '@' + identifier.lstrip('@').lower()
+
+
+async def parse_youtube_channel(url: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Данные YouTube канала с кэшем по channel ID / handle (см. core.parse_cache)
+    
+    fresh=True — кэш не используется, запись обновляется (запрос администратора).
+    """
+    return await get_parse_cache().get_or_fetch(
+        YOUTUBE_CHANNEL, _channel_cache_key(url), lambda: _parse_youtube_channel(url), fresh=fresh
+    )
+
+
+async def _parse_youtube_channel(url: str) -> Optional[Dict[str, Any]]:
     """
     Парсинг YouTube канала через yt-dlp
     Извлекает: channel_id, channel_name, description, subscriber_count
@@ -61,17 +87,21 @@ async def parse_youtube_channel(url: str) -> Optional[Dict[str, Any]]:
             'prefer_insecure': True,
         }
         
-        # Запускаем в отдельном потоке с таймаутом
+        # Сначала быстрый HTTP-запрос через общую сессию
+        channel_info = await _fetch_channel_info_http(url)
+        
+        # Запускаем yt-dlp в отдельном потоке с таймаутом
         loop = asyncio.get_event_loop()
         
         try:
-            channel_info = await asyncio.wait_for(
-                loop.run_in_executor(
-                    None,
-                    lambda: _extract_channel_info(url, ydl_opts)
-                ),
-                timeout=30.0  # Сокращен до 30 секунд
-            )
+            if not channel_info:
+                channel_info = await asyncio.wait_for(
+                    loop.run_in_executor(
+                        None,
+                        lambda: _extract_channel_info(url, ydl_opts)
+                    ),
+                    timeout=30.0  # Сокращен до 30 секунд
+                )
         except asyncio.TimeoutError:
             logger.error(f"Таймаут при парсинге канала: {url} (>30 сек)")
             return None
@@ -92,50 +122,54 @@ async def parse_youtube_channel(url: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def _extract_channel_info(url: str, ydl_opts: dict) -> Optional[Dict[str, Any]]:
-    """Вспомогательная функция для извлечения информации (запускается в отдельном потоке)"""
+async def _fetch_channel_info_http(url: str) -> Optional[Dict[str, Any]]:
+    """
+    Быстрый парсинг страницы канала через общую HTTP-сессию
+
+    Возвращает None, если на странице нет channel ID или описания, —
+    тогда канал разбирает yt-dlp.
+    """
     try:
-        # Сначала пробуем быстрый метод через requests
-        try:
-            import requests
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            }
-            response = requests.get(url, headers=headers, timeout=10)
-            
-            if response.status_code == 200:
-                html = response.text
-                
-                # Извлекаем описание через regex
-                desc_match = re.search(r'"description":"([^"]*)"', html)
-                description = desc_match.group(1) if desc_match else ''
-                
-                # Извлекаем channel ID
-                channel_id_match = re.search(r'"channelId":"(UC[\w-]+)"', html)
-                channel_id = channel_id_match.group(1) if channel_id_match else None
-                
-                # Извлекаем имя канала
-                name_match = re.search(r'"author":"([^"]+)"', html)
-                channel_name = name_match.group(1) if name_match else 'Unknown'
-                
-                # Извлекаем handle
-                handle_match = re.search(r'@([\w-]+)', url)
-                channel_handle = '@' + handle_match.group(1) if handle_match else None
-                
-                if channel_id and description:
-                    logger.info(f"✅ Быстрый парсинг успешен для {url}")
-                    return {
-                        'channel_id': channel_id,
-                        'channel_name': channel_name,
-                        'channel_handle': channel_handle,
-                        'description': description,
-                        'subscriber_count': 0,
-                        'subscriber_text': 'N/A'
-                    }
-        except Exception as e:
-            logger.warning(f"Быстрый парсинг не удался: {e}")
+        async with get_http_session().get(url, timeout=aiohttp.ClientTimeout(total=10)) as response:
+            if response.status != 200:
+                return None
+            html = await response.text()
+        
+        # Извлекаем описание через regex
+        desc_match = re.search(r'"description":"([^"]*)"', html)
+        description = desc_match.group(1) if desc_match else ''
+        
+        # Извлекаем channel ID
+        channel_id_match = re.search(r'"channelId":"(UC[\w-]+)"', html)
+        channel_id = channel_id_match.group(1) if channel_id_match else None
+        
+        # Извлекаем имя канала
+        name_match = re.search(r'"author":"([^"]+)"', html)
+        channel_name = name_match.group(1) if name_match else 'Unknown'
+        
+        # Извлекаем handle
+        handle_match = re.search(r'@([\w-]+)', url)
+        channel_handle = '@' + handle_match.group(1) if handle_match else None
         
-        # Если быстрый метод не сработал, используем yt-dlp
+        if channel_id and description:
+            logger.info(f"✅ Быстрый парсинг успешен для {url}")
+            return {
+                'channel_id': channel_id,
+                'channel_name': channel_name,
+                'channel_handle': channel_handle,
+                'description': description,
+                'subscriber_count': 0,
+                'subscriber_text': 'N/A'
+            }
+    except Exception as e:
+        logger.warning(f"Быстрый парсинг не удался: {e}")
+    return None
+
+
+def _extract_channel_info(url: str, ydl_opts: dict) -> Optional[Dict[str, Any]]:
+    """Вспомогательная функция для извлечения информации через yt-dlp (запускается в отдельном потоке)"""
+    try:
+        # Быстрый метод не сработал (см. _fetch_channel_info_http) — используем yt-dlp
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             # Извлекаем информацию о канале
             info = ydl.extract_info(url, download=False)
@@ -5,6 +5,8 @@ from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
 import yt_dlp
 
+from core.parse_cache import YOUTUBE_VIDEO, get_parse_cache
+
 logger = logging.getLogger(__name__)
 
 
@@ -38,7 +40,18 @@ def extract_video_id(url: str) -> Optional[str]:
     return None
 
 
-async def parse_youtube_video(url: str) -> Optional[Dict[str, Any]]:
+async def parse_youtube_video(url: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    Данные YouTube видео с кэшем по ID видео (см. core.parse_cache)
+    
+    fresh=True — кэш не используется, запись обновляется (запрос администратора).
+    """
+    return await get_parse_cache().get_or_fetch(
+        YOUTUBE_VIDEO, extract_video_id(url), lambda: _parse_youtube_video(url), fresh=fresh
+    )
+
+
+async def _parse_youtube_video(url: str) -> Optional[Dict[str, Any]]:
     """
     Парсинг YouTube видео через yt-dlp
     Извлекает: video_id, title, channel_id, channel_name, upload_date, view_count, like_count, comment_count
@@ -0,0 +1,43 @@
+"""
+Пересборка дневных сводок admin-аналитики (daily_stats, daily_active_users, user_daily_stats)
+
+Сводки поддерживаются триггерами на videos и заполняются автоматически при первом
+запуске бота после обновления. Скрипт нужен, если данные videos менялись в обход
+триггеров (ручное восстановление, импорт) или сводки повреждены. Видео из
+архива (ARCHIVE_DATABASE_PATH) учитываются вместе с videos.
+
+Запуск из корня проекта: python scripts/backfill_daily_stats.py [путь_к_БД]
+"""
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import DATABASE_PATH
+from core.database import Database
+from core.db_pool import close_all_pools
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main():
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DATABASE_PATH
+    if not os.path.exists(db_path):
+        logger.error(f"❌ База данных не найдена: {db_path}")
+        return
+
+    db = Database(db_path)
+    try:
+        # init_db создаёт таблицы сводок и триггеры, если их ещё нет
+        await db.init_db()
+        rows = await db.rebuild_daily_stats()
+        logger.info(f"✅ Сводки пересобраны: {rows} строк daily_stats")
+    finally:
+        await close_all_pools()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
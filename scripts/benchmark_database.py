@@ -0,0 +1,443 @@
+"""
+Нагрузочный тест слоя Database на смешанной нагрузке
+
+Несколько конкурентных «клиентов» в одном цикле событий (как в боте)
+выполняют сценарии обработчиков с заданными долями:
+- profile    — экран профиля (handlers/profile.py);
+- history    — страница истории видео и переход на следующую;
+- submission — проверка дубликата и добавление TikTok-видео (handlers/videos.py);
+- approval   — одобрение видео из очереди модерации с начислением баланса и
+               реферального бонуса (handlers/admin.py);
+- analytics  — admin-аналитика, статистика платформы и финансы за 1/7/30 дней.
+
+Пользователи профиля выбираются равномерно, авторы видео — пропорционально
+числу их видео (тяжёлые авторы чаще). Ожиданием блокировки считается только
+настоящее ожидание: выдача соединения, когда все соединения пула заняты, или
+запись, вставшая в очередь за чужим блоком общего писателя (счётчики пула), а
+также ошибки «database is locked/busy». Время получения соединения по типам
+(read/analytics/write) выводится отдельно.
+
+Результат — JSON: пропускная способность, перцентили задержек по сценариям,
+ожидания блокировок и состояние пула. С --compare выводятся изменения
+относительно сохранённого прогона.
+
+Тест пишет в БД, поэтому по умолчанию работает с копией (--in-place — прямо
+с файлом). Данные для прогона создаёт scripts/synthetic_data.py.
+
+Запуск из корня проекта:
+python scripts/benchmark_database.py путь_к_БД [--duration 60] [--warmup 5] [--concurrency 32]
+                                     [--mix profile=40,history=25,submission=15,approval=10,analytics=10]
+                                     [--seed N] [--output результат.json] [--compare прошлый.json] [--in-place]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import config
+from core.database import Database
+from core.db_pool import close_all_pools
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIX = "profile=40,history=25,submission=15,approval=10,analytics=10"
+
+# Пользователей и авторов в выборке прогона
+SAMPLE_SIZE = 20_000
+
+
+def _percentiles(samples) -> dict:
+    """Перцентили (по ближайшему рангу), среднее и максимум в миллисекундах"""
+    if not samples:
+        return {"p50": 0.0, "p90": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0, "mean": 0.0}
+    ordered = sorted(samples)
+    n = len(ordered)
+    result = {f"p{q}": round(ordered[min(n - 1, max(0, -(-q * n // 100) - 1))], 3) for q in (50, 90, 95, 99)}
+    result["max"] = round(ordered[-1], 3)
+    result["mean"] = round(sum(ordered) / n, 3)
+    return result
+
+
+# === ОЖИДАНИЯ БЛОКИРОВОК ===
+
+class _Recorder:
+    """Задержки сценариев и получения соединений; учитываются только после прогрева"""
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = {}
+        self.errors = {}
+        self.acquisitions = {"read": [], "analytics": [], "write": []}
+        self.busy_errors = 0
+
+    def latency(self, workload: str, elapsed_ms: float):
+        if self.recording:
+            self.latencies.setdefault(workload, []).append(elapsed_ms)
+
+    def error(self, workload: str, exc: BaseException):
+        if not self.recording:
+            return
+        if isinstance(exc, sqlite3.OperationalError) and ("locked" in str(exc) or "busy" in str(exc)):
+            self.busy_errors += 1
+        errors = self.errors.setdefault(workload, {})
+        name = type(exc).__name__
+        errors[name] = errors.get(name, 0) + 1
+
+    def acquired(self, kind: str, elapsed_ms: float):
+        if self.recording:
+            self.acquisitions[kind].append(elapsed_ms)
+
+
+@asynccontextmanager
+async def _timed(source, recorder: _Recorder, kind: str):
+    started = time.perf_counter()
+    async with source as db:
+        recorder.acquired(kind, (time.perf_counter() - started) * 1000)
+        yield db
+
+
+class BenchmarkDatabase(Database):
+    """Database, замеряющая время получения соединений пула и общего писателя"""
+
+    def __init__(self, db_path: str, recorder: _Recorder):
+        super().__init__(db_path)
+        self.recorder = recorder
+
+    def _connect(self, method=None):
+        return _timed(super()._connect(method or sys._getframe(1).f_code.co_name), self.recorder, "read")
+
+    def _analytics(self, method=None):
+        return _timed(super()._analytics(method or sys._getframe(1).f_code.co_name), self.recorder, "analytics")
+
+    def _write(self, users=(), method=None):
+        return _timed(super()._write(users, method or sys._getframe(1).f_code.co_name), self.recorder, "write")
+
+
+# === СЦЕНАРИИ ===
+
+class _Context:
+    """Выборка пользователей, авторов и очередь модерации для сценариев"""
+
+    def __init__(self, db_path: str, rnd: random.Random):
+        conn = sqlite3.connect(db_path)
+        try:
+            user_ids = [row[0] for row in conn.execute("SELECT user_id FROM users ORDER BY user_id")]
+            self.users = rnd.sample(user_ids, min(SAMPLE_SIZE, len(user_ids)))
+            # Авторы с TikTok-аккаунтом, веса — количество видео (тяжёлые авторы чаще)
+            authors = conn.execute(
+                """SELECT t.user_id, t.id, t.username, u.total_videos + 1
+                   FROM tiktok_accounts t JOIN users u ON u.user_id = t.user_id
+                   ORDER BY t.user_id"""
+            ).fetchall()
+            self.authors = rnd.choices(
+                [row[:3] for row in authors], weights=[row[3] for row in authors], k=SAMPLE_SIZE
+            ) if authors else []
+            # Очередь модерации: старые видео первыми
+            self.pending = deque(
+                row[0] for row in conn.execute("SELECT id FROM videos WHERE status = 'pending' ORDER BY id")
+            )
+        finally:
+            conn.close()
+        # Уникальная часть URL новых видео: не пересекается между прогонами
+        self.run_id = int(time.time() * 1000)
+        self.submitted = 0
+
+
+def _period(days: int):
+    end = datetime.now()
+    return end - timedelta(days=days), end
+
+
+async def _profile(db: Database, ctx: _Context, rnd: random.Random):
+    user_id = rnd.choice(ctx.users)
+    await db.get_user(user_id)
+    await db.get_payment_methods(user_id)
+    await db.get_referral_stats(user_id)
+    await db.get_user_tiktok(user_id)
+    await db.get_user_youtube(user_id)
+    await db.get_user_free_key_progress(user_id)
+
+
+async def _history(db: Database, ctx: _Context, rnd: random.Random):
+    user_id = rnd.choice(ctx.authors)[0] if ctx.authors else rnd.choice(ctx.users)
+    page = await db.get_user_videos_page(user_id, limit=10)
+    await db.get_video_count(user_id)
+    if page["has_older"]:
+        await db.get_user_videos_page(user_id, limit=10, before=page["items"][-1]["id"])
+
+
+async def _submission(db: Database, ctx: _Context, rnd: random.Random):
+    if not ctx.authors:
+        return
+    user_id, tiktok_id, username = rnd.choice(ctx.authors)
+    ctx.submitted += 1
+    video_id = f"{ctx.run_id}{ctx.submitted:06d}"
+    video_url = f"https://www.tiktok.com/@{username}/video/{video_id}"
+
+    await db.get_user_tiktok(user_id)
+    if await db.check_video_exists(video_url=video_url) or await db.check_video_exists(video_id=video_id):
+        return
+    saved_id = await db.add_video(
+        user_id, tiktok_id, video_url, video_id=video_id, author=username,
+        views=int(rnd.lognormvariate(7.5, 1.6)),
+    )
+    if saved_id:
+        ctx.pending.append(saved_id)
+
+
+async def _approval(db: Database, ctx: _Context, rnd: random.Random):
+    if not ctx.pending:
+        return
+    video_id = ctx.pending.popleft()
+    video = await db.get_video(video_id)
+    if not video or video["status"] != "pending":
+        return
+    await db.get_user(video["user_id"])
+    payout_amount = (video["views"] or 0) / 1000 * config.TIKTOK_RATE_PER_1000_VIEWS
+
+    await db.update_video_status(video_id, "approved")
+    await db.update_user_balance(
+        video["user_id"], payout_amount, operation="add",
+        reason="video_payout", ref_type="video", ref_id=video_id
+    )
+    referrer = await db.get_user(video["user_id"])
+    if referrer and referrer.get("referrer_id"):
+        await db.add_referral_earning(
+            referrer_id=referrer["referrer_id"], referred_id=video["user_id"], amount=payout_amount * 0.10
+        )
+
+
+async def _analytics(db: Database, ctx: _Context, rnd: random.Random):
+    start_date, end_date = _period(rnd.choice((1, 7, 30)))
+    screen = rnd.randrange(3)
+    if screen == 0:
+        await db.get_admin_analytics(start_date, end_date)
+        await db.get_top_users_by_platform("tiktok", start_date, end_date, limit=5)
+        await db.get_top_users_by_platform("youtube", start_date, end_date, limit=5)
+    elif screen == 1:
+        platform = rnd.choice(("tiktok", "youtube"))
+        await db.get_platform_stats(platform, start_date, end_date)
+        await db.get_top_users_by_platform(platform, start_date, end_date, limit=5)
+    else:
+        await db.get_finances_stats(start_date, end_date)
+
+
+WORKLOADS = {
+    "profile": _profile,
+    "history": _history,
+    "submission": _submission,
+    "approval": _approval,
+    "analytics": _analytics,
+}
+
+
+def _parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in WORKLOADS:
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий: {name} (есть: {', '.join(WORKLOADS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# === ПРОГОН ===
+
+async def _worker(db: Database, ctx: _Context, recorder: _Recorder, mix: dict, seed: int, deadline: float):
+    rnd = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        name = rnd.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            await WORKLOADS[name](db, ctx, rnd)
+        except Exception as e:
+            recorder.error(name, e)
+            continue
+        recorder.latency(name, (time.perf_counter() - started) * 1000)
+
+
+async def run(db_path: str, duration: float, warmup: float, concurrency: int, mix: dict, seed: int) -> dict:
+    """Прогнать смешанную нагрузку и вернуть отчёт"""
+    recorder = _Recorder()
+    db = BenchmarkDatabase(db_path, recorder)
+    try:
+        await db.init_db()
+        ctx = _Context(db_path, random.Random(seed))
+        logger.info(
+            f"🏁 Нагрузка: {concurrency} клиентов, {duration:.0f} сек (+{warmup:.0f} сек прогрева), "
+            f"в очереди модерации {len(ctx.pending)} видео"
+        )
+
+        deadline = time.monotonic() + warmup + duration
+        workers = [
+            asyncio.create_task(_worker(db, ctx, recorder, mix, seed * 1000 + i, deadline))
+            for i in range(concurrency)
+        ]
+        await asyncio.sleep(warmup)
+        recorder.recording = True
+        pool_before = db.get_query_metrics()["pool"]
+        started = time.monotonic()
+        await asyncio.gather(*workers)
+        elapsed = time.monotonic() - started
+        pool = db.get_query_metrics()["pool"]
+    finally:
+        await close_all_pools()
+
+    workloads = {}
+    for name in mix:
+        samples = recorder.latencies.get(name, [])
+        workloads[name] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(name, {}),
+            "throughput_ops_s": round(len(samples) / elapsed, 2),
+            "latency_ms": _percentiles(samples),
+        }
+    operations = sum(w["count"] for w in workloads.values())
+
+    # Ожидания — приросты счётчиков пула за время замера
+    lock_waits = {"busy_errors": recorder.busy_errors}
+    for kind, (count, total) in {
+        "pool": ("checkout_waits", "checkout_wait_ms"),
+        "writer": ("write_waits", "write_wait_ms"),
+    }.items():
+        waits = pool[count] - pool_before[count]
+        wait_ms = pool[total] - pool_before[total]
+        lock_waits[kind] = {
+            "waits": waits,
+            "wait_total_ms": round(wait_ms, 3),
+            "wait_mean_ms": round(wait_ms / waits, 3) if waits else 0.0,
+        }
+    acquisitions = {
+        kind: {"count": len(samples), "acquire_ms": _percentiles(samples)}
+        for kind, samples in recorder.acquisitions.items()
+    }
+
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "database": os.path.abspath(db_path),
+        "config": {
+            "duration_s": duration,
+            "warmup_s": warmup,
+            "concurrency": concurrency,
+            "mix": mix,
+            "seed": seed,
+            "pool_size": config.DATABASE_POOL_SIZE,
+            "write_batch": config.DATABASE_WRITE_BATCH,
+            "user_cache_size": config.USER_CACHE_SIZE,
+            "replica": bool(config.ANALYTICS_REPLICA_PATH),
+            "archive": bool(config.ARCHIVE_DATABASE_PATH),
+        },
+        "elapsed_s": round(elapsed, 3),
+        "operations": operations,
+        "throughput_ops_s": round(operations / elapsed, 2),
+        "workloads": workloads,
+        "lock_waits": lock_waits,
+        "acquisitions": acquisitions,
+        "pool": pool,
+    }
+
+
+def _compare(report: dict, baseline: dict):
+    """Вывести изменения пропускной способности и p99 относительно baseline"""
+    def change(new, old):
+        return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+    logger.info(
+        f"📈 Всего: {report['throughput_ops_s']} оп/с "
+        f"({change(report['throughput_ops_s'], baseline.get('throughput_ops_s', 0))})"
+    )
+    for name, current in report["workloads"].items():
+        previous = baseline.get("workloads", {}).get(name)
+        if not previous:
+            continue
+        logger.info(
+            f"  {name}: {current['throughput_ops_s']} оп/с "
+            f"({change(current['throughput_ops_s'], previous['throughput_ops_s'])}), "
+            f"p99 {current['latency_ms']['p99']} мс "
+            f"({change(current['latency_ms']['p99'], previous['latency_ms']['p99'])})"
+        )
+    for kind in ("pool", "writer"):
+        current = report["lock_waits"][kind]["waits"]
+        previous = baseline.get("lock_waits", {}).get(kind, {}).get("waits", 0)
+        logger.info(f"  ожидания {kind}: {current} (было {previous})")
+    logger.info(
+        f"  ошибки locked/busy: {report['lock_waits']['busy_errors']} "
+        f"(было {baseline.get('lock_waits', {}).get('busy_errors', 0)})"
+    )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный тест Database на смешанной нагрузке")
+    parser.add_argument("db_path", help="БД с данными (scripts/synthetic_data.py)")
+    parser.add_argument("--duration", type=float, default=60.0, help="длительность замера (сек)")
+    parser.add_argument("--warmup", type=float, default=5.0, help="прогрев без замера (сек)")
+    parser.add_argument("--concurrency", type=int, default=32, help="конкурентных клиентов")
+    parser.add_argument("--mix", type=_parse_mix, default=_parse_mix(DEFAULT_MIX), help="доли сценариев")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="сохранить отчёт в файл")
+    parser.add_argument("--compare", help="сравнить с отчётом прошлого прогона")
+    parser.add_argument("--in-place", action="store_true", help="писать прямо в db_path, без копии")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db_path):
+        logger.error(f"❌ База данных не найдена: {args.db_path}")
+        return 1
+
+    workdir = None
+    db_path = args.db_path
+    if not args.in_place:
+        workdir = tempfile.mkdtemp(prefix="benchmark_", dir=os.path.dirname(os.path.abspath(args.db_path)))
+        db_path = os.path.join(workdir, os.path.basename(args.db_path))
+        logger.info(f"📋 Копия БД для прогона: {db_path}")
+        source = sqlite3.connect(args.db_path)
+        target = sqlite3.connect(db_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+    try:
+        report = await run(db_path, args.duration, args.warmup, args.concurrency, args.mix, args.seed)
+    finally:
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        logger.info(f"💾 Отчёт сохранён: {args.output}")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            _compare(report, json.load(f))
+
+    logger.info(
+        f"✅ {report['operations']} операций за {report['elapsed_s']:.1f} сек "
+        f"({report['throughput_ops_s']} оп/с), ожиданий блокировок: "
+        f"{report['lock_waits']['pool']['waits'] + report['lock_waits']['writer']['waits']}, "
+        f"ошибок locked/busy: {report['lock_waits']['busy_errors']}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
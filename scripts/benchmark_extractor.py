@@ -0,0 +1,221 @@
+"""
+Бенчмарк извлечения данных из страниц TikTok
+
+Сравнивает parsers.tiktok_extractor (поиск блоков JSON в сырых байтах) с
+прежним разбором: полный BeautifulSoup(html, 'html.parser') и перебор всех
+<script> с регулярными выражениями. Для страницы видео и страницы профиля
+выводятся время на страницу (медиана, p95) и ускорение; результаты обоих
+способов сверяются.
+
+По умолчанию страницы синтетические — по структуре как у TikTok (бандлы
+скриптов, стили, разметка и блок __UNIVERSAL_DATA_FOR_REHYDRATION__ на
+сотни КБ). Сохранённую настоящую страницу можно передать через --video-page
+и --profile-page.
+
+Запуск из корня проекта:
+python scripts/benchmark_extractor.py [--iterations 50] [--video-page FILE] [--profile-page FILE]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+
+from parsers.tiktok_extractor import extract_profile_bio, extract_video
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VIDEO_ID = "7301234567890123456"
+USERNAME = "zenith_creator"
+
+
+# === СИНТЕТИЧЕСКИЕ СТРАНИЦЫ ===
+
+def _filler_json(rng: random.Random, items: int) -> Dict:
+    """Посторонние разделы __DEFAULT_SCOPE__ (рекомендации, переводы, конфиги)"""
+    return {
+        f"webapp.section-{i}": {
+            "list": [
+                {"id": str(rng.getrandbits(60)), "desc": "lorem ipsum " * rng.randint(2, 12),
+                 "stats": {"playCount": rng.randint(0, 10**7), "diggCount": rng.randint(0, 10**6)}}
+                for _ in range(20)
+            ]
+        }
+        for i in range(items)
+    }
+
+
+def _page(scope: Dict, rng: random.Random) -> bytes:
+    universal = {"__DEFAULT_SCOPE__": {**_filler_json(rng, 40), **scope}}
+    bundle = "function a(b){return b&&b.signature||window.itemModule;}" * 600
+    parts = [
+        "<!DOCTYPE html><html lang=\"ru\"><head><meta charset=\"utf-8\">",
+        f"<meta name=\"description\" content=\"{USERNAME} (@{USERNAME}) в TikTok | TG123ABCDEF\">",
+        "<style>" + ".css-x{display:flex;margin:0 auto}" * 1500 + "</style>",
+        *(f"<script src=\"/static/chunk-{i}.js\" defer></script>" for i in range(30)),
+        *(f"<script>{bundle}</script>" for _ in range(5)),
+        "</head><body>",
+        *(f"<div class=\"css-{i}\"><a href=\"/@u{i}\"><span>item {i}</span></a></div>" for i in range(3000)),
+        "<script id=\"__UNIVERSAL_DATA_FOR_REHYDRATION__\" type=\"application/json\">",
+        json.dumps(universal, ensure_ascii=False),
+        "</script></body></html>",
+    ]
+    return "".join(parts).encode()
+
+
+def synthetic_video_page(rng: random.Random) -> bytes:
+    item = {
+        "id": VIDEO_ID, "desc": "Тестовое видео #zenith", "createTime": "1700000000",
+        "author": {"uniqueId": USERNAME, "signature": "bio"},
+        "stats": {"playCount": 125000, "diggCount": 8500, "commentCount": 450,
+                  "shareCount": 230, "collectCount": 670},
+    }
+    return _page({"webapp.video-detail": {"itemInfo": {"itemStruct": item}}}, rng)
+
+
+def synthetic_profile_page(rng: random.Random) -> bytes:
+    user = {"id": "1", "uniqueId": USERNAME, "signature": "Мой канал TG123ABCDEF"}
+    return _page({"webapp.user-detail": {"userInfo": {"user": user}}}, rng)
+
+
+# === ПРЕЖНИЙ РАЗБОР (BeautifulSoup) ===
+
+def legacy_video(page: bytes) -> Optional[Dict]:
+    """Разбор страницы видео, как в parse_tiktok_video_http до перехода на tiktok_extractor"""
+    html = page.decode()
+    soup = BeautifulSoup(html, 'html.parser')
+    json_ld_script = soup.find('script', {'type': 'application/ld+json'})
+    if not json_ld_script:
+        universal_data_script = soup.find('script', {'id': '__UNIVERSAL_DATA_FOR_REHYDRATION__'})
+        if universal_data_script:
+            data = json.loads(universal_data_script.string)
+            video_detail = data.get('__DEFAULT_SCOPE__', {}).get('webapp.video-detail', {})
+            item_info = video_detail.get('itemInfo', {}).get('itemStruct', {})
+            if item_info:
+                stats = item_info.get('stats', {})
+                return {
+                    'author': item_info.get('author', {}).get('uniqueId', ''),
+                    'views': int(stats.get('playCount', 0)),
+                    'likes': int(stats.get('diggCount', 0)),
+                    'comments': int(stats.get('commentCount', 0)),
+                    'shares': int(stats.get('shareCount', 0)),
+                    'favorites': int(stats.get('collectCount', 0)),
+                }
+        for script in soup.find_all('script'):
+            script_text = script.string or ''
+            if 'itemModule' in script_text or 'videoData' in script_text or 'ItemModule' in script_text:
+                re.search(r'({[^<>]*"itemModule"[^<>]*})', script_text, re.DOTALL)
+    return None
+
+
+def legacy_profile(page: bytes) -> Optional[str]:
+    """Разбор страницы профиля, как в get_tiktok_profile_bio до перехода на tiktok_extractor"""
+    html = page.decode()
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup.find_all('script', {'id': 'SIGI_STATE'}):
+        data = json.loads(script.string or '')
+        for user_data in data.get('UserModule', {}).get('users', {}).values():
+            if user_data.get('signature'):
+                return user_data['signature']
+    for script in soup.find_all('script'):
+        script_text = script.string or ''
+        if 'signature' in script_text or 'bioLink' in script_text:
+            for json_str in re.findall(r'\{[^{}]*"signature"[^{}]*\}', script_text):
+                try:
+                    bio = json.loads(json_str).get('signature', '')
+                except ValueError:
+                    continue
+                if bio:
+                    return bio
+    meta_desc = soup.find('meta', {'name': 'description'})
+    if meta_desc and len(meta_desc.get('content', '')) > 10:
+        return meta_desc['content']
+    return None
+
+
+# === НОВЫЙ РАЗБОР ===
+
+def current_video(page: bytes) -> Optional[Dict]:
+    extracted = extract_video(page, VIDEO_ID)
+    if not extracted:
+        return None
+    result = extracted[1]
+    return {key: result[key] for key in ('author', 'views', 'likes', 'comments', 'shares', 'favorites')}
+
+
+def current_profile(page: bytes) -> Optional[str]:
+    extracted = extract_profile_bio(page)
+    return extracted[1] if extracted else None
+
+
+# === ЗАМЕР ===
+
+def measure(func: Callable[[bytes], object], page: bytes, iterations: int) -> List[float]:
+    func(page)  # прогрев
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func(page)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name: str, page: bytes, legacy: Callable, current: Callable, iterations: int) -> Dict:
+    legacy_result, current_result = legacy(page), current(page)
+    if legacy_result != current_result:
+        logger.warning(f"⚠️ {name}: результаты различаются\n  прежний: {legacy_result}\n  новый:   {current_result}")
+
+    rows = {}
+    for label, func in (("beautifulsoup", legacy), ("extractor", current)):
+        timings = measure(func, page, iterations)
+        rows[label] = {
+            "p50_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(sorted(timings)[int(len(timings) * 0.95) - 1], 3),
+        }
+    speedup = rows["beautifulsoup"]["p50_ms"] / max(rows["extractor"]["p50_ms"], 1e-6)
+    logger.info(
+        f"📊 {name} ({len(page) / 1024:.0f} КБ): BeautifulSoup {rows['beautifulsoup']['p50_ms']:.2f} мс, "
+        f"extractor {rows['extractor']['p50_ms']:.3f} мс (p95 {rows['extractor']['p95_ms']:.3f}) — "
+        f"в {speedup:.0f} раз быстрее"
+    )
+    return {"size_bytes": len(page), **rows, "speedup": round(speedup, 1), "same_result": legacy_result == current_result}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк извлечения данных из страниц TikTok")
+    parser.add_argument("--iterations", type=int, default=50, help="замеров на способ")
+    parser.add_argument("--video-page", help="сохранённая страница видео (HTML)")
+    parser.add_argument("--profile-page", help="сохранённая страница профиля (HTML)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    def load(path: Optional[str], build: Callable[[random.Random], bytes]) -> bytes:
+        if path:
+            with open(path, "rb") as f:
+                return f.read()
+        return build(rng)
+
+    results = {
+        "video": report("Страница видео", load(args.video_page, synthetic_video_page),
+                        legacy_video, current_video, args.iterations),
+        "profile": report("Страница профиля", load(args.profile_page, synthetic_profile_page),
+                          legacy_profile, current_profile, args.iterations),
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    return 0 if all(r["same_result"] for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,467 @@
+"""
+Проверка планов запросов (EXPLAIN QUERY PLAN) всех публичных методов Database
+
+Скрипт создаёт временную БД с синтетическими данными (тяжёлые авторы, рефералы,
+ключи, выплаты), собирает статистику планировщика ANALYZE — как
+scripts/optimize_database.py на рабочей БД — и вызывает каждый публичный метод
+core.database.Database из CALLS. План каждого выполненного запроса сравнивается
+с ожидаемым из scripts/query_plans.json.
+
+Код выхода 1, если:
+- план запроса отличается от ожидаемого, запрос новый или ожидаемый запрос
+  больше не выполняется;
+- у публичного метода Database нет вызова в CALLS.
+
+Полный просмотр таблицы (SCAN) и временное B-дерево для ORDER BY выводятся
+отдельно: в ожидаемых планах они допустимы только там, где это осознанно
+(выборки по всем пользователям, сортировка по агрегату).
+
+После намеренного изменения запросов или индексов ожидаемые планы
+перезаписываются: python scripts/check_query_plans.py --update — изменения
+query_plans.json проверяются на ревью вместе с кодом.
+
+Запуск из корня проекта: python scripts/check_query_plans.py [--update]
+"""
+import asyncio
+import difflib
+import inspect
+import json
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import Database
+from core.db_pool import close_all_pools
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPECTED_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plans.json")
+
+USERS = 20_000
+VIDEOS = 200_000
+
+# Таблицы из нескольких строк — их просмотр не считается проблемой
+SMALL_TABLES = {"payout_rates", "leaderboard_version", "archive_state", "schema_version"}
+
+_PLANNED = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+_SCAN = re.compile(r"^SCAN (\S+)")
+_SUBQUERY = re.compile(r"^(?:CO-ROUTINE|MATERIALIZE) (\S+)")
+_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (?:.* )?ORDER BY")
+
+
+# === СИНТЕТИЧЕСКИЕ ДАННЫЕ ===
+
+def seed(db_path: str, users: int, videos: int):
+    """Заполнить мигрированную БД синтетическими данными и собрать ANALYZE"""
+    conn = sqlite3.connect(db_path)
+    series = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < ?)"
+    with conn:
+        conn.execute(
+            f"""{series}
+                INSERT INTO users (user_id, username, full_name, referrer_id, tier,
+                                   free_key_claimed_at, blocked_until, created_at)
+                SELECT i, 'user' || i, 'User ' || i,
+                       CASE WHEN i > 100 AND i % 3 = 0 THEN 1 + (i * 31) % 100 END,
+                       CASE i % 10 WHEN 0 THEN 'gold' WHEN 1 THEN 'silver' ELSE 'bronze' END,
+                       CASE WHEN i % 20 = 0 THEN datetime('now', '-' || (i % 30) || ' days') END,
+                       CASE WHEN i % 100 = 0 THEN datetime('now', '+3 days') END,
+                       datetime('now', '-' || (i % 400) || ' days')
+                FROM n""",
+            (users,)
+        )
+        conn.execute(
+            """INSERT INTO referrals (referrer_id, referred_id, earnings, created_at)
+               SELECT referrer_id, user_id, (user_id % 50) * 1.5, created_at
+               FROM users WHERE referrer_id IS NOT NULL"""
+        )
+        conn.execute(
+            """INSERT INTO tiktok_accounts (user_id, username, url, is_verified)
+               SELECT user_id, 'tt' || user_id, 'https://tiktok.com/@tt' || user_id, user_id % 4 != 0
+               FROM users WHERE user_id % 5 < 3"""
+        )
+        conn.execute(
+            """INSERT INTO youtube_channels (user_id, channel_id, channel_name, url, is_verified)
+               SELECT user_id, 'UC' || user_id, 'Channel ' || user_id, 'https://youtube.com/@yt' || user_id, 1
+               FROM users WHERE user_id % 5 = 0 OR user_id <= 50"""
+        )
+        # Треть видео — у 50 тяжёлых авторов
+        conn.execute(
+            f"""{series}
+                INSERT INTO videos (user_id, platform, youtube_channel_id, video_url, video_id,
+                                    views, earnings, status, created_at)
+                SELECT user_id, platform,
+                       CASE WHEN platform = 'youtube' THEN (SELECT id FROM youtube_channels y WHERE y.user_id = v.user_id) END,
+                       'https://example.com/v/' || i, 'vid' || i,
+                       (i * 7919) % 200000,
+                       CASE WHEN platform = 'youtube' AND status = 'approved' THEN 40 + i % 100 ELSE 0 END,
+                       status, created_at
+                FROM (
+                    SELECT i,
+                           CASE WHEN i % 3 = 0 THEN 1 + i % 50 ELSE 1 + (i * 7919) % ? END AS user_id,
+                           CASE WHEN i % 5 = 0 THEN 'youtube' ELSE 'tiktok' END AS platform,
+                           CASE WHEN i % 10 < 7 THEN 'approved' WHEN i % 10 < 9 THEN 'rejected' ELSE 'pending' END AS status,
+                           datetime('now', '-' || ((i * 104729) % 34560000) || ' seconds') AS created_at
+                    FROM n
+                ) v
+                WHERE platform = 'tiktok'
+                   OR EXISTS (SELECT 1 FROM youtube_channels y WHERE y.user_id = v.user_id)""",
+            (videos, users)
+        )
+        conn.execute(
+            """INSERT INTO crypto_payouts (user_id, video_id, amount_rub, amount_usdt, spend_id, status, created_at)
+               SELECT user_id, id, views / 1000.0 * 65, views / 1000.0 * 65 / 90, 'spend' || id,
+                      CASE WHEN id % 7 = 0 THEN 'pending' ELSE 'completed' END, created_at
+               FROM videos WHERE status = 'approved' AND id % 10 = 0"""
+        )
+        conn.execute(
+            """INSERT INTO withdrawal_requests (user_id, amount, payment_method, payment_details, status, created_at)
+               SELECT user_id, 100 + user_id % 900, 'card', '0000',
+                      CASE WHEN user_id % 4 = 0 THEN 'pending' ELSE 'completed' END, created_at
+               FROM users WHERE user_id % 5 = 0 OR user_id <= 50"""
+        )
+        conn.execute(
+            """INSERT INTO payment_methods (user_id, method_type, details)
+               SELECT user_id, 'card', '0000' FROM users WHERE user_id % 3 = 0 OR user_id <= 50"""
+        )
+        conn.execute(
+            f"""{series}
+                INSERT INTO media_keys (key_value, status, is_free_promo, assigned_to, created_at, assigned_at)
+                SELECT 'KEY-' || i,
+                       CASE WHEN i % 2 = 0 THEN 'assigned' ELSE 'available' END,
+                       i % 10 = 0,
+                       CASE WHEN i % 2 = 0 THEN 1 + (i * 13) % ? END,
+                       datetime('now', '-' || (i % 300) || ' days'),
+                       CASE WHEN i % 2 = 0 THEN datetime('now', '-' || (i % 200) || ' days') END
+                FROM n""",
+            (users // 4, users)
+        )
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+# === ЗАПИСЬ ЗАПРОСОВ ===
+
+class _RecordingConnection:
+    """Прокси соединения aiosqlite: запоминает выполненные запросы"""
+
+    def __init__(self, conn, log):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_log", log)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def execute(self, sql, parameters=None):
+        self._log.append((sql, parameters))
+        return self._conn.execute(sql, parameters)
+
+    def executemany(self, sql, parameters):
+        parameters = list(parameters)
+        if parameters:
+            self._log.append((sql, parameters[0]))
+        return self._conn.executemany(sql, parameters)
+
+
+@asynccontextmanager
+async def _recording(source, log):
+    async with source as db:
+        yield _RecordingConnection(db, log)
+
+
+class PlanRecordingDatabase(Database):
+    """Database, запоминающая все запросы своих методов"""
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        self.statements = []
+
+    def _connect(self, method=None):
+        return _recording(super()._connect(method or sys._getframe(1).f_code.co_name), self.statements)
+
+    def _analytics(self, method=None):
+        return _recording(super()._analytics(method or sys._getframe(1).f_code.co_name), self.statements)
+
+    def _write(self, users=(), method=None):
+        return _recording(super()._write(users, method or sys._getframe(1).f_code.co_name), self.statements)
+
+
+# === ВЫЗОВЫ МЕТОДОВ ===
+
+def _period(days: int):
+    # Неполные сутки по краям — чтобы в план попали и сводки, и videos
+    end = datetime.now()
+    return end - timedelta(days=days, hours=5), end
+
+
+# (метод, вызов) — порядок важен: сначала чтения, затем записи и удаления
+CALLS = [
+    ("init_db", lambda db, c: db.init_db()),
+    ("sync_payout_rates", lambda db, c: db.sync_payout_rates()),
+    ("get_user", lambda db, c: db.get_user(c.heavy)),
+    ("get_user_tier", lambda db, c: db.get_user_tier(c.heavy)),
+    ("get_user_tiktok", lambda db, c: db.get_user_tiktok(c.heavy)),
+    ("get_user_youtube", lambda db, c: db.get_user_youtube(c.heavy)),
+    ("get_user_youtube_rate", lambda db, c: db.get_user_youtube_rate(c.heavy)),
+    ("get_youtube_rate", lambda db, c: db.get_youtube_rate(c.heavy)),
+    ("get_tiktok_by_username", lambda db, c: db.get_tiktok_by_username(f"tt{c.heavy}")),
+    ("get_youtube_by_channel_id", lambda db, c: db.get_youtube_by_channel_id(f"UC{c.heavy}")),
+    ("get_all_verified_tiktoks", lambda db, c: db.get_all_verified_tiktoks()),
+    ("get_all_verified_youtubes", lambda db, c: db.get_all_verified_youtubes()),
+    ("get_user_channels", lambda db, c: db.get_user_channels(c.heavy)),
+    ("get_user_videos", lambda db, c: db.get_user_videos(c.heavy, 10)),
+    ("get_user_videos_page", lambda db, c: db.get_user_videos_page(c.heavy, 10, before=c.video)),
+    ("get_video_count", lambda db, c: db.get_video_count(c.heavy)),
+    ("get_video", lambda db, c: db.get_video(c.video)),
+    ("get_video_with_details", lambda db, c: db.get_video_with_details(c.video)),
+    ("check_video_exists", lambda db, c: db.check_video_exists(video_url=c.video_url)),
+    ("check_youtube_video_exists", lambda db, c: db.check_youtube_video_exists(video_url=c.video_url)),
+    ("get_user_youtube_videos", lambda db, c: db.get_user_youtube_videos(c.heavy, 10)),
+    ("get_youtube_video_count", lambda db, c: db.get_youtube_video_count(c.heavy)),
+    ("check_first_youtube_video", lambda db, c: db.check_first_youtube_video(c.heavy)),
+    ("get_last_youtube_video_time", lambda db, c: db.get_last_youtube_video_time(c.heavy)),
+    ("can_submit_youtube_video", lambda db, c: db.can_submit_youtube_video(c.heavy)),
+    ("get_payment_methods", lambda db, c: db.get_payment_methods(c.heavy)),
+    ("get_withdrawal_requests", lambda db, c: db.get_withdrawal_requests(c.heavy, 10)),
+    ("get_withdrawal_requests_page", lambda db, c: db.get_withdrawal_requests_page(c.heavy, 10)),
+    ("get_withdrawal_count", lambda db, c: db.get_withdrawal_count(c.heavy)),
+    ("get_all_withdrawal_requests", lambda db, c: db.get_all_withdrawal_requests("pending")),
+    ("get_referrals", lambda db, c: db.get_referrals(c.referrer)),
+    ("get_referrals_page", lambda db, c: db.get_referrals_page(c.referrer, 10)),
+    ("get_referral_stats", lambda db, c: db.get_referral_stats(c.referrer)),
+    ("get_balance_history", lambda db, c: db.get_balance_history(c.heavy)),
+    ("get_payout_by_id", lambda db, c: db.get_payout_by_id(c.payout)),
+    ("get_user_payouts", lambda db, c: db.get_user_payouts(c.heavy)),
+    ("count_available_media_keys", lambda db, c: db.count_available_media_keys()),
+    ("get_next_available_media_key", lambda db, c: db.get_next_available_media_key(free_only=True)),
+    ("get_recently_assigned_media_keys", lambda db, c: db.get_recently_assigned_media_keys(10)),
+    ("get_user_active_free_key", lambda db, c: db.get_user_active_free_key(c.claimer)),
+    ("has_user_claimed_free_key", lambda db, c: db.has_user_claimed_free_key(c.claimer)),
+    ("get_user_free_key_progress", lambda db, c: db.get_user_free_key_progress(c.claimer)),
+    ("get_users_free_key_progress", lambda db, c: db.get_users_free_key_progress()),
+    ("get_users_for_key_distribution", lambda db, c: db.get_users_for_key_distribution(3, 30)),
+    ("get_stats", lambda db, c: db.get_stats()),
+    ("get_period_metrics", lambda db, c: db.get_period_metrics(*_period(30))),
+    ("get_admin_analytics", lambda db, c: db.get_admin_analytics(*_period(7))),
+    ("get_platform_stats", lambda db, c: db.get_platform_stats("tiktok", *_period(7))),
+    ("get_finances_stats", lambda db, c: db.get_finances_stats(*_period(7))),
+    ("get_top_users", lambda db, c: db.get_top_users(*_period(30), 10)),
+    ("get_top_users_by_platform", lambda db, c: db.get_top_users_by_platform("youtube", *_period(30), 5)),
+    ("reconcile_balances", lambda db, c: db.reconcile_balances()),
+
+    ("add_user", lambda db, c: db.add_user(c.new_user, "new", "New User", c.referrer)),
+    ("update_user_balance", lambda db, c: db.update_user_balance(c.new_user, 500, "add")),
+    ("update_user_stats_withdrawal", lambda db, c: db.update_user_stats_withdrawal(c.new_user, 10)),
+    ("add_channel", lambda db, c: db.add_channel(c.new_user, "chan", "Channel")),
+    ("update_channel_name", lambda db, c: db.update_channel_name(1, "Renamed")),
+    ("add_video", lambda db, c: db.add_video(c.new_user, None, "https://example.com/new/1", "new1")),
+    ("update_video_stats", lambda db, c: db.update_video_stats(c.video, 1000, 0)),
+    ("update_video_status", lambda db, c: db.update_video_status(c.video, "approved")),
+    ("update_video_earnings", lambda db, c: db.update_video_earnings(c.video, 65)),
+    ("add_payment_method", lambda db, c: db.add_payment_method(c.new_user, "card", "1111")),
+    ("create_withdrawal_request", lambda db, c: db.create_withdrawal_request(c.new_user, 100, "card", "1111")),
+    ("process_withdrawal", lambda db, c: db.process_withdrawal(c.withdrawal, True)),
+    ("add_referral_earning", lambda db, c: db.add_referral_earning(c.referrer, c.new_user, 5)),
+    ("add_tiktok_account", lambda db, c: db.add_tiktok_account(c.new_user, "newtt", "https://tiktok.com/@newtt", "code")),
+    ("verify_tiktok_account", lambda db, c: db.verify_tiktok_account(c.new_user)),
+    ("add_youtube_channel", lambda db, c: db.add_youtube_channel(
+        c.new_user, "UCnew", "@new", "New", "https://youtube.com/@new", "code")),
+    ("verify_youtube_channel", lambda db, c: db.verify_youtube_channel(c.new_user)),
+    ("set_youtube_rate", lambda db, c: db.set_youtube_rate(c.new_user, 60)),
+    ("add_youtube_video", lambda db, c: db.add_youtube_video(
+        c.new_user, 1, "https://youtube.com/watch?v=new", "ytnew", "Title", "Author", "2024-01-01")),
+    ("create_payout_request", lambda db, c: db.create_payout_request(c.heavy, c.video, 65, 0.7, "spend-new")),
+    ("update_payout_status", lambda db, c: db.update_payout_status(c.payout, "completed", "tr1", 1)),
+    ("set_user_tier", lambda db, c: db.set_user_tier(c.new_user, "gold")),
+    ("add_media_keys", lambda db, c: db.add_media_keys(["NEW-1", "NEW-2"], 1)),
+    ("import_media_keys", lambda db, c: db.import_media_keys(["NEW-3", "NEW-4", "bad key"], 1)),
+    ("allocate_media_keys", lambda db, c: db.allocate_media_keys([c.new_user, c.heavy])),
+    ("mark_media_key_assigned", lambda db, c: db.mark_media_key_assigned(c.key, c.new_user)),
+    ("mark_media_key_status", lambda db, c: db.mark_media_key_status(c.key, "available", clear_assignment=True)),
+    ("update_user_last_key_issued", lambda db, c: db.update_user_last_key_issued(c.new_user)),
+    ("update_free_key_claim", lambda db, c: db.update_free_key_claim(c.new_user)),
+    ("set_user_free_key_status", lambda db, c: db.set_user_free_key_status(c.new_user, key_id=c.key, status="used")),
+    ("clear_free_key_claim", lambda db, c: db.clear_free_key_claim(c.new_user)),
+    ("set_user_block", lambda db, c: db.set_user_block(c.new_user, 3)),
+    ("clear_user_block", lambda db, c: db.clear_user_block(c.new_user)),
+    ("ban_user", lambda db, c: db.ban_user(c.new_user)),
+    ("unban_user", lambda db, c: db.unban_user(c.new_user)),
+    ("rebuild_daily_stats", lambda db, c: db.rebuild_daily_stats()),
+
+    ("delete_payment_method", lambda db, c: db.delete_payment_method(1)),
+    ("delete_channel", lambda db, c: db.delete_channel(1)),
+    ("remove_tiktok_account", lambda db, c: db.remove_tiktok_account(c.new_user)),
+    ("remove_youtube_channel", lambda db, c: db.remove_youtube_channel(c.new_user)),
+]
+
+
+def _context(db_path: str, users: int) -> SimpleNamespace:
+    """Идентификаторы строк синтетической БД для аргументов CALLS"""
+    conn = sqlite3.connect(db_path)
+    try:
+        one = lambda sql: conn.execute(sql).fetchone()[0]
+        return SimpleNamespace(
+            heavy=1,
+            referrer=1 + (300 * 31) % 100,
+            claimer=20,
+            new_user=users + 1,
+            video=one("SELECT MAX(id) FROM videos WHERE user_id = 1 AND platform = 'youtube'"),
+            video_url=one("SELECT video_url FROM videos WHERE user_id = 1 ORDER BY id LIMIT 1"),
+            payout=one("SELECT MIN(id) FROM crypto_payouts WHERE status = 'pending'"),
+            withdrawal=one("SELECT MIN(id) FROM withdrawal_requests WHERE status = 'pending'"),
+            key=one("SELECT MIN(id) FROM media_keys WHERE status = 'available'"),
+        )
+    finally:
+        conn.close()
+
+
+def public_methods():
+    return sorted(
+        name for name, member in inspect.getmembers(Database, inspect.iscoroutinefunction)
+        if not name.startswith("_")
+    )
+
+
+# === ПЛАНЫ ===
+
+def _format_plan(rows) -> list:
+    """Строки EXPLAIN QUERY PLAN с отступами по вложенности"""
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def violations(plan: list) -> list:
+    """Полные просмотры таблиц и временные B-деревья для ORDER BY в плане"""
+    subqueries = {m.group(1) for m in (_SUBQUERY.match(line.strip()) for line in plan) if m}
+    found = []
+    for line in plan:
+        detail = line.strip()
+        scan = _SCAN.match(detail)
+        if scan:
+            name = scan.group(1)
+            if name in subqueries or name in SMALL_TABLES or name == "CONSTANT" or "VIRTUAL TABLE" in detail:
+                continue
+            found.append(detail)
+        elif _TEMP_SORT.search(detail):
+            found.append(detail)
+    return found
+
+
+async def collect_plans(db: PlanRecordingDatabase, ctx: SimpleNamespace) -> dict:
+    """{метод: {запрос: план}} для всех вызовов CALLS"""
+    plans = {}
+    for name, call in CALLS:
+        # Кэш отвечал бы без запросов — каждый метод должен дойти до БД
+        db._cache.clear()
+        db._leaderboard.clear()
+        db.statements.clear()
+        await call(db, ctx)
+
+        method_plans = {}
+        async with db._pool.connection() as conn:
+            for sql, params in db.statements:
+                if not _PLANNED.match(sql):
+                    continue
+                key = " ".join(sql.split())
+                if key in method_plans:
+                    continue
+                async with conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()) as cursor:
+                    plan = _format_plan(await cursor.fetchall())
+                if plan:
+                    method_plans[key] = plan
+        plans[name] = method_plans
+    return plans
+
+
+def compare(expected: dict, actual: dict) -> list:
+    """Расхождения с ожидаемыми планами"""
+    problems = []
+    for method in sorted(set(expected) | set(actual)):
+        want, got = expected.get(method, {}), actual.get(method, {})
+        for sql in sorted(set(want) | set(got)):
+            short = sql if len(sql) <= 120 else sql[:117] + "..."
+            if sql not in got:
+                problems.append(f"{method}: запрос больше не выполняется\n    {short}")
+            elif sql not in want:
+                extra = "".join(f"\n    ⚠️ {v}" for v in violations(got[sql]))
+                problems.append(f"{method}: новый запрос без ожидаемого плана\n    {short}{extra}")
+            elif want[sql] != got[sql]:
+                diff = "\n".join(
+                    f"    {line}" for line in difflib.unified_diff(want[sql], got[sql], lineterm="", n=1)
+                )
+                new = set(violations(got[sql])) - set(violations(want[sql]))
+                extra = "".join(f"\n    ⚠️ {v}" for v in sorted(new))
+                problems.append(f"{method}: план изменился\n    {short}\n{diff}{extra}")
+    return problems
+
+
+async def main() -> int:
+    update = "--update" in sys.argv[1:]
+
+    missing = sorted(set(public_methods()) - {name for name, _ in CALLS})
+    if missing:
+        logger.error(f"❌ Нет вызова в CALLS для методов: {', '.join(missing)}")
+        return 1
+
+    tmp_dir = tempfile.mkdtemp(prefix="query_plans_")
+    db_path = os.path.join(tmp_dir, "plans.db")
+    try:
+        db = PlanRecordingDatabase(db_path)
+        await db.init_db()
+        logger.info(f"🧪 Синтетические данные: {USERS} пользователей, {VIDEOS} видео...")
+        seed(db_path, USERS, VIDEOS)
+        ctx = _context(db_path, USERS)
+        try:
+            actual = await collect_plans(db, ctx)
+        finally:
+            await close_all_pools()
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    total = sum(len(queries) for queries in actual.values())
+    if update:
+        with open(EXPECTED_PATH, "w", encoding="utf-8") as f:
+            json.dump(actual, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        for method, queries in sorted(actual.items()):
+            for sql, plan in queries.items():
+                for violation in violations(plan):
+                    logger.warning(f"⚠️ {method}: {violation}")
+        logger.info(f"✅ Ожидаемые планы обновлены: {total} запросов ({EXPECTED_PATH})")
+        return 0
+
+    if not os.path.exists(EXPECTED_PATH):
+        logger.error(f"❌ Нет файла ожидаемых планов {EXPECTED_PATH} — запустите с --update")
+        return 1
+    with open(EXPECTED_PATH, encoding="utf-8") as f:
+        expected = json.load(f)
+
+    problems = compare(expected, actual)
+    for problem in problems:
+        logger.error(f"❌ {problem}")
+    if problems:
+        logger.error(f"❌ Расхождений с ожидаемыми планами: {len(problems)} (намеренные изменения: --update)")
+        return 1
+
+    logger.info(f"✅ Планы {total} запросов {len(actual)} методов совпадают с ожидаемыми")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -82,24 +82,16 @@ async def add_indexes(db: aiosqlite.Connection):
 async def optimize_database_settings(db: aiosqlite.Connection):
     """Оптимизация настроек SQLite"""
     
+    # Здесь только настройки, которые сохраняются в файле БД. cache_size,
+    # mmap_size, synchronous и т.п. действуют на одно соединение — их применяет
+    # пул бота (core/db_pool.CONNECTION_PRAGMAS)
     settings = [
         # WAL режим для лучшей конкурентности
         ("PRAGMA journal_mode=WAL", "WAL mode"),
         
-        # Увеличиваем таймаут блокировки
-        ("PRAGMA busy_timeout=30000", "Busy timeout"),
-        
-        # Кэш страниц в памяти (10MB)
-        ("PRAGMA cache_size=-10000", "Cache size"),
-        
-        # Синхронизация (NORMAL - баланс между скоростью и безопасностью)
-        ("PRAGMA synchronous=NORMAL", "Synchronous mode"),
-        
-        # Автоматическая очистка временных файлов
-        ("PRAGMA temp_store=MEMORY", "Temp store"),
-        
-        # Оптимизация памяти
-        ("PRAGMA mmap_size=268435456", "Memory-mapped I/O (256MB)"),
+        # Инкрементальная очистка для фонового обслуживания (core/maintenance.py);
+        # для существующей БД вступает в силу после VACUUM ниже
+        ("PRAGMA auto_vacuum=INCREMENTAL", "Incremental auto-vacuum"),
     ]
     
     logger.info("⚙️ Оптимизация настроек БД...")
@@ -125,7 +117,9 @@ async def analyze_database(db: aiosqlite.Connection):
         await db.execute("ANALYZE")
         logger.info("  ✅ Статистика собрана")
         
-        # VACUUM очищает базу данных и дефрагментирует
+        # VACUUM очищает базу данных и дефрагментирует. Он блокирует БД целиком —
+        # запускать при остановленном боте; в работе свободные страницы
+        # возвращает incremental_vacuum фонового обслуживания
         logger.info("  🧹 Очистка и дефрагментация (может занять время)...")
         await db.execute("VACUUM")
         logger.info("  ✅ База данных оптимизирована")
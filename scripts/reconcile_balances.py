@@ -0,0 +1,56 @@
+"""
+Сверка балансов пользователей с журналом balance_ledger
+
+users.balance — снимок, который обновляется в одной транзакции с записью в
+журнал. Скрипт за один проход сравнивает снимки всех пользователей с суммами
+журнала и выводит расхождения. Код выхода 1 — если расхождения найдены.
+
+Запуск из корня проекта: python scripts/reconcile_balances.py [путь_к_БД]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.config import DATABASE_PATH
+from core.database import Database
+from core.db_pool import close_all_pools
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main() -> int:
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DATABASE_PATH
+    if not os.path.exists(db_path):
+        logger.error(f"❌ База данных не найдена: {db_path}")
+        return 1
+
+    db = Database(db_path)
+    try:
+        await db.init_db()
+        started = time.perf_counter()
+        result = await db.reconcile_balances()
+        elapsed = time.perf_counter() - started
+    finally:
+        await close_all_pools()
+
+    mismatches = result["mismatches"]
+    for row in mismatches:
+        logger.warning(
+            f"⚠️ user {row['user_id']}: баланс {row['balance']:.2f} ₽, "
+            f"по журналу {row['ledger_balance']:.2f} ₽ (разница {row['diff']:+.2f} ₽)"
+        )
+    if mismatches:
+        logger.error(f"❌ Расхождений: {len(mismatches)} из {result['checked']} пользователей ({elapsed:.2f} сек)")
+        return 1
+
+    logger.info(f"✅ Балансы {result['checked']} пользователей совпадают с журналом ({elapsed:.2f} сек)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,78 @@
+"""
+Восстановление БД из хранилища бэкапов (core.backup_store)
+
+Без аргументов выводит список снимков. Снимок собирается из чанков в
+target_dir под исходными именами файлов (основная БД и, если был, архив
+видео); каждый чанк и файл сверяются с SHA-256 из манифеста. Существующие
+файлы не перезаписываются без --force — восстанавливать лучше при
+остановленном боте.
+
+Запуск из корня проекта:
+python scripts/restore_backup.py [--store backups] [снимок|latest] [--target-dir .] [--force]
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.backup_store import BackupStore
+from core.config import BACKUP_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Восстановление БД из хранилища бэкапов")
+    parser.add_argument("snapshot", nargs="?", help="имя снимка или latest (без него — список снимков)")
+    parser.add_argument("--store", default=BACKUP_DIR, help="каталог хранилища")
+    parser.add_argument("--target-dir", default=".", help="куда собрать файлы")
+    parser.add_argument("--force", action="store_true", help="перезаписать существующие файлы")
+    args = parser.parse_args()
+
+    store = BackupStore(args.store)
+    manifests = store.snapshots()
+    if not manifests:
+        logger.error(f"❌ В хранилище {args.store} нет снимков")
+        return 1
+
+    if not args.snapshot:
+        for manifest in manifests:
+            size = sum(entry["size"] for entry in manifest["files"].values())
+            logger.info(f"  {manifest['name']}  {manifest['created_at']}  {size / 2**20:.1f} МБ  "
+                        f"({', '.join(entry['name'] for entry in manifest['files'].values())})")
+        return 0
+
+    name = manifests[-1]["name"] if args.snapshot == "latest" else args.snapshot
+    manifest = next((m for m in manifests if m["name"] == name), None)
+    if manifest is None:
+        logger.error(f"❌ Снимок не найден: {name}")
+        return 1
+
+    existing = [
+        path for path in (os.path.join(args.target_dir, entry["name"]) for entry in manifest["files"].values())
+        if os.path.exists(path)
+    ]
+    if existing and not args.force:
+        logger.error(f"❌ Файлы уже существуют: {', '.join(existing)} (--force для перезаписи)")
+        return 1
+    for path in existing:
+        # Журнал WAL старого файла не должен примениться к восстановленному
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    try:
+        restored = store.restore(name, args.target_dir)
+    except (OSError, ValueError, RuntimeError) as e:
+        logger.error(f"❌ Не удалось восстановить снимок {name}: {e}")
+        return 1
+
+    logger.info(f"✅ Снимок {name} восстановлен: {', '.join(restored)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,428 @@
+"""
+Детерминированный генератор синтетической БД бота
+
+Создаёт новую БД (все миграции) и заполняет её данными с распределениями,
+близкими к рабочим:
+- пользователей со временем становится больше (регистрации к концу истории
+  чаще), рефералы приходят с предпочтительным присоединением — у активных
+  рефереров рефералов больше;
+- активность авторов распределена по Парето (80/20): небольшая доля тяжёлых
+  авторов присылает большую часть видео, и просмотры у них выше;
+- видео идут по времени (id растут вместе с created_at), свежие чаще на
+  модерации; одобренные видео начисляют баланс и реферальные бонусы через
+  balance_ledger, так что балансы сходятся с журналом;
+- выплаты crypto_payouts, выводы, способы оплаты и медиа-ключи (часть —
+  бесплатные промо-ключи).
+
+Один и тот же seed и anchor (дата «сейчас») дают одинаковую БД. Сводки,
+счётчики пользователей и effective_earnings заполняют триггеры схемы, как
+при работе бота. По умолчанию — прогнозируемый масштаб (500k пользователей,
+10M видео, 1M выплат); на нём генерация занимает десятки минут.
+
+Запуск из корня проекта:
+python scripts/synthetic_data.py путь_к_БД [--users N] [--videos N] [--payouts N]
+                                 [--keys N] [--seed N] [--anchor ГГГГ-ММ-ДД] [--force]
+"""
+import argparse
+import asyncio
+import bisect
+import logging
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import config
+from core.database import Database
+from core.db_pool import close_all_pools
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+USERS = 500_000
+VIDEOS = 10_000_000
+PAYOUTS = 1_000_000
+HISTORY_DAYS = 730
+
+# Первый user_id (идентификаторы Telegram)
+USER_ID_BASE = 100_000_000
+# Видео в одной транзакции вставки
+CHUNK = 50_000
+
+DAY = 86_400.0
+USDT_RATE = 90.0
+REFERRAL_SHARE = 0.10
+
+
+def _timestamp(ts: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts))
+
+
+def _sorted_uniforms(rnd: random.Random, n: int):
+    """n равномерных чисел из [0, 1) по возрастанию (порядковые статистики, без сортировки)"""
+    w = 1.0
+    for k in range(n, 0, -1):
+        w *= rnd.random() ** (1.0 / k)
+        yield 1.0 - w
+
+
+def _growth_times(rnd: random.Random, n: int, start: float, end: float):
+    """n моментов по возрастанию с линейно растущей плотностью к end"""
+    span = end - start
+    for u in _sorted_uniforms(rnd, n):
+        yield start + span * u ** 0.5
+
+
+class _Generator:
+    """Состояние генерации: пользователи, веса авторов, балансы и буферы вставки"""
+
+    def __init__(self, conn: sqlite3.Connection, rnd: random.Random, anchor: float, history_days: int):
+        self.conn = conn
+        self.rnd = rnd
+        self.anchor = anchor
+        self.start = anchor - history_days * DAY
+
+        # По индексу пользователя (в порядке регистрации)
+        self.user_ids = []
+        self.created = []
+        self.referrer = []
+        self.tiktok = []      # (id, username) или None
+        self.youtube = []     # (id, ставка) или None
+        self.weight = []
+        # Накопленные веса авторов для выбора пропорционально активности
+        self.cumulative = []
+
+        self.balance = {}
+        self.withdrawn = {}
+        self.referral_earnings = {}
+
+        self.counts = {}
+
+    def _insert(self, table: str, columns: str, rows: list):
+        if not rows:
+            return
+        marks = ", ".join("?" * len(rows[0]))
+        self.conn.executemany(f"INSERT INTO {table} ({columns}) VALUES ({marks})", rows)
+        self.counts[table] = self.counts.get(table, 0) + len(rows)
+        rows.clear()
+
+    # === ПОЛЬЗОВАТЕЛИ ===
+
+    def users(self, count: int):
+        rnd = self.rnd
+        users, referrals, tiktoks, youtubes = [], [], [], []
+        # Каждый пользователь входит один раз и ещё раз за каждого приведённого реферала
+        attach = []
+        total = 0.0
+
+        for i, ts in enumerate(_growth_times(rnd, count, self.start, self.anchor)):
+            user_id = USER_ID_BASE + i
+            created_at = _timestamp(ts)
+            referrer = None
+            if attach and rnd.random() < 0.3:
+                referrer = rnd.choice(attach)
+                attach.append(referrer)
+                referrals.append((self.user_ids[referrer], user_id, 0, created_at))
+            attach.append(i)
+
+            tiktok = youtube = None
+            if rnd.random() < 0.8:
+                tiktok = (len(tiktoks) + 1, f"tt_{user_id}")
+                tiktoks.append((tiktok[0], user_id, tiktok[1], f"https://www.tiktok.com/@{tiktok[1]}",
+                                rnd.random() < 0.9, created_at))
+            if rnd.random() < 0.12:
+                youtube = (len(youtubes) + 1, rnd.choice((50.0, 50.0, 50.0, 60.0, 80.0)))
+                youtubes.append((youtube[0], user_id, f"UC{user_id:022d}", f"@yt{user_id}",
+                                 f"Channel {user_id}", f"https://www.youtube.com/@yt{user_id}",
+                                 rnd.random() < 0.85, youtube[1], created_at))
+
+            # Активность авторов — Парето с alpha 1.16 (правило 80/20)
+            weight = min(rnd.paretovariate(1.16), 10_000.0) if tiktok or youtube else 0.0
+            total += weight
+
+            self.user_ids.append(user_id)
+            self.created.append(ts)
+            self.referrer.append(referrer)
+            self.tiktok.append(tiktok)
+            self.youtube.append(youtube)
+            self.weight.append(weight)
+            self.cumulative.append(total)
+
+            blocked_until = _timestamp(self.anchor + 3 * DAY) if rnd.random() < 0.005 else None
+            users.append((user_id, f"user{user_id}", f"User {i + 1}",
+                          self.user_ids[referrer] if referrer is not None else None,
+                          "gold" if rnd.random() < 0.08 else "bronze", blocked_until, created_at))
+
+        with self.conn:
+            for offset in range(0, len(users), CHUNK):
+                self._insert(
+                    "users",
+                    "user_id, username, full_name, referrer_id, tier, blocked_until, created_at",
+                    users[offset:offset + CHUNK]
+                )
+            self._insert("referrals", "referrer_id, referred_id, earnings, created_at", referrals)
+            self._insert("tiktok_accounts", "id, user_id, username, url, is_verified, created_at", tiktoks)
+            self._insert(
+                "youtube_channels",
+                "id, user_id, channel_id, channel_handle, channel_name, url, is_verified, "
+                "rate_per_1000_views, created_at",
+                youtubes
+            )
+
+    def _pick_author(self, ts: float) -> int:
+        """Автор видео в момент ts: среди уже зарегистрированных, пропорционально активности"""
+        eligible = bisect.bisect_right(self.created, ts)
+        while eligible < len(self.created) and (eligible == 0 or self.cumulative[eligible - 1] == 0):
+            eligible += 1
+        return bisect.bisect_right(self.cumulative, self.rnd.random() * self.cumulative[eligible - 1], 0, eligible)
+
+    # === ВИДЕО, НАЧИСЛЕНИЯ, ВЫПЛАТЫ ===
+
+    def _credit(self, ledger: list, index: int, amount: float, reason: str, ref_type: str, ref_id: int,
+                created_at: str):
+        user_id = self.user_ids[index]
+        amount = round(amount, 2)
+        balance = round(self.balance.get(user_id, 0.0) + amount, 2)
+        self.balance[user_id] = balance
+        ledger.append((user_id, amount, balance, reason, ref_type, ref_id, created_at))
+
+    def videos(self, count: int, payouts: int):
+        rnd = self.rnd
+        tiktok_rate = config.TIKTOK_RATE_PER_1000_VIEWS
+        # Около 78% видео одобряется — выплата создаётся для части одобренных
+        payout_share = min(1.0, payouts / max(1, count * 0.78))
+        videos, ledger, crypto, withdrawals = [], [], [], []
+        withdrawal_id = 0
+
+        for n, ts in enumerate(_growth_times(rnd, count, self.start, self.anchor), 1):
+            index = self._pick_author(ts)
+            # Пока авторов нет, первые видео сдвигаются к регистрации первого из них
+            ts = max(ts, self.created[index])
+            user_id = self.user_ids[index]
+            tiktok, youtube = self.tiktok[index], self.youtube[index]
+            platform = "youtube" if youtube and (not tiktok or rnd.random() < 0.3) else "tiktok"
+
+            age = self.anchor - ts
+            roll = rnd.random()
+            if age < 2 * DAY:
+                status = "pending" if roll < 0.7 else "approved" if roll < 0.94 else "rejected"
+            else:
+                status = "approved" if roll < 0.78 else "rejected" if roll < 0.98 else "pending"
+
+            # Просмотры — логнормальные, у тяжёлых авторов выше
+            views = min(int(rnd.lognormvariate(7.5, 1.6) * (1 + self.weight[index] ** 0.5 / 10)), 50_000_000)
+            engagement = rnd.uniform(0.02, 0.12)
+            likes = int(views * engagement)
+            created_at = _timestamp(ts)
+
+            if platform == "tiktok":
+                external_id = str(7_100_000_000_000_000_000 + n)
+                earnings = 0.0
+                amount = views / 1000 * tiktok_rate
+                videos.append((n, user_id, tiktok[0], None, platform,
+                               f"https://www.tiktok.com/@{tiktok[1]}/video/{external_id}", None, external_id,
+                               tiktok[1], views, likes, likes // 20, likes // 12, likes // 8, status, earnings,
+                               created_at))
+            else:
+                external_id = f"v{n:010x}"
+                amount = round(views / 1000 * youtube[1], 2)
+                earnings = amount if status == "approved" else 0.0
+                videos.append((n, user_id, None, youtube[0], platform,
+                               f"https://www.youtube.com/shorts/{external_id}", external_id, None,
+                               None, views, likes, likes // 20, 0, 0, status, earnings, created_at))
+
+            if status == "approved":
+                self._credit(ledger, index, amount, "video_payout", "video", n, created_at)
+                referrer = self.referrer[index]
+                if referrer is not None:
+                    bonus = amount * REFERRAL_SHARE
+                    self.referral_earnings[user_id] = self.referral_earnings.get(user_id, 0.0) + bonus
+                    self._credit(ledger, referrer, bonus, "referral", "user", user_id, created_at)
+
+                if rnd.random() < payout_share:
+                    payout_status = "pending" if age < 3 * DAY else "paid" if rnd.random() < 0.95 else "rejected"
+                    paid_at = _timestamp(min(ts + rnd.uniform(0.1, 2) * DAY, self.anchor)) \
+                        if payout_status == "paid" else None
+                    crypto.append((user_id, n, amount, round(amount / USDT_RATE, 4), f"spend-{n}",
+                                   f"transfer-{n}" if paid_at else None, payout_status, created_at, paid_at))
+
+                # Вывод накопленного баланса
+                balance = self.balance[user_id]
+                if balance >= 1000 and rnd.random() < 0.05:
+                    withdrawal_id += 1
+                    withdrawal = round(balance * rnd.uniform(0.5, 1.0), 2)
+                    completed = age > 2 * DAY
+                    withdrawals.append((withdrawal_id, user_id, withdrawal, rnd.choice(("card", "usdt")), "0000",
+                                        "completed" if completed else "pending", created_at,
+                                        created_at if completed else None))
+                    self._credit(ledger, index, -withdrawal, "withdrawal", "withdrawal", withdrawal_id, created_at)
+                    if completed:
+                        self.withdrawn[user_id] = self.withdrawn.get(user_id, 0.0) + withdrawal
+
+            if n % CHUNK == 0 or n == count:
+                with self.conn:
+                    self._insert(
+                        "videos",
+                        "id, user_id, channel_id, youtube_channel_id, platform, video_url, video_id, "
+                        "tiktok_video_id, video_author, views, likes, comments, shares, favorites, status, "
+                        "earnings, created_at",
+                        videos
+                    )
+                    self._insert("balance_ledger",
+                                 "user_id, amount, balance_after, reason, ref_type, ref_id, created_at", ledger)
+                    self._insert("crypto_payouts",
+                                 "user_id, video_id, amount_rub, amount_usdt, spend_id, transfer_id, status, "
+                                 "created_at, paid_at", crypto)
+                    self._insert("withdrawal_requests",
+                                 "id, user_id, amount, payment_method, payment_details, status, created_at, "
+                                 "processed_at", withdrawals)
+                if n % (CHUNK * 20) == 0:
+                    logger.info(f"  ... видео: {n}/{count}")
+
+    # === КЛЮЧИ И ИТОГИ ПОЛЬЗОВАТЕЛЕЙ ===
+
+    def media_keys(self, count: int):
+        rnd = self.rnd
+        keys = []
+        claimed = {}
+        last_issued = {}
+        for n, ts in enumerate(_growth_times(rnd, count, self.start, self.anchor), 1):
+            free = rnd.random() < 0.2
+            assigned_to = assigned_at = None
+            if rnd.random() < 0.6:
+                assigned = min(ts + rnd.uniform(0, 3) * DAY, self.anchor)
+                user_id = self.user_ids[self._pick_author(assigned)]
+                if free and user_id in claimed:
+                    free = False
+                assigned_to, assigned_at = user_id, _timestamp(assigned)
+                if free:
+                    claimed[user_id] = assigned_at
+                last_issued[user_id] = assigned_at
+            keys.append((f"KEY-{n:08d}-{rnd.getrandbits(32):08X}", "assigned" if assigned_to else "available",
+                         free, assigned_to, _timestamp(ts), assigned_at))
+
+        with self.conn:
+            self._insert("media_keys", "key_value, status, is_free_promo, assigned_to, created_at, assigned_at", keys)
+            self.conn.executemany(
+                "UPDATE users SET free_key_claimed_at = ? WHERE user_id = ?",
+                [(claimed_at, user_id) for user_id, claimed_at in claimed.items()]
+            )
+            self.conn.executemany(
+                "UPDATE users SET last_key_issued_at = ? WHERE user_id = ?",
+                [(issued_at, user_id) for user_id, issued_at in last_issued.items()]
+            )
+
+    def finish(self):
+        """Балансы, выведенные суммы, реферальные заработки и способы оплаты"""
+        rnd = self.rnd
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE users SET balance = ?, total_withdrawn = ? WHERE user_id = ?",
+                [(round(balance, 2), round(self.withdrawn.get(user_id, 0.0), 2), user_id)
+                 for user_id, balance in self.balance.items()]
+            )
+            # users.referral_earnings обновляет триггер referrals
+            self.conn.executemany(
+                "UPDATE referrals SET earnings = ? WHERE referrer_id = ? AND referred_id = ?",
+                [(round(earnings, 2), self.user_ids[self.referrer[index]], user_id)
+                 for index, user_id in enumerate(self.user_ids)
+                 if (earnings := self.referral_earnings.get(user_id))]
+            )
+            methods = [
+                (user_id, rnd.choice(("card", "usdt")), f"{rnd.getrandbits(16):04X}", _timestamp(created))
+                for user_id, created in zip(self.user_ids, self.created)
+                if user_id in self.withdrawn or rnd.random() < 0.1
+            ]
+            self._insert("payment_methods", "user_id, method_type, details, created_at", methods)
+
+
+async def _create_schema(db_path: str):
+    try:
+        await Database(db_path).init_db()
+    finally:
+        await close_all_pools()
+
+
+def generate(
+    db_path: str,
+    users: int = USERS,
+    videos: int = VIDEOS,
+    payouts: int = PAYOUTS,
+    keys: int = None,
+    seed: int = 42,
+    anchor: date = None,
+    history_days: int = HISTORY_DAYS,
+) -> dict:
+    """
+    Создать БД db_path и заполнить синтетическими данными
+
+    anchor — дата, которая считается «сегодня» (по умолчанию текущая дата UTC):
+    история охватывает history_days дней до её полуночи. Возвращает количество
+    вставленных строк по таблицам.
+    """
+    anchor = anchor or datetime.now(timezone.utc).date()
+    anchor_ts = datetime(anchor.year, anchor.month, anchor.day, tzinfo=timezone.utc).timestamp()
+    keys = users // 2 if keys is None else keys
+
+    asyncio.run(_create_schema(db_path))
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-262144")
+        generator = _Generator(conn, random.Random(seed), anchor_ts, history_days)
+
+        started = time.perf_counter()
+        generator.users(users)
+        logger.info(f"👥 Пользователи: {users} ({time.perf_counter() - started:.1f} сек)")
+        generator.videos(videos, payouts)
+        logger.info(f"🎬 Видео: {videos} ({time.perf_counter() - started:.1f} сек)")
+        generator.media_keys(keys)
+        generator.finish()
+        conn.execute("ANALYZE")
+        logger.info(f"📊 ANALYZE выполнен ({time.perf_counter() - started:.1f} сек)")
+    finally:
+        conn.close()
+    return generator.counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Синтетическая БД бота для нагрузочных тестов")
+    parser.add_argument("db_path", help="путь к создаваемой БД")
+    parser.add_argument("--users", type=int, default=USERS)
+    parser.add_argument("--videos", type=int, default=VIDEOS)
+    parser.add_argument("--payouts", type=int, default=PAYOUTS)
+    parser.add_argument("--keys", type=int, default=None, help="медиа-ключей (по умолчанию users / 2)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--anchor", type=date.fromisoformat, default=None,
+                        help="дата «сегодня» для истории (по умолчанию текущая)")
+    parser.add_argument("--history-days", type=int, default=HISTORY_DAYS)
+    parser.add_argument("--force", action="store_true", help="перезаписать существующий файл")
+    args = parser.parse_args()
+
+    if os.path.exists(args.db_path):
+        if not args.force:
+            logger.error(f"❌ Файл уже существует: {args.db_path} (--force для перезаписи)")
+            return 1
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(args.db_path + suffix):
+                os.remove(args.db_path + suffix)
+
+    started = time.perf_counter()
+    counts = generate(
+        args.db_path, users=args.users, videos=args.videos, payouts=args.payouts, keys=args.keys,
+        seed=args.seed, anchor=args.anchor, history_days=args.history_days,
+    )
+    for table, rows in counts.items():
+        logger.info(f"  {table}: {rows}")
+    logger.info(f"✅ Синтетическая БД создана: {args.db_path} ({time.perf_counter() - started:.1f} сек)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())